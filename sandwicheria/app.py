@@ -1,5 +1,31 @@
-from flask import Flask, render_template, request, redirect, url_for, g, current_app, jsonify, flash
-import sqlite3, datetime, os, threading
+from flask import Flask, render_template, request, redirect, url_for, g, current_app, jsonify, flash, Response, stream_with_context, send_file
+import datetime, os, tempfile, functools, json
+import click
+from db_pool import ConnectionPool
+from migrations import run_migrations, MIGRATIONS
+from query_plans import explain, full_scans, QueryAnalyzer, regressions
+from report_filters import ReportFilters, FilterError
+import rollup
+import order_ingest
+import order_pages
+import sales_rows
+import exports
+import dashboard
+import data_version
+import live_stats
+import customers
+from catalog_cache import CatalogCache
+import catalog_repo
+import metrics
+from response_cache import ResponseCache, request_key, make_etag
+import print_queue
+import tickets
+import kitchen
+import archive
+import replica
+import compression
+import static_assets
+from fragments import FragmentCache
 
 # Optional escpos import; app works without it but printing will be disabled.
 try:
@@ -18,45 +44,200 @@ VENDOR_ID = 0x04b8   # ejemplo: Epson 0x04b8
 PRODUCT_ID = 0x0202  # ejemplo: modelo
 USB_INTERFACE = 0     # interfaz USB; a veces 0 o 1
 ENABLE_PRINTER = False  # cambiar a True si quieres intentar imprimir automáticamente
+PRINTER_BACKEND = "usb"  # "usb", "file" (escribe en PRINTER_FILE) o "dummy" (en memoria)
 
 BASE_DIR = os.path.dirname(__file__)
 DB_PATH = os.path.join(BASE_DIR, "sandwich.db")
+PRINTER_FILE = os.path.join(BASE_DIR, "comandas_impresas.txt")
+PRINT_LOCK_FILE = os.path.join(BASE_DIR, "print_spooler.lock")  # un solo proceso imprime
+EXPORT_DIR = os.path.join(BASE_DIR, "exports")
+EXPORT_SYNC_MAX_ROWS = 20000  # sobre esto, /api/export se genera en segundo plano
 
-app = Flask(__name__)
+# Caché de respuestas de /api/* de reportes (por versión de datos)
+REPORT_CACHE_ENTRIES = 256
+REPORT_CACHE_BYTES = 16 * 1024 * 1024
+
+# Umbrales para registrar requests y consultas lentas (con sus parámetros)
+SLOW_REQUEST_MS = 500
+SLOW_QUERY_MS = 100
+
+# Modo de análisis de planes: registra cada forma de consulta y su plan
+# (/admin/query-plans); también se activa desde esa página
+QUERY_ANALYSIS = False
+
+# Pantalla de cocina (/kitchen): eventos que se pueden recuperar al
+# reconectar, duración de cada stream SSE y máximo de pantallas por proceso
+# (gunicorn.conf.py lo ajusta según el tipo de worker)
+KITCHEN_BUFFER_EVENTS = 500
+KITCHEN_STREAM_SECONDS = 300
+KITCHEN_MAX_STREAMS = 50
+
+# Archivo mensual (flask archive): meses anteriores al actual que se
+# mantienen en la base en uso
+ARCHIVE_KEEP_MONTHS = 3
+
+# Tamaño del pool de lectura (conexiones de solo lectura en paralelo)
+DB_READERS = 4
+
+# Réplica de reportes (replica.py): los reportes de /api/* leen una copia de
+# la base que se renueva con la API de backup, de a REPLICA_STEP_PAGES páginas,
+# cuando cambian los datos (a lo más cada REPLICA_REFRESH_SECONDS). Si la
+# copia tiene más de REPLICA_MAX_STALENESS_SECONDS se lee la base principal.
+REPORT_REPLICA = True
+REPLICA_DIR = os.path.join(BASE_DIR, "sandwich_replica")
+REPLICA_LOCK_FILE = os.path.join(BASE_DIR, "report_replica.lock")  # un solo proceso copia
+REPLICA_REFRESH_SECONDS = 30
+REPLICA_MAX_STALENESS_SECONDS = 120
+REPLICA_STEP_PAGES = 256  # 1 MB con páginas de 4 KB
+
+# Respuestas de texto desde este tamaño salen comprimidas (gzip, o brotli si
+# está instalado); ver compression.py
+COMPRESS_MIN_BYTES = 1024
+
+# Pool de conexiones pre-configuradas (WAL, busy_timeout, mmap, caché);
+# cada sentencia SQL queda medida en /metrics
+db_pool = ConnectionPool(DB_PATH, readers=DB_READERS,
+                         connection_factory=metrics.InstrumentedConnection)
+
+# Latencia por ruta y por consulta (metrics.py)
+metrics.slow_request_seconds = SLOW_REQUEST_MS / 1000.0
+metrics.slow_query_seconds = SLOW_QUERY_MS / 1000.0
+metrics.install(app)
+
+# Compresión de respuestas y static/ con hash en la URL (static_url/vendor_url)
+compression.install(app, min_size=COMPRESS_MIN_BYTES)
+static_assets.install(app)
+
+# Formas de consulta vistas y sus planes (query_plans.py)
+query_analyzer = QueryAnalyzer()
+
+def set_query_analysis(enabled, analyzer=None):
+    """Activa o desactiva el registro de consultas en analyzer (o query_analyzer)."""
+    metrics.query_observer = (analyzer or query_analyzer).record if enabled else None
+
+set_query_analysis(QUERY_ANALYSIS)
 
 def get_db():
+    """Conexión de escritura del request (una sola a la vez en el proceso)."""
     db = getattr(g, "_database", None)
     if db is None:
-        db = g._database = sqlite3.connect(DB_PATH)
-        db.row_factory = sqlite3.Row
+        db = g._database = db_pool.acquire_writer()
     return db
 
-def init_db():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("""CREATE TABLE IF NOT EXISTS products (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT UNIQUE,
-        category TEXT,
-        base_protein TEXT,
-        price INTEGER,
-        cost INTEGER
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS orders (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        created_at TEXT,
-        customer_name TEXT
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS order_items (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        order_id INTEGER,
-        product_id INTEGER,
-        qty INTEGER,
-        note TEXT,
-        FOREIGN KEY(order_id) REFERENCES orders(id),
-        FOREIGN KEY(product_id) REFERENCES products(id)
-    )""")
-    db.commit()
+def get_read_db():
+    """Conexión de solo lectura del request; no bloquea al escritor."""
+    db = getattr(g, "_read_database", None)
+    if db is None:
+        db = g._read_database = db_pool.acquire_reader()
+    return db
+
+# Snapshots de la base para los reportes (replica.py)
+report_replica = replica.ReportReplica(db_pool, REPLICA_DIR,
+                                       max_staleness=REPLICA_MAX_STALENESS_SECONDS,
+                                       refresh_seconds=REPLICA_REFRESH_SECONDS,
+                                       step_pages=REPLICA_STEP_PAGES, readers=DB_READERS,
+                                       lock_path=REPLICA_LOCK_FILE,
+                                       connection_factory=metrics.InstrumentedConnection)
+
+def get_report_db():
+    """Conexión de los reportes: el snapshot de la réplica si está al día, si no get_read_db().
+
+    La antigüedad de lo leído sale en el header X-Snapshot-Age (segundos; 0 si
+    se leyó la base principal).
+    """
+    db = getattr(g, "_report_database", None)
+    if db is None:
+        lease = report_replica.acquire() if REPORT_REPLICA else None
+        if lease is None:
+            g._report_age = 0.0
+            db = get_read_db()
+        else:
+            g._report_lease = lease
+            g._report_age = lease.age
+            db = lease.conn
+        g._report_database = db
+    return db
+
+@app.after_request
+def snapshot_age_header(response):
+    age = g.get("_report_age")
+    if age is not None:
+        response.headers['X-Snapshot-Age'] = f"{age:.1f}"
+        response.headers['X-Report-Source'] = "replica" if "_report_lease" in g else "primary"
+    return response
+
+# Catálogo de productos en memoria; se invalida en cada escritura de products
+catalog_cache = CatalogCache()
+
+def get_catalog():
+    """Catálogo vigente (sólo toca la base si fue invalidado)."""
+    return catalog_cache.get(get_read_db())
+
+# Menú de /orders y filas de /products ya renderizados, por versión del catálogo
+fragment_cache = FragmentCache()
+
+# Nombre normalizado de cliente -> customers.id
+customer_index = customers.CustomerIndex()
+
+# Respuestas de reportes ya serializadas, válidas mientras no cambien los datos
+report_cache = ResponseCache(max_entries=REPORT_CACHE_ENTRIES, max_bytes=REPORT_CACHE_BYTES)
+
+def cached_report(store=True):
+    """ETag/304 por versión de datos y, con store=True, caché de la respuesta.
+
+    El ETag sale de la ruta, los filtros y data_version, así que el navegador
+    revalida en cada carga (Cache-Control: no-cache) y recibe 304 si nada
+    cambió. Las respuestas por streaming usan store=False: sólo ETag.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # La versión es la de los datos que se van a leer (snapshot o base)
+            version = data_version.current(get_report_db())
+            key = request_key(request.path, request.args)
+            etag = make_etag(key, version)
+            # Comparación débil: con compresión el ETag sale como W/"..."
+            if request.if_none_match.contains_weak(etag):
+                report_cache.not_modified += 1
+                response = Response(status=304)
+            else:
+                cached = report_cache.get(key, version) if store else None
+                response = Response(cached.body, mimetype=cached.mimetype) if cached else None
+            if response is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if store and not response.is_streamed:
+                    report_cache.put(key, version, response.get_data(), response.mimetype, etag)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def create_printer_backend():
+    """Backend de impresión según PRINTER_BACKEND."""
+    if PRINTER_BACKEND == "file":
+        return print_queue.FilePrinterBackend(PRINTER_FILE)
+    if PRINTER_BACKEND == "dummy":
+        return print_queue.DummyPrinterBackend()
+    if not ESC_POS_AVAILABLE:
+        raise RuntimeError("python-escpos no disponible")
+    return print_queue.UsbPrinterBackend(VENDOR_ID, PRODUCT_ID, USB_INTERFACE)
+
+# Un solo hilo imprime las comandas en orden, con reintentos
+print_spooler = print_queue.PrintSpooler(db_pool, create_printer_backend, lock_path=PRINT_LOCK_FILE)
+
+# Eventos de comandas para las pantallas de cocina (kitchen.py)
+kitchen_bus = kitchen.KitchenBus(db_pool, buffer_size=KITCHEN_BUFFER_EVENTS)
+
+def report_reader():
+    """Como get_report_db() fuera de un request: context manager con la conexión
+    del snapshot si está al día, si no de la base principal."""
+    return report_replica.reader() if REPORT_REPLICA else db_pool.reader()
+
+# Exportaciones grandes de ventas (archivos en EXPORT_DIR); leen como los reportes
+export_manager = exports.ExportManager(db_pool, EXPORT_DIR, reader=report_reader)
 
 def seed_defaults():
     db = get_db()
@@ -105,6 +286,7 @@ def seed_defaults():
         ("TÉ VERDE", "CAFETERÍA", "—"),
         ("CHOCOLATE CALIENTE", "CAFETERÍA", "—")
     ]
+    inserted = False
     for name, cat, protein in defaults:
         cur.execute("SELECT id FROM products WHERE name = ?", (name,))
         if not cur.fetchone():
@@ -123,35 +305,435 @@ def seed_defaults():
                 price = 1200
                 
             cost = int(price * 0.3)
-            cur.execute("INSERT INTO products (name, category, base_protein, price, cost) VALUES (?, ?, ?, ?, ?)",
-                        (name, cat, protein, price, cost))
+            catalog_repo.insert_product(cur, name, cat, protein, price, cost)
+            inserted = True
+    if inserted:
+        data_version.bump(cur, data_version.PRODUCTS)
     db.commit()
 
 def setup_database():
     """Inicializa la base de datos y carga los datos por defecto"""
     with app.app_context():
-        init_db()
+        run_migrations(get_db())
         seed_defaults()
 
+@app.cli.command("migrate")
+def migrate_command():
+    """Aplica las migraciones de esquema pendientes."""
+    with app.app_context():
+        applied = run_migrations(get_db())
+    print(f"Migraciones aplicadas: {applied}" if applied else "Esquema al día")
+
+@app.cli.command("rollup-rebuild")
+def rollup_rebuild_command():
+    """Recalcula completo el agregado diario de ventas."""
+    with app.app_context():
+        db = get_db()
+        run_migrations(db)
+        rollup.rebuild(db)
+    print("Agregado diario recalculado")
+
+@app.cli.command("rollup-check")
+def rollup_check_command():
+    """Compara el agregado diario con un recálculo desde las tablas originales."""
+    with app.app_context():
+        db = get_db()
+        run_migrations(db)
+        differences = rollup.check_consistency(db)
+    for table, key, expected, stored in differences:
+        print(f"{table} {key}: esperado={expected} guardado={stored}")
+    if differences:
+        print(f"{len(differences)} diferencia(s); corregir con `flask rollup-rebuild`")
+        raise SystemExit(1)
+    print("Agregado diario consistente")
+
+@app.cli.command("stats-rebuild")
+def stats_rebuild_command():
+    """Recalcula los contadores del inicio (productos y clientes)."""
+    with app.app_context():
+        db = get_db()
+        run_migrations(db)
+        live_stats.rebuild(db)
+    print("Contadores recalculados")
+
+@app.cli.command("stats-check")
+def stats_check_command():
+    """Compara los contadores del inicio con las tablas originales."""
+    with app.app_context():
+        db = get_db()
+        run_migrations(db)
+        differences = live_stats.check_consistency(db)
+    for table, key, expected, stored in differences:
+        print(f"{table} {key}: esperado={expected} guardado={stored}")
+    if differences:
+        print(f"{len(differences)} diferencia(s); corregir con `flask stats-rebuild`")
+        raise SystemExit(1)
+    print("Contadores consistentes")
+
+@app.cli.command("archive")
+@click.option("--keep-months", default=ARCHIVE_KEEP_MONTHS, show_default=True,
+              help="Meses anteriores al actual que quedan en la base en uso.")
+@click.option("--month", "months", multiple=True, help="Mes AAAA-MM a archivar (repetible).")
+@click.option("--dry-run", is_flag=True, help="Sólo muestra los meses que se archivarían.")
+@click.option("--vacuum", is_flag=True, help="Compacta la base en uso al terminar.")
+def archive_command(keep_months, months, dry_run, vacuum):
+    """Mueve los meses cerrados de comandas a archivos por mes."""
+    with app.app_context():
+        db = get_db()
+        run_migrations(db)
+        months = sorted(months) or archive.closed_months(db, keep_months)
+        if not months:
+            print("Nada que archivar")
+            return
+        for month in months:
+            if dry_run:
+                print(f"{month}: se archivaría")
+                continue
+            try:
+                orders, items = archive.archive_month(db, month)
+            except archive.ArchiveError as e:
+                print(f"{month}: {e}")
+                raise SystemExit(1)
+            print(f"{month}: {orders} comandas, {items} líneas archivadas")
+        if vacuum and not dry_run:
+            db.execute("VACUUM")
+            print("Base en uso compactada")
+
+@app.cli.command("archive-check")
+def archive_check_command():
+    """Lista las particiones y compara cada archivo con su registro."""
+    with app.app_context():
+        db = get_read_db()
+        for p in archive.partitions(db):
+            print(f"{p.month}  {p.file}  {p.orders} comandas  {p.items} líneas  (archivado {p.archived_at})")
+        problems = archive.check(db)
+    for month, problem in problems:
+        print(f"[ERROR] {month}: {problem}")
+    if problems:
+        raise SystemExit(1)
+    print("Particiones consistentes")
+
+@app.cli.command("archive-restore")
+@click.argument("month")
+def archive_restore_command(month):
+    """Devuelve el mes MONTH (AAAA-MM) a la base en uso."""
+    with app.app_context():
+        db = get_db()
+        run_migrations(db)
+        try:
+            restored = archive.restore_month(db, month)
+        except archive.ArchiveError as e:
+            print(e)
+            raise SystemExit(1)
+    print(f"{month}: {restored} comandas restauradas" if restored else f"{month} no estaba archivado")
+
+# Consultas de reportes cuyo plan se revisa con `flask check-plans`
+PLAN_CHECK_URLS = [
+    "/api/ventas?fecha_inicio=2025-01-01&fecha_fin=2025-01-31&limit=500",
+    "/api/ventas?fecha_inicio=2025-01-01&fecha_fin=2025-01-31&categoria=SANDWICH&limit=500",
+    "/api/dashboard?fecha_inicio=2025-01-01&fecha_fin=2025-01-31&categoria=SANDWICH",
+    "/api/metricas?fecha_inicio=2025-01-01&fecha_fin=2025-01-31",
+    "/api/ventas-por-categoria?fecha_inicio=2025-01-01&fecha_fin=2025-01-31",
+    "/api/top-productos?fecha_inicio=2025-01-01&fecha_fin=2025-01-31",
+    "/api/ventas-por-dia?fecha_inicio=2025-01-01&fecha_fin=2025-01-31",
+    "/api/ventas-por-dia-semana?fecha_inicio=2025-01-01&fecha_fin=2025-01-31",
+]
+
+def collect_query_plans(urls):
+    """Ejecuta cada URL capturando su SQL y devuelve (url, sql, plan, scans)."""
+    results = []
+    report_cache.clear()  # con la caché llena no se ejecutaría el SQL
+    for url in urls:
+        statements = []
+        with app.test_request_context(url):
+            # Los planes se revisan en la base principal, también los de reportes
+            db = g._report_database = get_read_db()
+            db.set_trace_callback(statements.append)
+            try:
+                app.full_dispatch_request()
+            finally:
+                db.set_trace_callback(None)
+            for sql in statements:
+                if not sql.lstrip().upper().startswith("SELECT"):
+                    continue
+                plan = explain(db, sql)
+                results.append((url, sql, plan, full_scans(plan, sql)))
+    return results
+
+@app.cli.command("check-plans")
+def check_plans_command():
+    """Falla si alguna consulta de reportes recorre completa una tabla de hechos."""
+    with app.app_context():
+        db = get_db()
+        run_migrations(db)
+        last_order = db.execute("SELECT MAX(id) FROM orders").fetchone()[0]
+    urls = list(PLAN_CHECK_URLS)
+    if last_order:
+        urls.insert(0, f"/comanda/{last_order}")
+    failures = 0
+    for url, sql, plan, scans in collect_query_plans(urls):
+        status = "SCAN" if scans else "OK"
+        print(f"[{status}] {url}")
+        for detail in plan:
+            print(f"    {detail}")
+        failures += bool(scans)
+    if failures:
+        print(f"{failures} consulta(s) con recorrido completo de tabla")
+        raise SystemExit(1)
+
+# Endpoints que recorre `flask analyze-queries`, con cada combinación de filtros
+ANALYSIS_ENDPOINTS = [
+    "/api/dashboard", "/api/metricas", "/api/ventas-por-categoria", "/api/top-productos",
+    "/api/ventas-por-dia", "/api/ventas-por-dia-semana", "/api/ventas?limit=500", "/api/orders?limit=50",
+]
+
+def analysis_urls(db):
+    """URLs de ANALYSIS_ENDPOINTS sin filtros, con fechas, con categoría y con ambos."""
+    last = db.execute("SELECT MAX(created_at) FROM orders").fetchone()[0]
+    fin = datetime.date.fromisoformat(last[:10]) if last else datetime.date.today()
+    fechas = f"fecha_inicio={fin - datetime.timedelta(days=30)}&fecha_fin={fin}"
+    row = db.execute("SELECT name FROM categories ORDER BY name LIMIT 1").fetchone()
+    categoria = f"categoria={row[0]}" if row else None
+    filtros = ["", fechas] + ([categoria, f"{fechas}&{categoria}"] if categoria else [])
+    urls = []
+    for endpoint in ANALYSIS_ENDPOINTS:
+        for filtro in filtros:
+            sep = "&" if "?" in endpoint else "?"
+            urls.append(f"{endpoint}{sep}{filtro}" if filtro else endpoint)
+    return urls
+
+def run_query_analysis(urls):
+    """Ejecuta urls con un QueryAnalyzer propio y lo devuelve ya analizado."""
+    analyzer = QueryAnalyzer()
+    report_cache.clear()  # con la caché llena no se ejecutaría el SQL
+    previous = metrics.query_observer
+    set_query_analysis(True, analyzer)
+    try:
+        for url in urls:
+            with app.test_request_context(url):
+                g._report_database = get_read_db()  # los planes son los de la base principal
+                response = app.full_dispatch_request()
+                response.get_data()  # las respuestas en streaming ejecutan su SQL al leerse
+                response.close()
+    finally:
+        metrics.query_observer = previous
+    with db_pool.reader() as db:
+        analyzer.analyze(db)
+    return analyzer
+
+def print_query_report(report):
+    for entry in report:
+        status = ", ".join(entry["flags"]) or "OK"
+        print(f"[{status}] {entry['count']}x total={entry['total_ms']:.1f}ms "
+              f"max={entry['max_ms']:.1f}ms filas={entry['rows']}")
+        print(f"    {entry['sql']}")
+        for detail in entry["plan"]:
+            print(f"      {detail}")
+
+@app.cli.command("analyze-queries")
+@click.option("--limit", default=20, show_default=True, help="Formas a mostrar (las peores).")
+@click.option("--baseline", type=click.Path(dir_okay=False),
+              help="JSON {forma: [marcas]}; falla si aparecen marcas nuevas.")
+@click.option("--write-baseline", type=click.Path(dir_okay=False),
+              help="Guarda las marcas actuales como base de comparación.")
+def analyze_queries_command(limit, baseline, write_baseline):
+    """Ejecuta los reportes con cada combinación de filtros y muestra los peores planes."""
+    with app.app_context():
+        db = get_db()
+        run_migrations(db)
+        urls = analysis_urls(db)
+    analyzer = run_query_analysis(urls)
+    report = analyzer.report()
+    print_query_report(report[:limit])
+    stats = analyzer.stats()
+    print(f"{stats['shapes']} forma(s) de consulta, {stats['flagged']} con recorridos o B-trees temporales")
+    if write_baseline:
+        with open(write_baseline, "w", encoding="utf-8") as f:
+            json.dump({e["sql"]: e["flags"] for e in report if e["flags"]}, f, indent=2, ensure_ascii=False)
+        print(f"Base de comparación escrita en {write_baseline}")
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            found = regressions(report, json.load(f))
+        for shape, flags in found:
+            print(f"[REGRESIÓN] {', '.join(flags)}\n    {shape}")
+        if found:
+            print(f"{len(found)} consulta(s) con planes peores que la base")
+            raise SystemExit(1)
+
+@app.cli.command("render-ticket")
+@click.argument("order_id", type=int)
+@click.argument("path")
+@click.option("--escpos", is_flag=True, help="Escribe los bytes ESC/POS en vez de texto plano.")
+def render_ticket_command(order_id, path, escpos):
+    """Renderiza la comanda ORDER_ID en el archivo PATH (para comparar diseños)."""
+    with app.app_context():
+        found = tickets.render_to_file(get_read_db(), order_id, path, escpos=escpos)
+    if not found:
+        print(f"Comanda #{order_id} no existe")
+        raise SystemExit(1)
+    print(f"Comanda #{order_id} escrita en {path}")
+
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, "_database", None)
+    # Las conexiones vuelven al pool en vez de cerrarse
+    db = g.pop("_database", None)
     if db is not None:
-        db.close()
+        db_pool.release_writer(db)
+    read_db = g.pop("_read_database", None)
+    if read_db is not None:
+        db_pool.release_reader(read_db)
+    g.pop("_report_database", None)
+    lease = g.pop("_report_lease", None)
+    if lease is not None:
+        report_replica.release(lease)
+
+@app.route("/healthz")
+def healthz():
+    """Chequeo para el balanceador/systemd: la base responde y el esquema está al día"""
+    try:
+        with db_pool.reader() as db:
+            version = db.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+    except Exception as e:
+        app.logger.error(f"Healthcheck fallido: {e}")
+        return jsonify({'status': 'error', 'error': str(e), 'pid': os.getpid()}), 503
+    if version != MIGRATIONS[-1][0]:
+        return jsonify({'status': 'error', 'error': 'migraciones pendientes',
+                        'schema_version': version, 'pid': os.getpid()}), 503
+    return jsonify({'status': 'ok', 'pid': os.getpid(), 'schema_version': version})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Métricas en formato de texto de Prometheus (de este proceso)"""
+    pool = db_pool.stats()
+    extra = metrics.counters("epicuro_db_pool", "Espera y timeouts del pool de conexiones SQLite.", [
+        ("wait_seconds", pool["wait_seconds"]),
+        ("timeouts", pool["timeouts"]),
+    ])
+    extra += metrics.gauges("epicuro_db_pool", "Estado del pool de conexiones SQLite.", [
+        ("readers_open", pool["readers_open"]),
+    ])
+    cache = report_cache.stats()
+    extra += metrics.counters("epicuro_report_cache", "Caché de respuestas de reportes.", [
+        ("hits", cache["hits"]),
+        ("misses", cache["misses"]),
+        ("not_modified", cache["not_modified"]),
+    ])
+    extra += metrics.gauges("epicuro_report_cache", "Caché de respuestas de reportes.", [
+        ("bytes", cache["bytes"]),
+    ])
+    cocina = kitchen_bus.stats()
+    extra += metrics.gauges("epicuro_kitchen", "Pantallas de cocina conectadas.", [
+        ("subscribers", cocina["subscribers"]),
+    ])
+    extra += metrics.counters("epicuro_kitchen", "Eventos enviados a las pantallas de cocina.", [
+        ("events_sent", cocina["events_sent"]),
+    ])
+    replica_stats = report_replica.stats()
+    # Sin snapshot no hay antigüedad: available=0 y no se informa age_seconds
+    replica_age = replica_stats["age_seconds"]
+    extra += metrics.gauges("epicuro_report_replica", "Réplica de reportes: snapshot disponible (0/1).", [
+        ("available", 0 if replica_age is None else 1),
+    ])
+    if replica_age is not None:
+        extra += metrics.gauges("epicuro_report_replica", "Réplica de reportes: antigüedad del snapshot.", [
+            ("age_seconds", replica_age),
+        ])
+    extra += metrics.counters("epicuro_report_replica", "Réplica de reportes: copias y lecturas.", [
+        ("refreshes", replica_stats["refreshes"]),
+        ("replica_reads", replica_stats["replica_reads"]),
+        ("primary_reads", replica_stats["primary_reads"]),
+    ])
+    catalog = catalog_cache.stats()
+    extra += metrics.counters("epicuro_catalog_cache", "Caché del catálogo de productos.", [
+        ("hits", catalog["hits"]),
+        ("misses", catalog["misses"]),
+    ])
+    fragments = fragment_cache.stats()
+    extra += metrics.counters("epicuro_fragment_cache", "Caché de fragmentos HTML del catálogo.", [
+        ("hits", fragments["hits"]),
+        ("misses", fragments["misses"]),
+    ])
+    return Response(metrics.render(extra), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/db-pool")
+def api_db_pool():
+    """Estadísticas del pool de conexiones"""
+    return jsonify(db_pool.stats())
+
+@app.route("/api/archive")
+def api_archive():
+    """Meses archivados (particiones) y su tamaño"""
+    return jsonify([p._asdict() for p in archive.partitions(get_read_db())])
+
+@app.route("/api/replica")
+def api_replica():
+    """Snapshot vigente de la réplica de reportes, su antigüedad y lecturas"""
+    return jsonify(report_replica.stats())
+
+@app.route("/api/print-queue")
+def api_print_queue():
+    """Profundidad de la cola de impresión, fallos y latencia"""
+    return jsonify(print_spooler.stats())
+
+@app.route("/api/print-queue/<int:job_id>/retry", methods=["POST"])
+def api_print_queue_retry(job_id):
+    """Reintenta un trabajo de impresión fallido"""
+    if not print_spooler.retry(job_id):
+        return jsonify({'error': 'Trabajo no encontrado o no fallido'}), 404
+    return jsonify({'id': job_id, 'status': print_queue.PENDING})
+
+@app.route("/api/catalog-cache")
+def api_catalog_cache():
+    """Aciertos/fallos de la caché del catálogo y de sus fragmentos HTML"""
+    stats = catalog_cache.stats()
+    stats["fragments"] = fragment_cache.stats()
+    stats["compressed_static"] = compression.static_cache.stats()
+    return jsonify(stats)
+
+@app.route("/api/report-cache")
+def api_report_cache():
+    """Aciertos, 304 y ocupación de la caché de reportes"""
+    return jsonify(report_cache.stats())
+
+@app.route("/api/query-plans")
+def api_query_plans():
+    """Formas de consulta registradas, de peor a mejor, con su plan"""
+    limite = parse_limite(50, 500)
+    try:
+        query_analyzer.analyze(get_read_db())
+        return jsonify({'enabled': metrics.query_observer is not None,
+                        **query_analyzer.stats(),
+                        'queries': query_analyzer.report(limite)})
+    except Exception as e:
+        print(f"Error en API query-plans: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route("/admin/query-plans", methods=["GET", "POST"])
+def admin_query_plans():
+    """Página del modo de análisis de planes (activar, limpiar, peores consultas)"""
+    if request.method == "POST":
+        action = request.form.get("action")
+        if action in ("on", "off"):
+            set_query_analysis(action == "on")
+            flash("Análisis de consultas " + ("activado" if action == "on" else "desactivado"), "success")
+        elif action == "clear":
+            query_analyzer.clear()
+            flash("Registro de consultas vaciado", "success")
+        return redirect(url_for("admin_query_plans"))
+    query_analyzer.analyze(get_read_db())
+    return render_template("query_plans.html", enabled=metrics.query_observer is not None,
+                           stats=query_analyzer.stats(), queries=query_analyzer.report(50))
 
 @app.route("/")
 def index():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT * FROM products ORDER BY category, name")
-    products = cur.fetchall()
-    return render_template("index.html", products=products)
+    # El inicio no muestra productos: sus listas salen de /api/*
+    return render_template("index.html")
 
 @app.route("/products", methods=["GET", "POST"])
 def products():
-    db = get_db()
-    cur = db.cursor()
     if request.method == "POST":
+        db = get_db()
+        cur = db.cursor()
         name = request.form["name"].strip().upper()
         category = request.form["category"].strip().upper()
         base_protein = request.form["base_protein"].strip().title()
@@ -178,243 +760,263 @@ def products():
         cur.execute("SELECT id FROM products WHERE name = ?", (name,))
         existing = cur.fetchone()
         if existing:
-            cur.execute("UPDATE products SET category=?, base_protein=?, price=?, cost=? WHERE name=?",
-                        (category, base_protein, price, cost, name))
+            catalog_repo.update_product(cur, existing["id"], name, category, base_protein, price, cost)
         else:
-            cur.execute("INSERT INTO products (name, category, base_protein, price, cost) VALUES (?, ?, ?, ?, ?)",
-                        (name, category, base_protein, price, cost))
+            catalog_repo.insert_product(cur, name, category, base_protein, price, cost)
+        data_version.bump(cur, data_version.PRODUCTS)
         db.commit()
+        catalog_cache.invalidate()
         return redirect(url_for("products"))
-    cur.execute("SELECT * FROM products ORDER BY category, name")
-    products = cur.fetchall()
-    return render_template("products.html", products=products)
+    catalog = get_catalog()
+    product_rows = fragment_cache.render("_product_rows.html", catalog, products=catalog.products)
+    return render_template("products.html", product_rows=product_rows)
 
 @app.route("/products/<int:pid>/edit", methods=["GET", "POST"])
 def edit_product(pid):
-    db = get_db()
-    cur = db.cursor()
     if request.method == "POST":
+        db = get_db()
+        cur = db.cursor()
         name = request.form["name"].strip().upper()
         category = request.form["category"].strip().upper()
         base_protein = request.form["base_protein"].strip().title()
         price = int(request.form["price"])
         cost = int(request.form["cost"])
-        cur.execute("UPDATE products SET name=?, category=?, base_protein=?, price=?, cost=? WHERE id=?",
-                    (name, category, base_protein, price, cost, pid))
+        catalog_repo.update_product(cur, pid, name, category, base_protein, price, cost)
+        data_version.bump(cur, data_version.PRODUCTS)
         db.commit()
+        catalog_cache.invalidate()
         return redirect(url_for("products"))
-    cur.execute("SELECT * FROM products WHERE id = ?", (pid,))
-    prod = cur.fetchone()
+    prod = get_catalog().by_id.get(pid)
     if not prod:
         return "Producto no encontrado", 404
-    return render_template("edit_product.html", p=prod)
+    return render_template("edit_product.html", p=prod,
+                           categories=catalog_repo.list_categories(get_read_db()))
 
 @app.route("/orders", methods=["GET", "POST"])
 def orders():
-    db = get_db()
-    cur = db.cursor()
     if request.method == "POST":
-        customer = request.form.get("customer_name", "").strip()
-        
-        # Validación en el servidor
-        if not customer:
-            flash("El nombre del cliente es obligatorio", "error")
-            return redirect(url_for("orders"))
-        
-        # Verificar que hay al menos un producto con cantidad > 0
-        has_products = False
-        for key, val in request.form.items():
-            if key.startswith("qty_"):
-                try:
-                    if int(val) > 0:
-                        has_products = True
-                        break
-                except:
-                    continue
-        
-        if not has_products:
-            flash("Debes agregar al menos un producto a la comanda", "error")
+        db = get_db()
+        # Un solo recorrido del formulario; productos resueltos desde el catálogo en memoria
+        try:
+            order = order_ingest.parse_form(request.form, get_catalog().by_id)
+        except order_ingest.OrderError as e:
+            flash(str(e), "error")
             return redirect(url_for("orders"))
-        
-        # Si pasa las validaciones, crear la comanda
-        created_at = datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
-        cur.execute("INSERT INTO orders (created_at, customer_name) VALUES (?, ?)", (created_at, customer))
-        order_id = cur.lastrowid
-        
-        # Lista de sandwiches que requieren selección de proteína
-        protein_sandwiches = ["A LO POBRE", "BARROS LUCO", "CHACARERO", "ITALIANO"]
-        
-        for key, val in request.form.items():
-            if key.startswith("qty_"):
-                pid = int(key.split("_",1)[1])
-                try:
-                    qty = int(val)
-                except:
-                    qty = 0
-                
-                # Obtener el nombre del producto para verificar si requiere proteína
-                cur.execute("SELECT name FROM products WHERE id = ?", (pid,))
-                product = cur.fetchone()
-                product_name = product["name"] if product else ""
-                
-                note = request.form.get(f"note_{pid}", "").strip()
-                
-                # Si es un sandwich que requiere proteína, agregar la proteína seleccionada al inicio de la nota
-                if qty > 0 and product_name in protein_sandwiches:
-                    selected_protein = request.form.get(f"protein_{pid}", "").strip()
-                    if selected_protein:
-                        # Combinar proteína seleccionada con nota adicional
-                        if note:
-                            note = f"{selected_protein} - {note}"
-                        else:
-                            note = selected_protein
-                
-                if qty > 0:
-                    cur.execute("INSERT INTO order_items (order_id, product_id, qty, note) VALUES (?, ?, ?, ?)",
-                                (order_id, pid, qty, note))
-        db.commit()
-        # Launch printing in background to avoid blocking the request (if enabled)
+        order_id = order_ingest.insert_order(db, order, print_job=ENABLE_PRINTER,
+                                             customer_index=customer_index)
+        kitchen_bus.notify()
+        # La impresión queda en la cola; el spooler la toma en segundo plano
         if ENABLE_PRINTER:
-            threading.Thread(target=print_to_thermal, args=(order_id,)).start()
+            print_spooler.notify()
         return redirect(url_for("comanda", order_id=order_id))
     
-    # GET
-    cur.execute("SELECT * FROM products WHERE category='SANDWICH' ORDER BY name")
-    sandwiches = cur.fetchall()
-    
-    # Obtener completos
-    cur.execute("SELECT * FROM products WHERE category='COMPLETO' ORDER BY name")
-    completos = cur.fetchall()
-    
-    # Obtener bebestibles por categoría
-    cur.execute("SELECT * FROM products WHERE category='BEBIDA' ORDER BY name")
-    bebidas = cur.fetchall()
-    
-    cur.execute("SELECT * FROM products WHERE category='ENERGÉTICA' ORDER BY name")
-    energeticas = cur.fetchall()
-    
-    cur.execute("SELECT * FROM products WHERE category='JUGO' ORDER BY name")
-    jugos = cur.fetchall()
-    
-    # Obtener productos de cafetería (nueva consulta)
-    cur.execute("SELECT * FROM products WHERE category='CAFETERÍA' ORDER BY name")
-    cafeteria = cur.fetchall()
-    
-    # Definir opciones de proteína y sandwiches que las requieren
-    protein_options = ["Churrasco", "Lomito", "Pollo"]
-    protein_sandwiches = ["A LO POBRE", "BARROS LUCO", "CHACARERO", "ITALIANO"]
-    
-    return render_template("orders.html", 
-                         sandwiches=sandwiches, 
-                         completos=completos,
-                         bebidas=bebidas,
-                         energeticas=energeticas,
-                         jugos=jugos,
-                         cafeteria=cafeteria,  # Nueva variable pasada al template
-                         protein_options=protein_options,
-                         protein_sandwiches=protein_sandwiches)
+    # GET: todas las secciones salen del catálogo en memoria; el menú se
+    # renderiza una vez por versión del catálogo (fragments.py)
+    catalog = get_catalog()
+    sandwiches = catalog.category('SANDWICH')
+    menu = fragment_cache.render("_order_menu.html", catalog,
+                                 sandwiches=sandwiches,
+                                 completos=catalog.category('COMPLETO'),
+                                 # Bebestibles por categoría
+                                 bebidas=catalog.category('BEBIDA'),
+                                 energeticas=catalog.category('ENERGÉTICA'),
+                                 jugos=catalog.category('JUGO'),
+                                 cafeteria=catalog.category('CAFETERÍA'),
+                                 protein_options=order_ingest.PROTEIN_OPTIONS,
+                                 protein_sandwiches=order_ingest.PROTEIN_SANDWICHES)
+    # La validación de proteínas en JS recorre los sándwiches
+    return render_template("orders.html", menu=menu, sandwiches=sandwiches)
 # Aqui termina @app.route("/orders", methods=["GET", "POST"])
 
-@app.route("/comanda/<int:order_id>")
-def comanda(order_id):
+@app.route("/api/orders", methods=["POST"])
+def api_create_order():
+    """Crea una comanda desde JSON (tablets): {"customer_name", "items": [...]}"""
     db = get_db()
+    try:
+        order = order_ingest.parse_json(request.get_json(silent=True), get_catalog().by_id)
+    except order_ingest.OrderError as e:
+        return jsonify({'error': str(e)}), 400
+    order_id = order_ingest.insert_order(db, order, print_job=ENABLE_PRINTER,
+                                         customer_index=customer_index)
+    kitchen_bus.notify()
+    if ENABLE_PRINTER:
+        print_spooler.notify()
+    return jsonify({
+        'id': order_id,
+        'created_at': order.created_at,
+        'items': len(order.lines),
+        'comanda_url': url_for("comanda", order_id=order_id)
+    }), 201
+
+@app.route("/api/orders", methods=["GET"])
+def api_orders_page():
+    """Página de comandas, de la más nueva a la más antigua.
+
+    Filtros: fecha_inicio, fecha_fin, cliente; paginación: cursor, limit.
+    """
+    query = order_pages.OrderPageQuery.from_args(request.args)
+    orders, next_cursor = order_pages.fetch_page(get_read_db(), query)
+    return jsonify({
+        'orders': [{
+            'id': o['id'],
+            'created_at': o['created_at'],
+            'customer_name': o['customer_name'],
+            'total': o['total'],
+            'item_count': o['item_count'],
+            'comanda_url': url_for("comanda", order_id=o['id'])
+        } for o in orders],
+        'next_cursor': next_cursor,
+        'next_url': url_for("api_orders_page", cursor=next_cursor, limit=query.limit, **query.args())
+                    if next_cursor else None
+    })
+
+def parse_limite(default, maximum):
+    """Parámetro limite de los endpoints del inicio y de los reportes, entre 1 y maximum."""
+    try:
+        limite = int(request.args.get('limite', default))
+    except ValueError:
+        raise FilterError(f"Límite inválido: {request.args.get('limite')!r}")
+    return max(1, min(limite, maximum))
+
+@app.route("/api/stats")
+def api_stats():
+    """Tarjetas del inicio: productos, comandas e ingresos de hoy y clientes"""
+    try:
+        db = get_read_db()
+        pedidos, ventas = live_stats.today(db, datetime.date.today().isoformat())
+        return jsonify({
+            'productsCount': len(get_catalog().products),
+            'todayOrders': pedidos,
+            'todayRevenue': ventas,
+            'customersCount': customers.count(db)
+        })
+    except Exception as e:
+        print(f"Error en API stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route("/api/products")
+def api_products():
+    """Productos del catálogo con unidades vendidas, de más a menos vendido"""
+    limite = parse_limite(200, 200)
+    try:
+        ventas = live_stats.product_sales(get_read_db())
+        products = [{
+            'id': p['id'],
+            'name': p['name'],
+            'category': p['category'],
+            'price': p['price'],
+            'sales': ventas.get(p['id'], (0, 0))[0],
+            'orders': ventas.get(p['id'], (0, 0))[1]
+        } for p in get_catalog().products]
+        products.sort(key=lambda p: p['sales'], reverse=True)
+        return jsonify(products[:limite])
+    except Exception as e:
+        print(f"Error en API products: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route("/api/customers")
+def api_customers():
+    """Clientes frecuentes: comandas, total gastado y última visita"""
+    limite = parse_limite(10, 100)
+    try:
+        return jsonify([{
+            'id': c['id'],
+            'name': c['name'],
+            'ordersCount': c['visits'],
+            'total': c['spend'],
+            'lastSeen': c['last_seen']
+        } for c in customers.top(get_read_db(), limite)])
+    except Exception as e:
+        print(f"Error en API customers: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def fetch_comanda(db, order_id, prefix=""):
+    """(comanda, líneas) desde la base en uso o, con prefix, desde una partición."""
     cur = db.cursor()
-    cur.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
+    cur.execute(f"SELECT * FROM {prefix}orders WHERE id = ?", (order_id,))
     order = cur.fetchone()
     if not order:
-        return "Orden no encontrada", 404
-    cur.execute("""SELECT oi.*, p.name as product_name, p.base_protein, p.price, p.cost, p.category
-                   FROM order_items oi JOIN products p ON oi.product_id = p.id
-                   WHERE oi.order_id = ?""", (order_id,))
-    items = cur.fetchall()
+        return None, []
+    cur.execute(f"""SELECT oi.*, p.name as product_name, p.base_protein,
+                          oi.unit_price as price, oi.unit_cost as cost, COALESCE(c.name, '') as category
+                   FROM {prefix}order_items oi
+                   JOIN products p ON oi.product_id = p.id
+                   LEFT JOIN categories c ON c.id = p.category_id
+                   WHERE oi.order_id = ?
+                   ORDER BY oi.id""", (order_id,))
+    return order, cur.fetchall()
+
+def archived_order_response(db, order_id):
+    """Respuesta 409 si la comanda está en un mes archivado (sólo lectura); si no, None."""
+    partition = archive.partition_for_order(db, order_id)
+    if partition is None:
+        return None
+    return (f"La comanda #{order_id} es de un mes archivado ({partition.month}); "
+            f"para modificarla, restaurar el mes con `flask archive-restore {partition.month}`"), 409
+
+@app.route("/comanda/<int:order_id>")
+def comanda(order_id):
+    db = get_read_db()
+    order, items = fetch_comanda(db, order_id)
+    if not order:
+        # Las comandas de meses archivados se leen desde su partición
+        partition = archive.partition_for_order(db, order_id)
+        if partition is None:
+            return "Orden no encontrada", 404
+        with archive.opened(db, partition) as prefix:
+            order, items = fetch_comanda(db, order_id, prefix)
+        if not order:
+            return "Orden no encontrada", 404
     subtotal = sum(item["price"] * item["qty"] for item in items)
     total_cost = sum(item["cost"] * item["qty"] for item in items)
     return render_template("comanda.html", order=order, items=items, subtotal=subtotal, total_cost=total_cost)
 
-'''@app.route("/orders/list")
-def orders_list():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT * FROM orders ORDER BY id DESC LIMIT 50")
-    orders = cur.fetchall()
-    return render_template("orders_list.html", orders=orders)'''
-    
-@app.route("/orders/list")
-def orders_list():
-    db = get_db()
-    cur = db.cursor()
-    
-    # Consulta actualizada para asegurar que total_venta nunca sea NULL
-    cur.execute("""
-        SELECT o.*, 
-               COALESCE(SUM(p.price * oi.qty), 0) as total_venta,
-               COUNT(oi.id) as total_items
-        FROM orders o
-        LEFT JOIN order_items oi ON o.id = oi.order_id
-        LEFT JOIN products p ON oi.product_id = p.id
-        GROUP BY o.id
-        ORDER BY o.id DESC 
-        LIMIT 50
-    """)
-    orders = cur.fetchall()
-    return render_template("orders_list.html", orders=orders)
-
-# --- Thermal printing function ---
-def print_to_thermal(order_id):
-    if not ESC_POS_AVAILABLE:
-        current_app.logger.warning("python-escpos no disponible; impresión omitida")
-        return
+@app.route("/kitchen")
+def kitchen_display():
+    """Pantalla de cocina: se actualiza sola con los eventos de /api/kitchen/stream"""
+    return render_template("kitchen.html")
+
+@app.route("/api/kitchen/orders")
+def api_kitchen_orders():
+    """Carga inicial de la pantalla: últimas comandas y el id de evento desde el que seguir"""
+    limite = parse_limite(30, 200)
     try:
-        db = sqlite3.connect(DB_PATH)
-        db.row_factory = sqlite3.Row
-        cur = db.cursor()
-        cur.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
-        order = cur.fetchone()
-        cur.execute("""SELECT oi.*, p.name as product_name, p.base_protein, p.price
-                       FROM order_items oi JOIN products p ON oi.product_id = p.id
-                       WHERE oi.order_id = ?""", (order_id,))
-        items = cur.fetchall()
-        # connect to printer
-        p = Usb(VENDOR_ID, PRODUCT_ID, USB_INTERFACE, timeout=0, profile=None)
-        # Header compacto
-        p.text("SANDWICHERÍA - COMANDA\n")
-        p.text(f"#{order_id} - {order['created_at'][:16]}\n")
-        if order['customer_name']:
-            p.text(f"Cliente: {order['customer_name']}\n")
-        p.text("---------------\n")
-        for it in items:
-            line = f"{it['qty']} x {it['product_name']}\n"
-            p.text(line)
-            
-            # Note retrieval from DB
-            cur2 = db.cursor()
-            cur2.execute("SELECT note FROM order_items WHERE order_id=? AND product_id=? LIMIT 1", (order_id, it['product_id']))
-            row = cur2.fetchone()
-            
-            # Mostrar proteína seleccionada o proteína base
-            protein_shown = False
-            if row and row['note']:
-                # Si la nota contiene una proteína (Churrasco, Lomito, Pollo), mostrarla
-                note_parts = row['note'].split(' - ')
-                if note_parts[0] in ['Churrasco', 'Lomito', 'Pollo']:
-                    p.text(f"  {note_parts[0]}\n")
-                    protein_shown = True
-                    # Si hay más información en la nota después del guión
-                    if len(note_parts) > 1:
-                        p.text(f"  Nota: {' - '.join(note_parts[1:])}\n")
-                else:
-                    # Si no es una proteína, mostrar la nota completa
-                    p.text(f"  Nota: {row['note']}\n")
-            
-            # Si no se mostró proteína personalizada, mostrar la proteína base del producto
-            if not protein_shown and it['base_protein'] and it['base_protein'] != "—":
-                p.text(f"  {it['base_protein']}\n")
-        p.text("¡Gracias!\n")
-        p.cut()
-        db.close()
+        last_event_id, orders = kitchen.recent_orders(get_read_db(), limite)
+        return jsonify({'last_event_id': last_event_id, 'orders': orders})
     except Exception as e:
-        current_app.logger.error(f"Error imprimiendo en térmica: {e}")
-        
+        print(f"Error en API kitchen orders: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route("/api/kitchen/stream")
+def api_kitchen_stream():
+    """Comandas nuevas, editadas y borradas como server-sent events"""
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({'error': f"Last-Event-ID inválido: {last_id!r}"}), 400
+    if kitchen_bus.stats()["subscribers"] >= KITCHEN_MAX_STREAMS:
+        response = jsonify({'error': 'Demasiadas pantallas conectadas'})
+        response.headers["Retry-After"] = "10"
+        return response, 503
+    # El generador no usa el contexto del request ni conexiones del request
+    response = Response(kitchen_bus.stream(last_id, KITCHEN_STREAM_SECONDS), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # nginx: no acumular el stream
+    return response
+
+@app.route("/api/kitchen")
+def api_kitchen():
+    """Pantallas conectadas y estado del buffer de eventos de cocina"""
+    return jsonify(kitchen_bus.stats())
+
+@app.route("/orders/list")
+def orders_list():
+    query = order_pages.OrderPageQuery.from_args(request.args)
+    orders, next_cursor = order_pages.fetch_page(get_read_db(), query)
+    return render_template("orders_list.html", orders=orders, next_cursor=next_cursor,
+                           filtros=query.args())
+
 @app.route("/products/<int:pid>/delete", methods=["POST"])
 def delete_product(pid):
     db = get_db()
@@ -433,182 +1035,218 @@ def delete_product(pid):
     
     if usage["count"] > 0:
         return "No se puede eliminar: este producto tiene órdenes asociadas", 400
+
+    # También las ventas de meses archivados (sus comandas ya no están en
+    # order_items, pero sus lecturas y el agregado diario apuntan al producto)
+    cur.execute("""SELECT EXISTS (SELECT 1 FROM archived_product_stats WHERE product_id = ?)
+                       OR EXISTS (SELECT 1 FROM daily_sales WHERE product_id = ?)""", (pid, pid))
+    if cur.fetchone()[0]:
+        return "No se puede eliminar: este producto tiene ventas en meses archivados", 400
     
     # Eliminar el producto
     cur.execute("DELETE FROM products WHERE id = ?", (pid,))
+    data_version.bump(cur, data_version.PRODUCTS)
     db.commit()
+    catalog_cache.invalidate()
     
     return redirect(url_for("products"))
 
 # --- API Endpoints para Reportería ---
+@app.errorhandler(FilterError)
+def handle_filter_error(e):
+    """Filtros de fecha/categoría inválidos en los endpoints de reportes"""
+    return jsonify({'error': str(e)}), 400
+
 @app.route("/reports")
 def reports():
     """Página principal de reportes"""
     return render_template("reports.html")
 
 @app.route("/api/ventas")
+@cached_report(store=False)
 def api_ventas():
-    """Endpoint para obtener datos de ventas con filtros opcionales"""
+    """Endpoint para obtener datos de ventas con filtros opcionales
+
+    formato=json (defecto) responde el arreglo completo y formato=ndjson o
+    formato=csv lo mismo en esos formatos, todo escrito a medida que se lee.
+    Con cursor o limit responde una página: {"ventas": [...], "next_cursor"}.
+    """
+    filtros = ReportFilters.from_args(request.args)
+    formato = request.args.get('formato', 'json')
+    if formato not in VENTAS_STREAMS:
+        raise FilterError(f"Formato inválido: {formato!r} (json, ndjson o csv)")
+    if formato == 'json' and ('cursor' in request.args or 'limit' in request.args):
+        limit = sales_rows.parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        after = sales_rows.decode_cursor(cursor) if cursor else None
+        try:
+            ventas, next_cursor = sales_rows.fetch_page(get_report_db(), filtros, after, limit)
+            return jsonify({'ventas': ventas, 'next_cursor': next_cursor})
+        except Exception as e:
+            print(f"Error en API ventas: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    def generate():
+        try:
+            yield from VENTAS_STREAMS[formato](sales_rows.iter_rows(get_report_db(), filtros))
+        except Exception as e:
+            # El código de estado ya se envió; sólo queda registrarlo
+            app.logger.error(f"Error en API ventas (streaming): {e}")
+            raise
+
+    mimetype, extension = VENTAS_MIMETYPES[formato]
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    if formato == 'csv':
+        response.headers['Content-Disposition'] = f'attachment; filename="ventas.{extension}"'
+    return response
+
+VENTAS_STREAMS = {
+    'json': sales_rows.stream_json,
+    'ndjson': sales_rows.stream_ndjson,
+    'csv': sales_rows.stream_csv,
+}
+VENTAS_MIMETYPES = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+@app.route("/api/export", methods=["GET", "POST"])
+def api_export():
+    """Exporta las ventas filtradas: formato=csv (defecto), xlsx o pdf.
+
+    GET responde el archivo directamente, salvo que haya más de
+    EXPORT_SYNC_MAX_ROWS filas. POST (o muchas filas) lo genera en segundo
+    plano y responde 202 con la URL para consultar el trabajo.
+    """
+    filtros = ReportFilters.from_args(request.args)
+    formato = request.args.get('formato', 'csv')
+    if formato not in exports.FORMATS:
+        raise FilterError(f"Formato inválido: {formato!r} (csv, xlsx o pdf)")
+    if formato == 'pdf' and not exports.REPORTLAB_AVAILABLE:
+        return jsonify({'error': 'La exportación a PDF requiere reportlab'}), 501
+
+    background = request.method == "POST"
+    # El PDF es un resumen desde el agregado diario: siempre es chico
+    if not background and formato != 'pdf':
+        background = sales_rows.count_rows(get_report_db(), filtros) > EXPORT_SYNC_MAX_ROWS
+    if background:
+        job_id = export_manager.submit(get_db(), formato, filtros, request.query_string.decode())
+        return jsonify({
+            'id': job_id,
+            'status': exports.PENDING,
+            'status_url': url_for("api_export_status", job_id=job_id)
+        }), 202
+
+    mimetype, _ = exports.FORMATS[formato]
+    nombre = exports.filename(formato, filtros)
+    if formato == 'csv':
+        rows = sales_rows.iter_rows(get_report_db(), filtros)
+        response = Response(stream_with_context(exports.csv_chunks(rows)), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return response
+    # XLSX y PDF necesitan un archivo: se arma en disco, no en memoria
+    f = tempfile.TemporaryFile()
     try:
-        # Obtener parámetros de filtro si existen
-        fecha_inicio = request.args.get('fecha_inicio')
-        fecha_fin = request.args.get('fecha_fin')
-        categoria = request.args.get('categoria')
-        
-        db = get_db()
-        cur = db.cursor()
-        
-        # Construir consulta base
-        query = """
-            SELECT 
-                o.id as idPedido, 
-                o.created_at as fecha, 
-                o.customer_name as cliente,
-                p.name as producto, 
-                p.category as categoria, 
-                oi.qty as cantidad, 
-                p.price as precio, 
-                (p.price * oi.qty) as total,
-                (p.cost * oi.qty) as costo
-            FROM orders o
-            JOIN order_items oi ON o.id = oi.order_id
-            JOIN products p ON oi.product_id = p.id
-            WHERE 1=1
-        """
-        params = []
-        
-        # Aplicar filtros si se proporcionan
-        if fecha_inicio:
-            query += " AND DATE(o.created_at) >= ?"
-            params.append(fecha_inicio)
-        if fecha_fin:
-            query += " AND DATE(o.created_at) <= ?"
-            params.append(fecha_fin)
-        if categoria:
-            query += " AND p.category = ?"
-            params.append(categoria)
-            
-        query += " ORDER BY o.created_at DESC"
-        
-        cur.execute(query, params)
-        ventas = cur.fetchall()
-        
-        # Convertir a lista de diccionarios
-        resultados = []
-        for v in ventas:
-            resultados.append({
-                'idPedido': v['idPedido'],
-                'fecha': v['fecha'],
-                'cliente': v['cliente'] or 'Cliente no especificado',
-                'producto': v['producto'],
-                'categoria': v['categoria'],
-                'cantidad': v['cantidad'],
-                'precio': v['precio'],
-                'total': v['total'],
-                'costo': v['costo']
-            })
-        
-        return jsonify(resultados)
-        
+        exports.write_export(get_report_db(), formato, filtros, f)
+    except Exception:
+        f.close()
+        raise
+    f.seek(0)
+    return send_file(f, mimetype=mimetype, as_attachment=True, download_name=nombre)
+
+@app.route("/api/export/<int:job_id>")
+def api_export_status(job_id):
+    """Estado de una exportación en segundo plano."""
+    job = get_read_db().execute("SELECT * FROM export_jobs WHERE id = ?", (job_id,)).fetchone()
+    if job is None:
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    data = dict(job)
+    if job['status'] == exports.DONE:
+        data['download_url'] = url_for("api_export_download", job_id=job_id)
+    return jsonify(data)
+
+@app.route("/api/export/<int:job_id>/download")
+def api_export_download(job_id):
+    job = get_read_db().execute("SELECT * FROM export_jobs WHERE id = ?", (job_id,)).fetchone()
+    if job is None or job['status'] != exports.DONE or not os.path.exists(export_manager.path(job_id)):
+        return jsonify({'error': 'Exportación no disponible'}), 404
+    return send_file(export_manager.path(job_id), mimetype=exports.FORMATS[job['formato']][0],
+                     as_attachment=True, download_name=job['filename'])
+
+@app.route("/api/dashboard")
+@cached_report()
+def api_dashboard():
+    """Todo el dashboard de /reports en una sola respuesta
+
+    Incluye metricas, ventas_por_dia, ventas_por_categoria, top_productos
+    (limite, por defecto 5) y ventas_por_dia_semana. La categoría filtra
+    sólo las métricas, como en la página de reportes.
+    """
+    filtros = ReportFilters.from_args(request.args)
+    limite = parse_limite(5, 100)
+    try:
+        return jsonify(dashboard.compute(get_report_db(), filtros, top_n=limite))
     except Exception as e:
-        print(f"Error en API ventas: {e}")
+        print(f"Error en API dashboard: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route("/api/metricas")
+@cached_report()
 def api_metricas():
     """Endpoint para obtener métricas resumidas de ventas"""
+    filtros = ReportFilters.from_args(request.args)
     try:
-        # Obtener parámetros de filtro si existen
-        fecha_inicio = request.args.get('fecha_inicio')
-        fecha_fin = request.args.get('fecha_fin')
-        categoria = request.args.get('categoria')
-        
-        db = get_db()
+        db = get_report_db()
         cur = db.cursor()
         
-        # Construir consulta base
-        query = """
-            SELECT 
-                COUNT(DISTINCT o.id) as total_pedidos,
-                SUM(p.price * oi.qty) as ventas_totales,
-                SUM(p.cost * oi.qty) as costos_totales,
-                COUNT(DISTINCT o.customer_name) as clientes_unicos
-            FROM orders o
-            JOIN order_items oi ON o.id = oi.order_id
-            JOIN products p ON oi.product_id = p.id
-            WHERE 1=1
-        """
-        params = []
-        
-        # Aplicar filtros si se proporcionan
-        if fecha_inicio:
-            query += " AND DATE(o.created_at) >= ?"
-            params.append(fecha_inicio)
-        if fecha_fin:
-            query += " AND DATE(o.created_at) <= ?"
-            params.append(fecha_fin)
-        if categoria:
-            query += " AND p.category = ?"
-            params.append(categoria)
-        
-        cur.execute(query, params)
+        # Ventas y costos desde el agregado diario
+        where, params = filtros.where("fecha", "category")
+        cur.execute("""
+            SELECT SUM(ventas) as ventas_totales, SUM(costos) as costos_totales
+            FROM daily_sales
+            WHERE 1=1""" + where, params)
         metricas = cur.fetchone()
         
-        # Calcular métricas adicionales
-        ventas_totales = metricas['ventas_totales'] or 0
-        costos_totales = metricas['costos_totales'] or 0
-        total_pedidos = metricas['total_pedidos'] or 0
-        clientes_unicos = metricas['clientes_unicos'] or 0
+        # Comandas distintas por día (categoría '*' = todas)
+        where, params = filtros.where("fecha", None)
+        cur.execute("SELECT SUM(pedidos) FROM daily_orders WHERE category = ?" + where,
+                    [filtros.categoria or rollup.ALL_CATEGORIES] + params)
+        total_pedidos = cur.fetchone()[0] or 0
         
-        ticket_promedio = ventas_totales / total_pedidos if total_pedidos > 0 else 0
-        margen_beneficio = ((ventas_totales - costos_totales) / ventas_totales * 100) if ventas_totales > 0 else 0
+        # Clientes únicos: no se puede sumar por día, se cuenta sobre orders
+        clientes_unicos = dashboard.unique_customers(db, filtros)
         
-        return jsonify({
-            'ventas_totales': ventas_totales,
-            'costos_totales': costos_totales,
-            'total_pedidos': total_pedidos,
-            'clientes_unicos': clientes_unicos,
-            'ticket_promedio': ticket_promedio,
-            'margen_beneficio': margen_beneficio
-        })
+        return jsonify(dashboard.metrics(metricas['ventas_totales'] or 0, metricas['costos_totales'] or 0,
+                                         total_pedidos, clientes_unicos))
         
     except Exception as e:
         print(f"Error en API métricas: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route("/api/ventas-por-categoria")
+@cached_report()
 def api_ventas_por_categoria():
     """Endpoint para obtener ventas agrupadas por categoría"""
+    filtros = ReportFilters.from_args(request.args)
     try:
-        # Obtener parámetros de filtro si existen
-        fecha_inicio = request.args.get('fecha_inicio')
-        fecha_fin = request.args.get('fecha_fin')
-        
-        db = get_db()
+        db = get_report_db()
         cur = db.cursor()
         
         query = """
             SELECT 
-                p.category as categoria,
-                SUM(p.price * oi.qty) as ventas_totales,
-                SUM(p.cost * oi.qty) as costos_totales,
-                SUM(oi.qty) as cantidad_vendida
-            FROM orders o
-            JOIN order_items oi ON o.id = oi.order_id
-            JOIN products p ON oi.product_id = p.id
+                category as categoria,
+                SUM(ventas) as ventas_totales,
+                SUM(costos) as costos_totales,
+                SUM(cantidad) as cantidad_vendida
+            FROM daily_sales
             WHERE 1=1
         """
-        params = []
-        
-        # Aplicar filtros si se proporcionan
-        if fecha_inicio:
-            query += " AND DATE(o.created_at) >= ?"
-            params.append(fecha_inicio)
-        if fecha_fin:
-            query += " AND DATE(o.created_at) <= ?"
-            params.append(fecha_fin)
+        # Aplicar filtros sobre la clave de día del agregado
+        where, params = filtros.where("fecha", "category")
+        query += where
             
-        query += " GROUP BY p.category ORDER BY ventas_totales DESC"
+        query += " GROUP BY category ORDER BY ventas_totales DESC"
         
         cur.execute(query, params)
         categorias = cur.fetchall()
@@ -629,39 +1267,31 @@ def api_ventas_por_categoria():
         return jsonify({'error': str(e)}), 500
 
 @app.route("/api/top-productos")
+@cached_report()
 def api_top_productos():
     """Endpoint para obtener los productos más vendidos"""
+    filtros = ReportFilters.from_args(request.args)
+    limite = parse_limite(5, 100)
     try:
-        # Obtener parámetros de filtro si existen
-        fecha_inicio = request.args.get('fecha_inicio')
-        fecha_fin = request.args.get('fecha_fin')
-        limite = request.args.get('limite', 5)
         
-        db = get_db()
+        db = get_report_db()
         cur = db.cursor()
         
         query = """
             SELECT 
                 p.name as producto,
-                p.category as categoria,
-                SUM(oi.qty) as cantidad_vendida,
-                SUM(p.price * oi.qty) as ventas_totales
-            FROM orders o
-            JOIN order_items oi ON o.id = oi.order_id
-            JOIN products p ON oi.product_id = p.id
+                ds.category as categoria,
+                SUM(ds.cantidad) as cantidad_vendida,
+                SUM(ds.ventas) as ventas_totales
+            FROM daily_sales ds
+            JOIN products p ON ds.product_id = p.id
             WHERE 1=1
         """
-        params = []
-        
-        # Aplicar filtros si se proporcionan
-        if fecha_inicio:
-            query += " AND DATE(o.created_at) >= ?"
-            params.append(fecha_inicio)
-        if fecha_fin:
-            query += " AND DATE(o.created_at) <= ?"
-            params.append(fecha_fin)
+        # Aplicar filtros sobre la clave de día del agregado
+        where, params = filtros.where("ds.fecha", "ds.category")
+        query += where
             
-        query += " GROUP BY p.id ORDER BY ventas_totales DESC LIMIT ?"
+        query += " GROUP BY ds.product_id ORDER BY ventas_totales DESC LIMIT ?"
         params.append(limite)
         
         cur.execute(query, params)
@@ -683,38 +1313,30 @@ def api_top_productos():
         return jsonify({'error': str(e)}), 500
 
 @app.route("/api/ventas-por-dia")
+@cached_report()
 def api_ventas_por_dia():
     """Endpoint para obtener ventas agrupadas por día"""
+    filtros = ReportFilters.from_args(request.args)
     try:
-        # Obtener parámetros de filtro si existen
-        fecha_inicio = request.args.get('fecha_inicio')
-        fecha_fin = request.args.get('fecha_fin')
-        
-        db = get_db()
+        db = get_report_db()
         cur = db.cursor()
         
+        # Totales por día desde el agregado; comandas desde daily_orders
+        where, params = filtros.where("fecha", "category")
         query = """
             SELECT 
-                DATE(o.created_at) as fecha,
-                COUNT(DISTINCT o.id) as total_pedidos,
-                SUM(p.price * oi.qty) as ventas_totales,
-                SUM(oi.qty) as cantidad_vendida
-            FROM orders o
-            JOIN order_items oi ON o.id = oi.order_id
-            JOIN products p ON oi.product_id = p.id
-            WHERE 1=1
+                s.fecha as fecha,
+                d.pedidos as total_pedidos,
+                s.ventas_totales,
+                s.cantidad_vendida
+            FROM (SELECT fecha, SUM(ventas) as ventas_totales, SUM(cantidad) as cantidad_vendida
+                  FROM daily_sales
+                  WHERE 1=1""" + where + """
+                  GROUP BY fecha) s
+            JOIN daily_orders d ON d.fecha = s.fecha AND d.category = ?
+            ORDER BY s.fecha
         """
-        params = []
-        
-        # Aplicar filtros si se proporcionan
-        if fecha_inicio:
-            query += " AND DATE(o.created_at) >= ?"
-            params.append(fecha_inicio)
-        if fecha_fin:
-            query += " AND DATE(o.created_at) <= ?"
-            params.append(fecha_fin)
-            
-        query += " GROUP BY DATE(o.created_at) ORDER BY fecha"
+        params.append(filtros.categoria or rollup.ALL_CATEGORIES)
         
         cur.execute(query, params)
         dias = cur.fetchall()
@@ -735,19 +1357,19 @@ def api_ventas_por_dia():
         return jsonify({'error': str(e)}), 500
 
 @app.route("/api/ventas-por-dia-semana")
+@cached_report()
 def api_ventas_por_dia_semana():
     """Endpoint para obtener ventas agrupadas por día de la semana"""
+    filtros = ReportFilters.from_args(request.args)
     try:
-        # Obtener parámetros de filtro si existen
-        fecha_inicio = request.args.get('fecha_inicio')
-        fecha_fin = request.args.get('fecha_fin')
-        
-        db = get_db()
+        db = get_report_db()
         cur = db.cursor()
         
+        # Totales por día desde el agregado, agrupados luego por día de semana
+        where, params = filtros.where("fecha", "category")
         query = """
             SELECT 
-                CASE CAST(strftime('%w', o.created_at) AS INTEGER)
+                CASE CAST(strftime('%w', s.fecha) AS INTEGER)
                     WHEN 0 THEN 'Domingo'
                     WHEN 1 THEN 'Lunes'
                     WHEN 2 THEN 'Martes'
@@ -756,22 +1378,15 @@ def api_ventas_por_dia_semana():
                     WHEN 5 THEN 'Viernes'
                     ELSE 'Sábado'
                 END as dia_semana,
-                SUM(p.price * oi.qty) as ventas_totales,
-                COUNT(DISTINCT o.id) as total_pedidos
-            FROM orders o
-            JOIN order_items oi ON o.id = oi.order_id
-            JOIN products p ON oi.product_id = p.id
-            WHERE 1=1
+                SUM(s.ventas) as ventas_totales,
+                SUM(d.pedidos) as total_pedidos
+            FROM (SELECT fecha, SUM(ventas) as ventas
+                  FROM daily_sales
+                  WHERE 1=1""" + where + """
+                  GROUP BY fecha) s
+            JOIN daily_orders d ON d.fecha = s.fecha AND d.category = ?
         """
-        params = []
-        
-        # Aplicar filtros si se proporcionan
-        if fecha_inicio:
-            query += " AND DATE(o.created_at) >= ?"
-            params.append(fecha_inicio)
-        if fecha_fin:
-            query += " AND DATE(o.created_at) <= ?"
-            params.append(fecha_fin)
+        params.append(filtros.categoria or rollup.ALL_CATEGORIES)
             
         query += " GROUP BY dia_semana ORDER BY ventas_totales DESC"
         
@@ -807,15 +1422,29 @@ def api_ventas_por_dia_semana():
 def delete_order(order_id):
     db = get_db()
     cur = db.cursor()
+    if cur.execute("SELECT 1 FROM orders WHERE id = ?", (order_id,)).fetchone() is None:
+        return archived_order_response(db, order_id) or ("Orden no encontrada", 404)
     
     try:
-        # Primero eliminar los items de la orden
+        # Restar la comanda del agregado diario y de los contadores antes de borrar sus items
+        rollup.apply_order(cur, order_id, sign=-1)
+        live_stats.apply_order(cur, order_id, sign=-1)
+        
+        # Primero eliminar los items y los trabajos de impresión de la orden
         cur.execute("DELETE FROM order_items WHERE order_id = ?", (order_id,))
+        print_queue.remove_jobs(cur, order_id)
         
         # Luego eliminar la orden
         cur.execute("DELETE FROM orders WHERE id = ?", (order_id,))
+        deleted = cur.rowcount
+        data_version.bump(cur, data_version.ORDERS)
+        # Las pantallas sólo reciben eventos de comandas que existían
+        if deleted:
+            kitchen.publish(cur, kitchen.DELETED, order_id)
         
         db.commit()
+        if deleted:
+            kitchen_bus.notify()
         return redirect(url_for("orders_list"))
     except Exception as e:
         db.rollback()
@@ -823,27 +1452,37 @@ def delete_order(order_id):
 
 @app.route("/orders/<int:order_id>/edit", methods=["GET", "POST"])
 def edit_order(order_id):
-    db = get_db()
-    cur = db.cursor()
-    
     if request.method == "POST":
+        db = get_db()
+        cur = db.cursor()
         nuevo_nombre = request.form["customer_name"].strip()
+        if cur.execute("SELECT 1 FROM orders WHERE id = ?", (order_id,)).fetchone() is None:
+            return archived_order_response(db, order_id) or ("Orden no encontrada", 404)
         
         try:
-            cur.execute("UPDATE orders SET customer_name = ? WHERE id = ?", 
-                       (nuevo_nombre, order_id))
+            customer_id = customer_index.resolve(cur, nuevo_nombre)
+            live_stats.move_order(cur, order_id, customer_id)
+            cur.execute("UPDATE orders SET customer_name = ?, customer_id = ? WHERE id = ?", 
+                       (nuevo_nombre, customer_id, order_id))
+            updated = cur.rowcount
+            data_version.bump(cur, data_version.ORDERS)
+            if updated:
+                kitchen.publish(cur, kitchen.UPDATED, order_id)
             db.commit()
+            if updated:
+                kitchen_bus.notify()
             return redirect(url_for("orders_list"))
         except Exception as e:
             db.rollback()
             return f"Error actualizando la orden: {str(e)}", 500
     
     # GET - Mostrar formulario de edición
+    cur = get_read_db().cursor()
     cur.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
     order = cur.fetchone()
     
     if not order:
-        return "Orden no encontrada", 404
+        return archived_order_response(get_read_db(), order_id) or ("Orden no encontrada", 404)
         
     return render_template("edit_order.html", order=order)
 
@@ -860,87 +1499,84 @@ def format_number(value, format_type=','):
     except (ValueError, TypeError):
         return str(value)
         
+# --- Categorías de productos ---
+def categories_changed(cur):
+    """Después de escribir categorías: versión de productos y catálogo en memoria."""
+    data_version.bump(cur, data_version.PRODUCTS)
+    get_db().commit()
+    catalog_cache.invalidate()
+
 # Ruta para obtener todas las categorías
 @app.route('/api/categories', methods=['GET'])
 def get_categories():
     try:
-        categories = Category.query.order_by(Category.name).all()
-        return jsonify([{'id': cat.id, 'name': cat.name} for cat in categories])
+        return jsonify([{'id': c['id'], 'name': c['name'], 'products': c['products']}
+                        for c in catalog_repo.list_categories(get_read_db())])
     except Exception as e:
+        print(f"Error en API categories: {e}")
         return jsonify({'error': str(e)}), 500
 
 # Ruta para crear una nueva categoría
 @app.route('/api/categories', methods=['POST'])
 def create_category():
+    db = get_db()
     try:
-        data = request.get_json()
-        name = data.get('name', '').strip().upper()
-        
-        if not name:
-            return jsonify({'error': 'El nombre de la categoría es requerido'}), 400
-        
-        # Verificar si ya existe
-        existing = Category.query.filter_by(name=name).first()
-        if existing:
-            return jsonify({'error': 'La categoría ya existe'}), 400
-        
-        new_category = Category(name=name)
-        db.session.add(new_category)
-        db.session.commit()
-        
-        return jsonify({'id': new_category.id, 'name': new_category.name}), 201
+        data = request.get_json(silent=True) or {}
+        cur = db.cursor()
+        category_id = catalog_repo.create_category(cur, data.get('name', ''))
+        categories_changed(cur)
+        return jsonify(dict(catalog_repo.get_category(db, category_id))), 201
+    except catalog_repo.CategoryError as e:
+        db.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        db.session.rollback()
+        db.rollback()
+        print(f"Error en API categories: {e}")
         return jsonify({'error': str(e)}), 500
 
 # Ruta para actualizar una categoría
 @app.route('/api/categories/<int:category_id>', methods=['PUT'])
 def update_category(category_id):
+    db = get_db()
     try:
-        data = request.get_json()
-        new_name = data.get('name', '').strip().upper()
-        
-        if not new_name:
-            return jsonify({'error': 'El nombre de la categoría es requerido'}), 400
-        
-        category = Category.query.get_or_404(category_id)
-        
-        # Verificar si el nuevo nombre ya existe
-        existing = Category.query.filter(Category.name == new_name, Category.id != category_id).first()
-        if existing:
-            return jsonify({'error': 'Ya existe una categoría con ese nombre'}), 400
-        
-        category.name = new_name
-        db.session.commit()
-        
-        return jsonify({'id': category.id, 'name': category.name})
+        data = request.get_json(silent=True) or {}
+        cur = db.cursor()
+        if not catalog_repo.rename_category(cur, category_id, data.get('name', '')):
+            db.rollback()
+            return jsonify({'error': 'Categoría no encontrada'}), 404
+        categories_changed(cur)
+        return jsonify(dict(catalog_repo.get_category(db, category_id)))
+    except catalog_repo.CategoryError as e:
+        db.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        db.session.rollback()
+        db.rollback()
+        print(f"Error en API categories: {e}")
         return jsonify({'error': str(e)}), 500
 
 # Ruta para eliminar una categoría
 @app.route('/api/categories/<int:category_id>', methods=['DELETE'])
 def delete_category(category_id):
+    db = get_db()
     try:
-        category = Category.query.get_or_404(category_id)
-        
-        # Verificar si hay productos asociados
-        product_count = Product.query.filter_by(category_id=category_id).count()
-        if product_count > 0:
-            return jsonify({'error': f'No se puede eliminar la categoría porque tiene {product_count} producto(s) asociado(s)'}), 400
-        
-        db.session.delete(category)
-        db.session.commit()
-        
+        cur = db.cursor()
+        if not catalog_repo.delete_category(cur, category_id):
+            db.rollback()
+            return jsonify({'error': 'Categoría no encontrada'}), 404
+        categories_changed(cur)
         return jsonify({'message': 'Categoría eliminada correctamente'})
+    except catalog_repo.CategoryError as e:
+        db.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        db.session.rollback()
+        db.rollback()
+        print(f"Error en API categories: {e}")
         return jsonify({'error': str(e)}), 500
 
-        
-    
 if __name__ == '__main__':
     # Inicializar la base de datos antes de ejecutar la aplicación
     setup_database()
     # Si no quieres impresión automática, deja ENABLE_PRINTER=False.
+    if ENABLE_PRINTER:
+        print_spooler.start()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,356 @@
+"""Archivo mensual de la historia de comandas en archivos SQLite aparte.
+
+Los meses cerrados de orders/order_items se mueven a un archivo por mes
+(<base>_archive/orders_AAAA-MM.db) y salen de la base en uso, que queda
+con los meses recientes: sus tablas, índices y recorridos no crecen con los
+años de historia.
+
+Qué queda en la base en uso:
+  - archive_partitions: un registro por mes archivado (archivo, rango de
+    ids y cantidades). Una partición sólo existe para las lecturas cuando
+    su registro está confirmado.
+  - el agregado diario (daily_sales/daily_orders) y los contadores del
+    inicio no se tocan: los meses archivados quedan congelados ahí. Para que
+    rebuild/check sigan cuadrando, lo archivado de cada mes se resume en
+    archived_product_stats y archived_customer_stats.
+
+Las lecturas de filas (/api/ventas, exportaciones, listado de comandas,
+clientes únicos, /comanda/<id>) recorren primero la base en uso y después
+las particiones del rango pedido, de la más nueva a la más vieja. Cada una
+se adjunta con ATTACH sólo mientras se lee (opened()), así una conexión
+nunca acumula archivos adjuntos.
+
+Archivar un mes (archive_month) son dos pasos: primero se copian las filas
+al archivo del mes y se confirma esa escritura; después, en una sola
+transacción de la base en uso, se registra la partición, se guardan sus
+resúmenes y se borran las filas (y los trabajos de impresión de esas
+comandas, que ya no se van a imprimir). Si el proceso se corta entre ambos, el
+archivo queda con filas que nadie lee y la próxima corrida lo repite
+(INSERT OR REPLACE).
+"""
+import collections
+import contextlib
+import datetime
+import logging
+import os
+
+import data_version
+import replica
+
+logger = logging.getLogger(__name__)
+
+MAIN = "main"
+
+# Esquema de cada partición: las columnas de hoy de orders/order_items, con
+# los índices que usan las lecturas por fecha y el join con los items
+_PARTITION_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS {schema}.orders (
+        id INTEGER PRIMARY KEY,
+        created_at TEXT,
+        customer_name TEXT,
+        total INTEGER NOT NULL DEFAULT 0,
+        item_count INTEGER NOT NULL DEFAULT 0,
+        customer_id INTEGER
+    )""",
+    """CREATE TABLE IF NOT EXISTS {schema}.order_items (
+        id INTEGER PRIMARY KEY,
+        order_id INTEGER,
+        product_id INTEGER,
+        qty INTEGER,
+        note TEXT,
+        unit_price INTEGER,
+        unit_cost INTEGER
+    )""",
+    """CREATE INDEX IF NOT EXISTS {schema}.idx_orders_created_at
+       ON orders (created_at, id, customer_name, customer_id)""",
+    """CREATE INDEX IF NOT EXISTS {schema}.idx_order_items_order
+       ON order_items (order_id, product_id, qty, unit_price, unit_cost)""",
+]
+_ORDER_COLUMNS = "id, created_at, customer_name, total, item_count, customer_id"
+_ITEM_COLUMNS = "id, order_id, product_id, qty, note, unit_price, unit_cost"
+
+Partition = collections.namedtuple("Partition", "month file first_id last_id orders items archived_at")
+
+
+class ArchiveError(Exception):
+    pass
+
+
+# --- Meses ---
+
+def month_start(month):
+    """'AAAA-MM' -> 'AAAA-MM-01'."""
+    return f"{month}-01"
+
+
+def next_month(month):
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
+
+
+def parse_month(text):
+    try:
+        if len(text) != 7:
+            raise ValueError
+        datetime.date.fromisoformat(month_start(text))
+    except (TypeError, ValueError):
+        raise ArchiveError(f"Mes inválido: {text!r} (se espera AAAA-MM)")
+    return text
+
+
+def closed_months(db, keep_months, today=None):
+    """Meses con comandas en la base en uso anteriores al corte.
+
+    Se conservan el mes en curso y los keep_months anteriores.
+    """
+    today = today or datetime.date.today()
+    cutoff = f"{today.year:04d}-{today.month:02d}"
+    for _ in range(keep_months):
+        year, mon = int(cutoff[:4]), int(cutoff[5:7])
+        cutoff = f"{year - (mon == 1):04d}-{(mon - 2) % 12 + 1:02d}"
+    rows = db.execute("""SELECT DISTINCT substr(created_at, 1, 7) FROM orders
+                         WHERE created_at < ? ORDER BY 1""", (month_start(cutoff),)).fetchall()
+    return [row[0] for row in rows]
+
+
+# --- Ubicación ---
+
+def directory(db):
+    """Carpeta de particiones de la base abierta en db (junto al archivo principal).
+
+    Si db es un snapshot de replica.py, la carpeta es la de la base de origen.
+    """
+    path = replica.source_path(db)
+    if not path:
+        raise ArchiveError("La base en memoria no tiene carpeta de archivo")
+    return os.path.splitext(path)[0] + "_archive"
+
+
+def partition_file(month):
+    return f"orders_{month}.db"
+
+
+def alias(month):
+    return "arch_" + month.replace("-", "_")
+
+
+# --- Registro ---
+
+def partitions(db, desde=None, hasta=None):
+    """Particiones que cruzan el rango [desde, hasta), de la más nueva a la más vieja.
+
+    desde/hasta son fechas 'AAAA-MM-DD' (como ReportFilters.desde/hasta) o None.
+    """
+    sql = "SELECT * FROM archive_partitions WHERE 1=1"
+    params = []
+    if desde:
+        sql += " AND month >= ?"
+        params.append(desde[:7])
+    if hasta:
+        sql += " AND month || '-01' < ?"
+        params.append(hasta)
+    sql += " ORDER BY month DESC"
+    return [Partition(*row) for row in db.execute(sql, params)]
+
+
+def sources(db, desde=None, hasta=None):
+    """La base en uso (MAIN) seguida de las particiones del rango, en orden de lectura."""
+    return [MAIN] + partitions(db, desde, hasta)
+
+
+def partition_for_order(db, order_id):
+    row = db.execute("SELECT * FROM archive_partitions WHERE first_id <= ? AND last_id >= ?",
+                     (order_id, order_id)).fetchone()
+    return Partition(*row) if row else None
+
+
+@contextlib.contextmanager
+def opened(db, source):
+    """Deja legible una fuente y entrega el prefijo de sus tablas.
+
+    Para MAIN el prefijo es "" (las consultas quedan iguales); para una
+    partición es "arch_AAAA_MM." mientras dura el bloque. db no debe tener
+    una transacción abierta (ATTACH/DETACH no se permiten dentro de una).
+    """
+    if source == MAIN:
+        yield ""
+        return
+    name = alias(source.month)
+    attached = any(row[1] == name for row in db.execute("PRAGMA database_list"))
+    if not attached:
+        path = os.path.join(directory(db), source.file)
+        if not os.path.exists(path):
+            # ATTACH crearía un archivo vacío en su lugar
+            raise ArchiveError(f"Falta el archivo de la partición {source.month}: {path}")
+        db.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+    try:
+        yield name + "."
+    finally:
+        if not attached:
+            try:
+                db.execute(f"DETACH DATABASE {name}")
+            except Exception as e:
+                logger.error(f"No se pudo soltar la partición {source.month}: {e}")
+
+
+# --- Archivar y restaurar ---
+
+def archive_month(db, month):
+    """Mueve las comandas de month ('AAAA-MM') a su partición. Devuelve (comandas, líneas).
+
+    db es la conexión de escritura. Si el mes ya tenía partición (p. ej. una
+    comanda cargada con fecha atrasada), las filas nuevas se suman a ella.
+    Los meses se archivan del más viejo al más nuevo, por la misma razón que
+    restore_month solo restaura el más reciente.
+    """
+    month = parse_month(month)
+    if month >= datetime.date.today().isoformat()[:7]:
+        raise ArchiveError(f"El mes {month} no está cerrado")
+    desde, hasta = month_start(month), month_start(next_month(month))
+    db.commit()
+    cur = db.cursor()
+    cur.execute("SELECT substr(MIN(created_at), 1, 7) FROM orders")
+    oldest = cur.fetchone()[0]
+    if oldest is not None and oldest < month:
+        raise ArchiveError(f"Primero hay que archivar {oldest}: los meses se archivan del más viejo al más nuevo")
+    cur.execute("SELECT COUNT(*) FROM orders WHERE created_at >= ? AND created_at < ?", (desde, hasta))
+    count = cur.fetchone()[0]
+    if not count:
+        return 0, 0
+    folder = directory(db)
+    os.makedirs(folder, exist_ok=True)
+    name = alias(month)
+    db.execute(f"ATTACH DATABASE ? AS {name}", (os.path.join(folder, partition_file(month)),))
+    try:
+        # 1) Copia al archivo del mes, confirmada antes de borrar nada
+        cur.execute("BEGIN")
+        for sql in _PARTITION_SCHEMA:
+            cur.execute(sql.format(schema=name))
+        cur.execute(f"""INSERT OR REPLACE INTO {name}.orders ({_ORDER_COLUMNS})
+                        SELECT {_ORDER_COLUMNS} FROM main.orders
+                        WHERE created_at >= ? AND created_at < ?""", (desde, hasta))
+        cur.execute(f"""INSERT OR REPLACE INTO {name}.order_items ({_ITEM_COLUMNS})
+                        SELECT {_ITEM_COLUMNS} FROM main.order_items
+                        WHERE order_id IN (SELECT id FROM main.orders
+                                           WHERE created_at >= ? AND created_at < ?)""", (desde, hasta))
+        db.commit()
+        cur.execute(f"ANALYZE {name}")
+        missing = cur.execute(f"""SELECT COUNT(*) FROM main.orders o
+                                  WHERE o.created_at >= ? AND o.created_at < ?
+                                    AND NOT EXISTS (SELECT 1 FROM {name}.orders a WHERE a.id = o.id)""",
+                              (desde, hasta)).fetchone()[0]
+        if missing:
+            raise ArchiveError(f"La partición {month} quedó incompleta ({missing} comandas sin copiar)")
+        cur.execute(f"SELECT COUNT(*), MIN(id), MAX(id) FROM {name}.orders")
+        total_orders, first_id, last_id = cur.fetchone()
+        total_items = cur.execute(f"SELECT COUNT(*) FROM {name}.order_items").fetchone()[0]
+
+        # 2) Registro, resúmenes y borrado en una sola transacción de la base en uso
+        cur.execute("BEGIN")
+        in_month = "SELECT id FROM main.orders WHERE created_at >= ? AND created_at < ?"
+        cur.execute(f"""INSERT INTO archived_product_stats (month, product_id, cantidad, pedidos)
+                        SELECT ?, product_id, SUM(qty), COUNT(DISTINCT order_id)
+                        FROM main.order_items WHERE order_id IN ({in_month})
+                        GROUP BY product_id
+                        ON CONFLICT (month, product_id) DO UPDATE SET
+                            cantidad = cantidad + excluded.cantidad,
+                            pedidos = pedidos + excluded.pedidos""", (month, desde, hasta))
+        cur.execute("""INSERT INTO archived_customer_stats
+                           (month, customer_id, visits, spend, first_seen, last_seen)
+                       SELECT ?, customer_id, COUNT(*), COALESCE(SUM(total), 0),
+                              MIN(created_at), MAX(created_at)
+                       FROM main.orders
+                       WHERE created_at >= ? AND created_at < ? AND customer_id IS NOT NULL
+                       GROUP BY customer_id
+                       ON CONFLICT (month, customer_id) DO UPDATE SET
+                           visits = visits + excluded.visits,
+                           spend = spend + excluded.spend,
+                           first_seen = min(first_seen, excluded.first_seen),
+                           last_seen = max(last_seen, excluded.last_seen)""", (month, desde, hasta))
+        cur.execute("""INSERT OR REPLACE INTO archive_partitions
+                           (month, file, first_id, last_id, orders, items, archived_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (month, partition_file(month), first_id, last_id, total_orders, total_items,
+                     datetime.datetime.now().isoformat(sep=' ', timespec='seconds')))
+        cur.execute(f"DELETE FROM main.order_items WHERE order_id IN ({in_month})", (desde, hasta))
+        moved_items = cur.rowcount
+        # print_jobs apunta a orders: se purgan antes de borrar las comandas
+        cur.execute(f"DELETE FROM main.print_jobs WHERE order_id IN ({in_month})", (desde, hasta))
+        cur.execute("DELETE FROM main.orders WHERE created_at >= ? AND created_at < ?", (desde, hasta))
+        data_version.bump(cur, data_version.ORDERS)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.execute(f"DETACH DATABASE {name}")
+    logger.info(f"Mes {month} archivado: {count} comandas, {moved_items} líneas")
+    return count, moved_items
+
+
+def restore_month(db, month):
+    """Devuelve las comandas de una partición a la base en uso y borra su archivo.
+
+    Solo se restaura el mes archivado más reciente: los reportes leen la base
+    en uso antes que las particiones, así que en ella no puede quedar un mes
+    más viejo que uno archivado. Devuelve la cantidad de comandas restauradas
+    (0 si el mes no estaba archivado).
+    """
+    month = parse_month(month)
+    db.commit()
+    row = db.execute("SELECT * FROM archive_partitions WHERE month = ?", (month,)).fetchone()
+    if row is None:
+        return 0
+    newer = db.execute("SELECT MAX(month) FROM archive_partitions").fetchone()[0]
+    if newer != month:
+        raise ArchiveError(f"Primero hay que restaurar {newer}: solo se restaura el mes archivado más reciente")
+    partition = Partition(*row)
+    path = os.path.join(directory(db), partition.file)
+    cur = db.cursor()
+    with opened(db, partition) as prefix:
+        try:
+            cur.execute("BEGIN")
+            cur.execute(f"""INSERT INTO main.orders ({_ORDER_COLUMNS})
+                            SELECT {_ORDER_COLUMNS} FROM {prefix}orders""")
+            cur.execute(f"""INSERT INTO main.order_items ({_ITEM_COLUMNS})
+                            SELECT {_ITEM_COLUMNS} FROM {prefix}order_items""")
+            cur.execute("DELETE FROM archived_product_stats WHERE month = ?", (month,))
+            cur.execute("DELETE FROM archived_customer_stats WHERE month = ?", (month,))
+            cur.execute("DELETE FROM archive_partitions WHERE month = ?", (month,))
+            data_version.bump(cur, data_version.ORDERS)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    os.remove(path)
+    logger.info(f"Mes {month} restaurado: {partition.orders} comandas")
+    return partition.orders
+
+
+def check(db):
+    """Compara cada partición con su registro. Devuelve la lista de problemas."""
+    problems = []
+    for partition in partitions(db):
+        try:
+            with opened(db, partition) as prefix:
+                orders, first_id, last_id = db.execute(
+                    f"SELECT COUNT(*), MIN(id), MAX(id) FROM {prefix}orders").fetchone()
+                items = db.execute(f"SELECT COUNT(*) FROM {prefix}order_items").fetchone()[0]
+                jobs = db.execute(f"""SELECT COUNT(*) FROM main.print_jobs
+                                      WHERE order_id IN (SELECT id FROM {prefix}orders)""").fetchone()[0]
+                outside = db.execute(f"""SELECT COUNT(*) FROM {prefix}orders
+                                         WHERE created_at < ? OR created_at >= ?""",
+                                     (month_start(partition.month),
+                                      month_start(next_month(partition.month)))).fetchone()[0]
+        except Exception as e:
+            problems.append((partition.month, str(e)))
+            continue
+        if (orders, items, first_id, last_id) != (partition.orders, partition.items,
+                                                   partition.first_id, partition.last_id):
+            problems.append((partition.month, f"registro {partition.orders} comandas/{partition.items} líneas, "
+                                              f"archivo {orders}/{items}"))
+        if outside:
+            problems.append((partition.month, f"{outside} comandas fuera del mes"))
+        if jobs:
+            problems.append((partition.month, f"{jobs} trabajos de impresión de comandas archivadas"))
+    return problems
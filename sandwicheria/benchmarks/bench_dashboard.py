@@ -0,0 +1,111 @@
+"""Benchmark: /api/dashboard vs las cinco llamadas que hacía /reports.
+
+Usa la misma base sintética de bench_date_filter.py (la completa con precios
+congelados y el agregado diario si hace falta) y mide, con el cliente de
+pruebas de Flask, el tiempo de:
+  - las cinco llamadas en serie,
+  - las cinco llamadas en paralelo (como las hacía el navegador),
+  - una sola llamada a /api/dashboard.
+
+Uso:
+    python benchmarks/bench_dashboard.py [--lines 1000000] [--db /tmp/bench.db] [--days 30]
+"""
+import argparse
+import concurrent.futures
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as app_module  # noqa: E402
+import rollup  # noqa: E402
+from bench_date_filter import build_database  # noqa: E402
+from db_pool import ConnectionPool  # noqa: E402
+
+SEPARATE_ENDPOINTS = ["metricas", "ventas-por-dia", "ventas-por-categoria",
+                      "top-productos", "ventas-por-dia-semana"]
+
+
+def prepare(db):
+    """Completa precios congelados, totales y agregado de la base sintética."""
+    if db.execute("SELECT COUNT(*) FROM order_items WHERE unit_price IS NULL").fetchone()[0]:
+        db.execute("""UPDATE order_items
+                      SET unit_price = (SELECT price FROM products WHERE products.id = order_items.product_id),
+                          unit_cost = (SELECT cost FROM products WHERE products.id = order_items.product_id)
+                      WHERE unit_price IS NULL""")
+        db.execute("""UPDATE orders SET
+                          total = (SELECT COALESCE(SUM(unit_price * qty), 0) FROM order_items WHERE order_id = orders.id),
+                          item_count = (SELECT COUNT(*) FROM order_items WHERE order_id = orders.id)""")
+        db.commit()
+    if not db.execute("SELECT COUNT(*) FROM daily_sales").fetchone()[0]:
+        rollup.rebuild(db)
+        db.execute("ANALYZE")
+        db.commit()
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--db", default=os.path.join("/tmp", "sandwicheria_bench.db"))
+    parser.add_argument("--days", type=int, default=30, help="largo del rango consultado")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db = build_database(args.db, args.lines)
+    prepare(db)
+    db.close()
+    print(f"Base: {args.db} (preparada en {time.perf_counter() - started:.1f}s)")
+
+    # La app apunta a la base del benchmark
+    app_module.db_pool = ConnectionPool(args.db, readers=5)
+    app_module.REPORT_REPLICA = False  # se mide la consulta, no la copia
+    flask_app = app_module.app
+    fin = datetime.date.today()
+    inicio = fin - datetime.timedelta(days=args.days)
+    query = f"fecha_inicio={inicio.isoformat()}&fecha_fin={fin.isoformat()}"
+
+    def get(client, url):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        return response
+
+    clients = [flask_app.test_client() for _ in SEPARATE_ENDPOINTS]
+    urls = [f"/api/{endpoint}?{query}" for endpoint in SEPARATE_ENDPOINTS]
+
+    def serial():
+        for url in urls:
+            get(clients[0], url)
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(urls))
+
+    def parallel():
+        list(executor.map(get, clients, urls))
+
+    def combined():
+        get(clients[0], f"/api/dashboard?{query}")
+
+    combined()  # primera llamada fuera de la medición
+    print(f"Rango: {inicio} a {fin} ({args.days} días)\n")
+    for label, func in (("5 llamadas en serie", serial),
+                        ("5 llamadas en paralelo", parallel),
+                        ("/api/dashboard", combined)):
+        elapsed = best_of(args.repeat, func)
+        print(f"{label:<24} {elapsed * 1000:8.1f} ms (mejor de {args.repeat})")
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
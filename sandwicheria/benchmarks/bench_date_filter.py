@@ -0,0 +1,102 @@
+"""Benchmark: filtro DATE(created_at) vs rango semiabierto sobre created_at.
+
+Crea (o reutiliza) una base con ~1 millón de líneas de comanda y mide la
+consulta de métricas de /api/metricas para un mes con ambos predicados.
+
+Uso:
+    python benchmarks/bench_date_filter.py [--lines 1000000] [--db /tmp/bench.db]
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import catalog_repo  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from query_plans import explain  # noqa: E402
+from report_filters import ReportFilters  # noqa: E402
+
+METRICAS_SQL = """
+    SELECT COUNT(DISTINCT o.id), SUM(p.price * oi.qty), SUM(p.cost * oi.qty),
+           COUNT(DISTINCT o.customer_name)
+    FROM orders o
+    JOIN order_items oi ON o.id = oi.order_id
+    JOIN products p ON oi.product_id = p.id
+    WHERE 1=1
+"""
+
+
+def build_database(path, lines, days=730, items_per_order=4):
+    db = sqlite3.connect(path)
+    run_migrations(db)
+    if db.execute("SELECT COUNT(*) FROM order_items").fetchone()[0] >= lines:
+        return db
+    rnd = random.Random(42)
+    cur = db.cursor()
+    sandwich, bebida = catalog_repo.category_id(cur, "SANDWICH"), catalog_repo.category_id(cur, "BEBIDA")
+    db.executemany("INSERT OR IGNORE INTO products (name, category_id, base_protein, price, cost) VALUES (?, ?, ?, ?, ?)",
+                   [(f"PRODUCTO {i}", sandwich if i < 15 else bebida, "—",
+                     10000 if i < 15 else 1200, 3000 if i < 15 else 360) for i in range(30)])
+    product_ids = [r[0] for r in db.execute("SELECT id FROM products")]
+    start = datetime.datetime.now() - datetime.timedelta(days=days)
+    n_orders = lines // items_per_order
+    orders = []
+    for i in range(n_orders):
+        ts = start + datetime.timedelta(seconds=rnd.randint(0, days * 86400))
+        orders.append((ts.isoformat(sep=' ', timespec='seconds'), f"CLIENTE {rnd.randint(1, 5000)}"))
+    orders.sort()
+    db.executemany("INSERT INTO orders (created_at, customer_name) VALUES (?, ?)", orders)
+    first_id = db.execute("SELECT MIN(id) FROM orders").fetchone()[0]
+    items = ((first_id + i, rnd.choice(product_ids), rnd.randint(1, 3), "")
+             for i in range(n_orders) for _ in range(items_per_order))
+    db.executemany("INSERT INTO order_items (order_id, product_id, qty, note) VALUES (?, ?, ?, ?)", items)
+    db.execute("ANALYZE")
+    db.commit()
+    return db
+
+
+def timed(db, sql, params, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.execute(sql, params).fetchall()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--db", default=os.path.join("/tmp", "sandwicheria_bench.db"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db = build_database(args.db, args.lines)
+    total = db.execute("SELECT COUNT(*) FROM order_items").fetchone()[0]
+    print(f"Base: {args.db} ({total} líneas, preparada en {time.perf_counter() - started:.1f}s)")
+
+    fin = datetime.date.today()
+    inicio = fin - datetime.timedelta(days=30)
+
+    old_sql = METRICAS_SQL + " AND DATE(o.created_at) >= ? AND DATE(o.created_at) <= ?"
+    old_params = [inicio.isoformat(), fin.isoformat()]
+    where, new_params = ReportFilters(inicio, fin).where()
+    new_sql = METRICAS_SQL + where
+
+    for label, sql, params in (("DATE(created_at)", old_sql, old_params),
+                               ("rango semiabierto", new_sql, new_params)):
+        elapsed = timed(db, sql, params, args.repeat)
+        print(f"\n{label}: {elapsed * 1000:.1f} ms (mejor de {args.repeat})")
+        for detail in explain(db, sql, params):
+            print(f"    {detail}")
+
+
+if __name__ == "__main__":
+    main()
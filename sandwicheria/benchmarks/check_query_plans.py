@@ -0,0 +1,72 @@
+"""Revisión de planes de consultas sobre una base sintética grande.
+
+Siembra (o reutiliza) la base de bench_date_filter.py, ejecuta los reportes
+de ANALYSIS_ENDPOINTS con cada combinación de filtros bajo el modo de
+análisis (query_plans.QueryAnalyzer) y compara las marcas de cada forma de
+consulta (recorridos completos de orders/order_items, B-trees temporales)
+contra query_plans_baseline.json. Termina con error si aparece una marca
+nueva: un índice que se dejó de usar o un orden que antes no hacía falta.
+
+Uso:
+    python benchmarks/check_query_plans.py [--lines 200000] [--db /tmp/bench.db]
+    python benchmarks/check_query_plans.py --update   # acepta los planes actuales
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as app_module  # noqa: E402
+from bench_dashboard import prepare  # noqa: E402
+from bench_date_filter import build_database  # noqa: E402
+from db_pool import ConnectionPool  # noqa: E402
+from query_plans import regressions  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(__file__), "query_plans_baseline.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--db", default=os.path.join("/tmp", "sandwicheria_plans.db"))
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update", action="store_true", help="reescribe la base de comparación")
+    parser.add_argument("--limit", type=int, default=10, help="peores formas a mostrar")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db = build_database(args.db, args.lines)
+    prepare(db)
+    urls = app_module.analysis_urls(db)
+    db.close()
+    print(f"Base: {args.db} (preparada en {time.perf_counter() - started:.1f}s)")
+
+    app_module.db_pool = ConnectionPool(args.db, readers=2,
+                                        connection_factory=app_module.metrics.InstrumentedConnection)
+    analyzer = app_module.run_query_analysis(urls)
+    report = analyzer.report()
+    app_module.print_query_report(report[:args.limit])
+    flags = {entry["sql"]: entry["flags"] for entry in report if entry["flags"]}
+    print(f"{len(report)} forma(s) de consulta, {len(flags)} con marcas")
+
+    if args.update or not os.path.exists(args.baseline):
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(flags, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write("\n")
+        print(f"Base de comparación escrita en {args.baseline}")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        found = regressions(report, json.load(f))
+    for shape, new in found:
+        print(f"[REGRESIÓN] {', '.join(new)}\n    {shape}")
+    if found:
+        print(f"{len(found)} consulta(s) con planes peores que la base")
+        raise SystemExit(1)
+    print("Sin regresiones de planes")
+
+
+if __name__ == "__main__":
+    main()
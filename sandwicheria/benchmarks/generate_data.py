@@ -0,0 +1,207 @@
+"""Generador de datos sintéticos: comandas realistas durante N meses.
+
+Llena un archivo SQLite con el catálogo por defecto (seed_defaults) y
+comandas repartidas como en el local: más los viernes y sábados, menos el
+domingo, con peaks a la hora de almuerzo y de once. Cada comanda trae 1-5
+productos (casi siempre un sándwich o completo y a veces bebestibles), la
+proteína elegida en los sándwiches que la llevan, notas ocasionales ("sin
+mayo", "para llevar") y clientes que se repiten con frecuencia desigual y
+escritos a veces distinto ("José", "jose ").
+
+Las comandas se arman con order_ingest.build_order (mismo formato de notas
+que la app) y se insertan en bloque; al final se recalculan el agregado
+diario y los contadores del inicio, igual que `flask rollup-rebuild` y
+`flask stats-rebuild`.
+
+Uso:
+    python benchmarks/generate_data.py --db /tmp/carga.db [--months 6] [--orders-per-day 150]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as app_module  # noqa: E402
+import catalog_repo  # noqa: E402
+import customers  # noqa: E402
+import data_version  # noqa: E402
+import live_stats  # noqa: E402
+import order_ingest  # noqa: E402
+import rollup  # noqa: E402
+from db_pool import ConnectionPool  # noqa: E402
+
+# Peso relativo de cada hora de atención (11:00 a 22:59)
+HOUR_WEIGHTS = {11: 3, 12: 9, 13: 12, 14: 8, 15: 3, 16: 2, 17: 4, 18: 6, 19: 7, 20: 8, 21: 5, 22: 2}
+# Lunes=0 ... Domingo=6
+WEEKDAY_FACTOR = {0: 0.8, 1: 0.85, 2: 0.9, 3: 1.0, 4: 1.35, 5: 1.45, 6: 0.65}
+# Peso de cada categoría al elegir el plato principal y los acompañamientos
+MAIN_CATEGORIES = {"SANDWICH": 7, "COMPLETO": 3}
+SIDE_CATEGORIES = {"BEBIDA": 6, "JUGO": 3, "ENERGÉTICA": 1, "CAFETERÍA": 2}
+NOTES = ["sin mayo", "sin tomate", "extra palta", "bien cocido", "para llevar",
+         "sin ají", "pan tostado", "mayo aparte", "sin hielo"]
+
+FIRST_NAMES = ["José", "María", "Juan", "Camila", "Diego", "Valentina", "Matías", "Francisca",
+               "Benjamín", "Catalina", "Sebastián", "Fernanda", "Tomás", "Javiera", "Ignacio",
+               "Constanza", "Martín", "Antonia", "Vicente", "Sofía"]
+LAST_NAMES = ["González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva",
+              "Martínez", "Sepúlveda", "Morales", "Rodríguez", "López", "Fuentes", "Hernández"]
+
+
+def customer_names(rnd, count):
+    """count nombres distintos (hasta 4500) en orden al azar; los primeros serán los más frecuentes."""
+    names = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    names += [f"{first} {last} {second}" for first in FIRST_NAMES for last in LAST_NAMES
+              for second in LAST_NAMES if second != last]
+    rnd.shuffle(names)
+    return names[:count]
+
+
+def spelled(rnd, name):
+    """El mismo cliente escrito como lo haría el cajero: a veces sin tildes o en minúsculas."""
+    roll = rnd.random()
+    if roll < 0.1:
+        return name.lower() + " "
+    if roll < 0.15:
+        return name.upper()
+    if roll < 0.25:
+        return customers.normalize(name).title()
+    return name
+
+
+class OrderGenerator:
+    """Comandas al azar (reproducibles con seed) sobre el catálogo dado."""
+
+    def __init__(self, catalog, seed=42, n_customers=2000):
+        self.rnd = random.Random(seed)
+        self.catalog = {p["id"]: p for p in catalog}
+        self.by_category = {}
+        for product in catalog:
+            self.by_category.setdefault(product["category"], []).append(product["id"])
+        self.customers = customer_names(self.rnd, n_customers)
+
+    def _pick(self, weights):
+        categories = [c for c in weights if c in self.by_category]
+        category = self.rnd.choices(categories, [weights[c] for c in categories])[0]
+        return self.rnd.choice(self.by_category[category])
+
+    def customer(self):
+        # Mitad de las visitas de habituales (Pareto: los 20 primeros se llevan la
+        # mitad de ellas) y la otra mitad repartida entre todos
+        if self.rnd.random() < 0.5:
+            index = min(int((self.rnd.paretovariate(1.0) - 1) * 20), len(self.customers) - 1)
+        else:
+            index = self.rnd.randrange(len(self.customers))
+        return spelled(self.rnd, self.customers[index])
+
+    def raw_lines(self):
+        """Líneas (product_id, qty, nota, proteína) de una comanda."""
+        lines = {}
+        for _ in range(self.rnd.choices([1, 2, 3], [6, 3, 1])[0]):
+            pid = self._pick(MAIN_CATEGORIES)
+            lines[pid] = lines.get(pid, 0) + 1
+        for _ in range(self.rnd.choices([0, 1, 2], [3, 5, 2])[0]):
+            pid = self._pick(SIDE_CATEGORIES)
+            lines[pid] = lines.get(pid, 0) + 1
+        result = []
+        for pid, qty in lines.items():
+            note = self.rnd.choice(NOTES) if self.rnd.random() < 0.15 else ""
+            protein = ""
+            if self.catalog[pid]["name"] in order_ingest.PROTEIN_SANDWICHES:
+                protein = self.rnd.choice(order_ingest.PROTEIN_OPTIONS)
+            result.append((pid, qty, note, protein))
+        return result
+
+    def order(self, created_at=None):
+        order = order_ingest.build_order(self.customer(), self.raw_lines(), self.catalog)
+        order.created_at = created_at
+        return order
+
+    def timestamps(self, start, days, orders_per_day):
+        """Instantes de las comandas de days días desde start, en orden."""
+        hours = list(HOUR_WEIGHTS)
+        weights = list(HOUR_WEIGHTS.values())
+        for offset in range(days):
+            day = start + datetime.timedelta(days=offset)
+            expected = orders_per_day * WEEKDAY_FACTOR[day.weekday()]
+            count = max(0, int(self.rnd.gauss(expected, expected * 0.1)))
+            stamps = sorted(
+                datetime.datetime.combine(day, datetime.time(self.rnd.choices(hours, weights)[0],
+                                                             self.rnd.randrange(60), self.rnd.randrange(60)))
+                for _ in range(count))
+            for stamp in stamps:
+                yield stamp.isoformat(sep=' ', timespec='seconds')
+
+
+def generate(db, months, orders_per_day, seed=42, n_customers=2000, batch=5000):
+    """Agrega comandas de los últimos months meses a db; devuelve cuántas."""
+    catalog = catalog_repo.list_products(db)
+    generator = OrderGenerator(catalog, seed, n_customers)
+    end = datetime.date.today()
+    start = end - datetime.timedelta(days=round(months * 30.4))
+    index = customers.CustomerIndex()
+    cur = db.cursor()
+    total = 0
+    pending = []
+
+    def flush():
+        cur.execute("BEGIN")
+        for order in pending:
+            customer_id = index.resolve(cur, order.customer_name)
+            cur.execute("""INSERT INTO orders (created_at, customer_name, customer_id, total, item_count)
+                           VALUES (?, ?, ?, ?, ?)""",
+                        (order.created_at, order.customer_name, customer_id, order.total, len(order.lines)))
+            order_id = cur.lastrowid
+            cur.executemany("""INSERT INTO order_items (order_id, product_id, qty, note, unit_price, unit_cost)
+                               VALUES (?, ?, ?, ?, ?, ?)""",
+                            [(order_id, line.product_id, line.qty, line.note, line.unit_price, line.unit_cost)
+                             for line in order.lines])
+        db.commit()
+        pending.clear()
+
+    for created_at in generator.timestamps(start, (end - start).days + 1, orders_per_day):
+        pending.append(generator.order(created_at))
+        total += 1
+        if len(pending) >= batch:
+            flush()
+    if pending:
+        flush()
+
+    # Agregados y contadores desde cero, como rollup-rebuild y stats-rebuild
+    rollup.rebuild(db)
+    live_stats.rebuild(db)
+    data_version.bump(cur, data_version.ORDERS)
+    db.execute("ANALYZE")
+    db.commit()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join("/tmp", "sandwicheria_carga.db"))
+    parser.add_argument("--months", type=float, default=6)
+    parser.add_argument("--orders-per-day", type=int, default=150)
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--append", action="store_true", help="agrega a una base existente")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db) and not args.append:
+        parser.error(f"{args.db} ya existe (usa --append para agregar comandas)")
+
+    started = time.perf_counter()
+    app_module.db_pool = ConnectionPool(args.db, readers=1)
+    app_module.setup_database()  # esquema y catálogo por defecto
+    with app_module.db_pool.writer() as db:
+        count = generate(db, args.months, args.orders_per_day, args.seed, args.customers)
+        lines = db.execute("SELECT COUNT(*) FROM order_items").fetchone()[0]
+    app_module.db_pool.close_all()
+    print(f"{count} comandas ({lines} líneas en total) en {args.db}, "
+          f"{time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Prueba de carga: comandas, vistas de comanda y ráfagas de /reports en paralelo.
+
+Varios hilos repiten durante --duration segundos una mezcla de escenarios:
+  - orders:  POST /api/orders con una comanda al azar (generate_data.OrderGenerator);
+  - comanda: GET /comanda/<id> de una comanda existente;
+  - reports: lo que pide el navegador al abrir /reports (la página y
+    /api/dashboard con un rango de 7, 30 o 90 días, a veces con categoría).
+
+Por defecto corre contra la app en el mismo proceso (cliente de pruebas de
+Flask, con el pool y la instrumentación de producción) sobre una copia de
+--db, así cada corrida parte de los mismos datos, y los reportes leen de la
+réplica (replica.py) salvo con --no-replica. Con --url apunta a un servidor
+ya levantado (p. ej. gunicorn) que use esa base.
+
+Cada corrida agrega una línea JSON a --results con el commit, los
+parámetros, el throughput y p50/p95/p99 por tipo de request; --compare la
+muestra junto a la corrida anterior con los mismos parámetros.
+
+Uso:
+    python benchmarks/generate_data.py --db /tmp/carga.db
+    python benchmarks/load_test.py --db /tmp/carga.db [--threads 8] [--duration 20]
+                                   [--mix orders=4,comanda=10,reports=1] [--compare]
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as app_module  # noqa: E402
+import catalog_repo  # noqa: E402
+import replica  # noqa: E402
+from db_pool import ConnectionPool  # noqa: E402
+from generate_data import OrderGenerator  # noqa: E402
+
+RESULTS = os.path.join(os.path.dirname(__file__), "results", "load_test.jsonl")
+REPORT_RANGES = (7, 30, 90)
+
+
+class InProcessClient:
+    """Cliente de pruebas de Flask; devuelve (status, cuerpo)."""
+
+    def __init__(self):
+        self.client = app_module.app.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_data()
+
+    def post_json(self, path, data):
+        response = self.client.post(path, json=data)
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def _send(self, request):
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self.base_url + path))
+
+    def post_json(self, path, data):
+        return self._send(urllib.request.Request(self.base_url + path, data=json.dumps(data).encode(),
+                                                 headers={"Content-Type": "application/json"}))
+
+
+class Recorder:
+    """Latencias por nombre de request, compartidas entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        result = {}
+        for name, values in sorted(self.latencies.items()):
+            values = sorted(values)
+
+            def percentile(q):
+                return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+
+            result[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "rps": round(len(values) / elapsed, 1),
+                "p50_ms": percentile(0.5),
+                "p95_ms": percentile(0.95),
+                "p99_ms": percentile(0.99),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        return result
+
+
+class Scenarios:
+    """Los escenarios de la mezcla; cada uno registra sus requests en recorder."""
+
+    def __init__(self, db_path, recorder, seed):
+        db = sqlite3.connect(db_path)
+        db.row_factory = sqlite3.Row
+        catalog = catalog_repo.list_products(db)
+        self.categories = sorted({p["category"] for p in catalog})
+        self.order_ids = [row[0] for row in db.execute("SELECT id FROM orders")]
+        last = db.execute("SELECT MAX(created_at) FROM orders").fetchone()[0]
+        db.close()
+        self.last_day = datetime.date.fromisoformat(last[:10]) if last else datetime.date.today()
+        self.generator = OrderGenerator(catalog, seed)
+        self.generator_lock = threading.Lock()
+        self.recorder = recorder
+
+    def _timed(self, name, call, *args):
+        started = time.perf_counter()
+        try:
+            status, body = call(*args)
+        except Exception:
+            status, body = None, b""
+        self.recorder.record(name, time.perf_counter() - started, status is not None and status < 400)
+        return status, body
+
+    def orders(self, client, rnd):
+        with self.generator_lock:  # random.Random no se comparte entre hilos sin lock
+            lines = self.generator.raw_lines()
+            customer = self.generator.customer()
+        items = [{"product_id": pid, "qty": qty, "note": note, "protein": protein}
+                 for pid, qty, note, protein in lines]
+        status, body = self._timed("POST /api/orders", client.post_json, "/api/orders",
+                                   {"customer_name": customer, "items": items})
+        if status == 201:
+            self.order_ids.append(json.loads(body)["id"])
+
+    def comanda(self, client, rnd):
+        if self.order_ids:
+            self._timed("GET /comanda/<id>", client.get, f"/comanda/{rnd.choice(self.order_ids)}")
+
+    def reports(self, client, rnd):
+        started = time.perf_counter()
+        fin = self.last_day
+        inicio = fin - datetime.timedelta(days=rnd.choice(REPORT_RANGES))
+        params = {"fecha_inicio": inicio, "fecha_fin": fin}
+        if rnd.random() < 0.3:
+            params["categoria"] = rnd.choice(self.categories)
+        query = urllib.parse.urlencode(params)
+        ok = self._timed("GET /reports", client.get, "/reports")[0] == 200
+        ok = self._timed("GET /api/dashboard", client.get, f"/api/dashboard?{query}")[0] == 200 and ok
+        self.recorder.record("reports (ráfaga)", time.perf_counter() - started, ok)
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("orders", "comanda", "reports"):
+            raise argparse.ArgumentTypeError(f"escenario desconocido: {name!r}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run(client_factory, scenarios, mix, threads, duration, seed):
+    """Corre la mezcla con threads hilos durante duration segundos; devuelve los segundos reales."""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rnd = random.Random(seed + index)
+        client = client_factory()
+        while time.perf_counter() < deadline:
+            getattr(scenarios, rnd.choices(names, weights)[0])(client, rnd)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__), check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, cwd=os.path.dirname(__file__)).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(entry, previous=None):
+    print(f"\n{entry['commit'] or '?'} {entry['target']} hilos={entry['threads']} "
+          f"duración={entry['duration_s']}s total={entry['total_rps']} req/s")
+    header = f"{'request':<22} {'n':>6} {'err':>4} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    if previous:
+        header += f"   vs {previous['commit'] or '?'} (p95)"
+    print(header)
+    for name, stats in entry["results"].items():
+        line = (f"{name:<22} {stats['count']:>6} {stats['errors']:>4} {stats['rps']:>7} "
+                f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+        before = previous and previous["results"].get(name)
+        if before and before["p95_ms"]:
+            change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            line += f"   {before['p95_ms']:>8} ({change:+.0f}%)"
+        print(line)
+
+
+def previous_run(path, entry):
+    """Última corrida en path con el mismo destino, hilos y mezcla."""
+    if not os.path.exists(path):
+        return None
+    found = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            other = json.loads(line)
+            if all(other.get(k) == entry[k] for k in ("target", "threads", "mix", "db_orders")):
+                found = other
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="base generada con generate_data.py")
+    parser.add_argument("--url", help="servidor a probar (por defecto, la app en este proceso)")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--mix", type=parse_mix, default="orders=4,comanda=10,reports=1")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--in-place", action="store_true", help="escribe en --db en vez de en una copia")
+    parser.add_argument("--no-replica", action="store_true", help="los reportes leen la base principal")
+    parser.add_argument("--results", default=RESULTS)
+    parser.add_argument("--label", default="", help="nota libre guardada con la corrida")
+    parser.add_argument("--compare", action="store_true", help="compara con la corrida anterior equivalente")
+    args = parser.parse_args()
+    mix = args.mix if isinstance(args.mix, dict) else parse_mix(args.mix)
+
+    with sqlite3.connect(args.db) as db:
+        db_orders = db.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    workdir = None
+    if args.url:
+        client_factory = lambda: HttpClient(args.url)  # noqa: E731
+        target = args.url
+        db_path = args.db
+    else:
+        db_path = args.db
+        if not args.in_place:
+            # Copia consistente (incluye el WAL) para que cada corrida parta igual
+            workdir = tempfile.TemporaryDirectory(prefix="sandwicheria_carga_")
+            db_path = os.path.join(workdir.name, "carga.db")
+            with sqlite3.connect(args.db) as source, sqlite3.connect(db_path) as copy:
+                source.backup(copy)
+        app_module.db_pool = ConnectionPool(db_path, readers=app_module.DB_READERS,
+                                            connection_factory=app_module.metrics.InstrumentedConnection)
+        app_module.setup_database()
+        app_module.REPORT_REPLICA = not args.no_replica
+        app_module.report_replica = replica.ReportReplica(
+            app_module.db_pool, os.path.splitext(db_path)[0] + "_replica",
+            max_staleness=app_module.REPLICA_MAX_STALENESS_SECONDS,
+            refresh_seconds=app_module.REPLICA_REFRESH_SECONDS,
+            step_pages=app_module.REPLICA_STEP_PAGES, readers=app_module.DB_READERS,
+            connection_factory=app_module.metrics.InstrumentedConnection)
+        client_factory = InProcessClient
+        target = "in-process"
+
+    recorder = Recorder()
+    scenarios = Scenarios(db_path, recorder, args.seed)
+    elapsed = run(client_factory, scenarios, mix, args.threads, args.duration, args.seed)
+    if not args.url:
+        app_module.report_replica.stop()
+        app_module.db_pool.close_all()
+    if workdir is not None:
+        workdir.cleanup()
+
+    results = recorder.summary(elapsed)
+    entry = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "label": args.label,
+        "target": target,
+        "threads": args.threads,
+        "duration_s": round(elapsed, 1),
+        "mix": mix,
+        "replica": None if args.url else not args.no_replica,
+        "db_orders": db_orders,
+        "total_rps": round(sum(s["count"] for name, s in results.items() if name != "reports (ráfaga)") / elapsed, 1),
+        "results": results,
+    }
+    previous = previous_run(args.results, entry) if args.compare else None
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    print_summary(entry, previous)
+    print(f"\nResultados agregados a {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Caché en memoria del catálogo de productos.
+
+El catálogo cambia unas pocas veces por semana pero se lee en cada vista del
+menú, de /products y del formulario de comandas. Se carga con una sola
+consulta (productos con su categoría, catalog_repo.list_products) y se sirve agrupado por categoría e indexado por id y por nombre.
+Las escrituras de productos llaman a invalidate(), que sube la versión y
+obliga a recargar en la próxima lectura. Además cada lectura compara la
+versión de productos guardada en la base (data_version), así que una edición
+hecha desde otro proceso también se ve.
+"""
+import threading
+
+import catalog_repo
+import data_version
+
+
+class Catalog:
+    """Foto inmutable del catálogo en una versión dada."""
+
+    def __init__(self, rows, version, db_version=0):
+        self.version = version
+        self.db_version = db_version
+        self.products = list(rows)  # ordenados por categoría y nombre
+        self.by_id = {}
+        self.by_name = {}
+        self.by_category = {}
+        for row in self.products:
+            self.by_id[row["id"]] = row
+            self.by_name[row["name"]] = row
+            self.by_category.setdefault(row["category"], []).append(row)
+
+    def category(self, name):
+        """Productos de una categoría, ordenados por nombre."""
+        return self.by_category.get(name, [])
+
+
+class CatalogCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._catalog = None
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db):
+        """Devuelve el catálogo vigente; lo carga desde db si fue invalidado."""
+        db_version = data_version.products(db)
+        catalog = self._catalog
+        if self._is_current(catalog, db_version):
+            self.hits += 1
+            return catalog
+        with self._lock:
+            # Otro hilo pudo haberlo cargado mientras esperábamos el lock
+            catalog = self._catalog
+            if self._is_current(catalog, db_version):
+                self.hits += 1
+                return catalog
+            self.misses += 1
+            version = self._version
+            catalog = Catalog(catalog_repo.list_products(db), version, db_version)
+            self._catalog = catalog
+            return catalog
+
+    def _is_current(self, catalog, db_version):
+        return (catalog is not None and catalog.version == self._version
+                and catalog.db_version >= db_version)
+
+    def invalidate(self):
+        """Marca el catálogo como desactualizado (llamar después del commit)."""
+        with self._lock:
+            self._version += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        catalog = self._catalog
+        return {
+            "version": self._version,
+            "db_version": catalog.db_version if catalog else None,
+            "loaded": catalog is not None and catalog.version == self._version,
+            "products": len(catalog.products) if catalog else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
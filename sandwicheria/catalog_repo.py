@@ -0,0 +1,138 @@
+"""Acceso a productos y categorías sobre el esquema normalizado.
+
+Desde la migración 12 la categoría es una tabla propia (categories) y cada
+producto apunta a ella por category_id. Todas las lecturas y escrituras del
+catálogo pasan por aquí:
+
+  - las lecturas de productos traen el nombre de la categoría en la misma
+    consulta (LEFT JOIN), como columna "category", así el resto de la app
+    (catalog_cache, plantillas, /api/products) sigue viendo p["category"];
+  - las escrituras reciben el nombre de la categoría y lo resuelven a su id,
+    creándola si no existe;
+  - el CRUD de categorías valida nombres repetidos y no borra una categoría
+    que todavía tiene productos.
+
+Las funciones de escritura reciben el cursor de la transacción en curso y no
+hacen commit: quien llama sube data_version e invalida el catálogo.
+"""
+import datetime
+
+import rollup
+
+PRODUCT_SELECT = """
+    SELECT p.*, COALESCE(c.name, '') AS category
+    FROM products p
+    LEFT JOIN categories c ON c.id = p.category_id
+"""
+
+
+class CategoryError(ValueError):
+    """Operación de categoría inválida; el mensaje se muestra tal cual."""
+
+
+def clean_name(name):
+    return " ".join((name or "").split()).upper()
+
+
+# --- Productos ---
+
+def list_products(db):
+    """Todos los productos con su categoría, ordenados por categoría y nombre."""
+    return db.execute(PRODUCT_SELECT + " ORDER BY category, p.name").fetchall()
+
+
+def get_product(db, product_id):
+    return db.execute(PRODUCT_SELECT + " WHERE p.id = ?", (product_id,)).fetchone()
+
+
+def category_id(cur, name, create=True):
+    """Id de la categoría name (None si name está vacío o no existe y create=False)."""
+    name = clean_name(name)
+    if not name:
+        return None
+    cur.execute("SELECT id FROM categories WHERE name = ?", (name,))
+    row = cur.fetchone()
+    if row is not None:
+        return row[0]
+    if not create:
+        return None
+    cur.execute("INSERT INTO categories (name, created_at) VALUES (?, ?)",
+                (name, datetime.datetime.now().isoformat(sep=' ', timespec='seconds')))
+    return cur.lastrowid
+
+
+def insert_product(cur, name, category, base_protein, price, cost):
+    cur.execute("""INSERT INTO products (name, category_id, base_protein, price, cost)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (name, category_id(cur, category), base_protein, price, cost))
+    return cur.lastrowid
+
+
+def update_product(cur, product_id, name, category, base_protein, price, cost):
+    """Actualiza el producto y, si cambió de categoría, el agregado diario."""
+    cur.execute("""UPDATE products SET name = ?, category_id = ?, base_protein = ?, price = ?, cost = ?
+                   WHERE id = ?""",
+                (name, category_id(cur, category), base_protein, price, cost, product_id))
+    rollup.product_changed(cur, product_id)
+
+
+# --- Categorías ---
+
+def list_categories(db):
+    """Categorías por nombre, con cuántos productos tiene cada una."""
+    return db.execute("""SELECT c.id, c.name, COUNT(p.id) AS products
+                         FROM categories c
+                         LEFT JOIN products p ON p.category_id = c.id
+                         GROUP BY c.id
+                         ORDER BY c.name""").fetchall()
+
+
+def get_category(db, cid):
+    return db.execute("SELECT id, name FROM categories WHERE id = ?", (cid,)).fetchone()
+
+
+def create_category(cur, name):
+    name = clean_name(name)
+    if not name:
+        raise CategoryError("El nombre de la categoría es requerido")
+    cur.execute("SELECT 1 FROM categories WHERE name = ?", (name,))
+    if cur.fetchone():
+        raise CategoryError("La categoría ya existe")
+    return category_id(cur, name)
+
+
+def rename_category(cur, cid, name):
+    """Cambia el nombre; devuelve False si la categoría no existe.
+
+    El agregado diario guarda el nombre de la categoría, así que se renombra
+    también ahí en la misma transacción.
+    """
+    name = clean_name(name)
+    if not name:
+        raise CategoryError("El nombre de la categoría es requerido")
+    cur.execute("SELECT name FROM categories WHERE id = ?", (cid,))
+    row = cur.fetchone()
+    if row is None:
+        return False
+    old_name = row[0]
+    if name == old_name:
+        return True
+    cur.execute("SELECT 1 FROM categories WHERE name = ? AND id != ?", (name, cid))
+    if cur.fetchone():
+        raise CategoryError("Ya existe una categoría con ese nombre")
+    cur.execute("UPDATE categories SET name = ? WHERE id = ?", (name, cid))
+    rollup.category_renamed(cur, old_name, name)
+    return True
+
+
+def delete_category(cur, cid):
+    """Borra una categoría sin productos; devuelve False si no existe."""
+    cur.execute("SELECT 1 FROM categories WHERE id = ?", (cid,))
+    if cur.fetchone() is None:
+        return False
+    cur.execute("SELECT COUNT(*) FROM products WHERE category_id = ?", (cid,))
+    count = cur.fetchone()[0]
+    if count:
+        raise CategoryError(f"No se puede eliminar la categoría porque tiene {count} producto(s) asociado(s)")
+    cur.execute("DELETE FROM categories WHERE id = ?", (cid,))
+    return True
@@ -0,0 +1,170 @@
+"""Compresión gzip/brotli de las respuestas.
+
+La conexión del local es lenta y las páginas (HTML con su CSS y JS en
+línea), los JSON de reportes y las librerías de static/vendor/ son texto que
+baja a un cuarto o menos comprimido. install(app, min_size) agrega un hook
+que comprime según Accept-Encoding (brotli si está instalado y el navegador
+lo acepta, si no gzip):
+
+  - sólo tipos de texto (COMPRESSIBLE), respuestas 200 de al menos min_size
+    bytes y que no vengan ya codificadas;
+  - las respuestas armadas en memoria se comprimen de una vez; los archivos
+    de static/ comprimidos se guardan en memoria por (archivo, mtime, tamaño)
+    con el nivel máximo, así que cada uno se comprime una sola vez;
+  - las que van por streaming (/api/ventas, exportaciones CSV/NDJSON) se
+    comprimen con gzip a medida que salen; los server-sent events
+    (/api/kitchen/stream) no, porque cada evento tiene que llegar de
+    inmediato.
+
+Con compresión el ETag pasa a débil (W/"..."): identifica el contenido, no
+los bytes. Por eso los If-None-Match se comparan con contains_weak.
+Brotli es opcional (pip install brotli).
+"""
+import gzip
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {
+    "text/html", "text/css", "text/plain", "text/csv", "text/javascript",
+    "application/javascript", "application/json", "application/x-ndjson",
+    "image/svg+xml",
+}
+
+DEFAULT_MIN_SIZE = 1024
+STATIC_CACHE_BYTES = 8 * 1024 * 1024
+
+# Nivel para respuestas dinámicas (rápido) y para static/ (una sola vez)
+GZIP_LEVEL = 6
+GZIP_STATIC_LEVEL = 9
+BROTLI_QUALITY = 5
+BROTLI_STATIC_QUALITY = 11
+
+
+def choose_encoding(accept_encodings):
+    """'br', 'gzip' o None según Accept-Encoding (ya parseado por Werkzeug)."""
+    if brotli is not None and accept_encodings["br"] > 0:
+        return "br"
+    if accept_encodings["gzip"] > 0:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding, static=False):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_STATIC_QUALITY if static else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_STATIC_LEVEL if static else GZIP_LEVEL, mtime=0)
+
+
+def gzip_stream(chunks):
+    """Comprime con gzip un iterable de bytes/str a medida que se consume."""
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: formato gzip
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        # Cierra el generador original (libera su conexión) aunque el
+        # cliente corte a la mitad
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+class StaticCache:
+    """Archivos de static/ ya comprimidos, con tope de bytes (sale lo menos usado)."""
+
+    def __init__(self, max_bytes=STATIC_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, encoding):
+        st = os.stat(path)
+        key = (path, st.st_mtime_ns, st.st_size, encoding)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+        self.misses += 1
+        with open(path, "rb") as f:
+            data = compress(f.read(), encoding, static=True)
+        with self._lock:
+            if key not in self._entries and len(data) <= self.max_bytes:
+                self._entries[key] = data
+                self._bytes += len(data)
+                while self._bytes > self.max_bytes:
+                    _, old = self._entries.popitem(last=False)
+                    self._bytes -= len(old)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+static_cache = StaticCache()
+
+
+def install(app, min_size=DEFAULT_MIN_SIZE):
+    """Comprime las respuestas de app (ver el docstring del módulo)."""
+
+    @app.after_request
+    def _compress(response):
+        if (response.status_code != 200 or response.mimetype not in COMPRESSIBLE
+                or "Content-Encoding" in response.headers or request.method == "HEAD"):
+            return response
+        response.vary.add("Accept-Encoding")
+        length = response.content_length
+        if length is not None and length < min_size:
+            return response
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if request.endpoint == "static":
+            filename = request.view_args.get("filename", "")
+            data = static_cache.get(os.path.join(app.static_folder, *filename.split("/")), encoding)
+            # El archivo abierto por send_file ya no se va a leer
+            close = getattr(response.response, "close", None)
+            if close is not None:
+                close()
+            response.direct_passthrough = False
+            response.set_data(data)
+        elif response.is_streamed:
+            # brotli sin streaming: los streams van siempre con gzip
+            if request.accept_encodings["gzip"] <= 0:
+                return response
+            encoding = "gzip"
+            response.response = gzip_stream(response.response)
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < min_size:
+                return response
+            response.set_data(compress(body, encoding))
+
+        response.headers["Content-Encoding"] = encoding
+        response.headers.pop("Accept-Ranges", None)  # los rangos serían del original
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
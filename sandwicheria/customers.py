@@ -0,0 +1,157 @@
+"""Clientes como tabla propia (customers) con clave normalizada.
+
+Antes el cliente era sólo el texto libre orders.customer_name: "Juan",
+"juan " y "JUAN" contaban como tres personas y los clientes distintos o
+frecuentes obligaban a recorrer orders. Ahora cada comanda apunta a
+customers por customer_id; la fila del cliente lleva comandas (visits),
+total gastado (spend) y primera/última visita, y se actualiza en la misma
+transacción que la comanda (live_stats.apply_order).
+
+La clave es el nombre sin tildes, en minúsculas y con los espacios
+colapsados. CustomerIndex guarda en memoria clave -> id para no consultar
+la base en cada comanda.
+"""
+import threading
+import unicodedata
+
+CUSTOMERS = "customers"  # contador de clientes con al menos una comanda
+
+
+def normalize(name):
+    """Clave del cliente: sin tildes, minúsculas y espacios colapsados."""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.casefold().split())
+
+
+def display_name(name):
+    return " ".join((name or "").split())
+
+
+class CustomerIndex:
+    """Mapa en memoria clave normalizada -> customers.id.
+
+    Sólo se guardan ids ya confirmados en la base (leídos con SELECT): un
+    cliente recién insertado entra al mapa en su próxima comanda, así un
+    rollback nunca deja un id inexistente en memoria.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, cur, name):
+        """id del cliente para name, creándolo si no existe (None si name está vacío)."""
+        key = normalize(name)
+        if not key:
+            return None
+        customer_id = self._ids.get(key)
+        if customer_id is not None:
+            self.hits += 1
+            return customer_id
+        self.misses += 1
+        row = cur.execute("SELECT id FROM customers WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            with self._lock:
+                self._ids[key] = row[0]
+            return row[0]
+        cur.execute("INSERT INTO customers (key, name, visits, spend) VALUES (?, ?, 0, 0)",
+                    (key, display_name(name)))
+        return cur.lastrowid
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+    def stats(self):
+        return {"keys": len(self._ids), "hits": self.hits, "misses": self.misses}
+
+
+def apply_order(cur, customer_id, sign, total, created_at):
+    """Suma (sign=1) o resta (sign=-1) una comanda a su cliente."""
+    cur.execute("SELECT visits FROM customers WHERE id = ?", (customer_id,))
+    row = cur.fetchone()
+    if row is None:
+        return
+    visits = row[0] + sign
+    # last_seen/first_seen no se recalculan al restar: stats-rebuild los deja exactos
+    cur.execute("""UPDATE customers SET visits = ?, spend = spend + ?,
+                       first_seen = MIN(COALESCE(first_seen, ?), ?),
+                       last_seen = MAX(COALESCE(last_seen, ?), ?)
+                   WHERE id = ?""",
+                (visits, sign * total, created_at, created_at, created_at, created_at, customer_id))
+    if row[0] == 0 and visits > 0:
+        _add_counter(cur, 1)
+    elif row[0] > 0 and visits <= 0:
+        _add_counter(cur, -1)
+
+
+def _add_counter(cur, delta):
+    cur.execute("""INSERT INTO stat_counters (name, value) VALUES (?, ?)
+                   ON CONFLICT (name) DO UPDATE SET value = value + excluded.value""", (CUSTOMERS, delta))
+
+
+# --- Lecturas ---
+
+def count(db):
+    """Clientes con al menos una comanda (contador, sin recorrer la tabla)."""
+    row = db.execute("SELECT value FROM stat_counters WHERE name = ?", (CUSTOMERS,)).fetchone()
+    return row[0] if row else 0
+
+
+def top(db, limit):
+    """Clientes con más comandas (por el índice de customers.visits)."""
+    return db.execute("""SELECT id, name, visits, spend, last_seen FROM customers
+                         WHERE visits > 0
+                         ORDER BY visits DESC, spend DESC LIMIT ?""", (limit,)).fetchall()
+
+
+# --- Reconciliación ---
+
+# Comandas de la base en uso más los resúmenes mensuales de lo archivado (archive.py)
+_TOTALS_SELECT = """
+    SELECT customer_id, SUM(visits) AS visits, SUM(spend) AS spend,
+           MIN(first_seen) AS first_seen, MAX(last_seen) AS last_seen
+    FROM (SELECT customer_id, COUNT(*) AS visits, COALESCE(SUM(total), 0) AS spend,
+                 MIN(created_at) AS first_seen, MAX(created_at) AS last_seen
+          FROM orders
+          WHERE customer_id IS NOT NULL
+          GROUP BY customer_id
+          UNION ALL
+          SELECT customer_id, visits, spend, first_seen, last_seen FROM archived_customer_stats)
+    GROUP BY customer_id
+"""
+
+
+def rebuild(cur):
+    """Recalcula visits/spend/fechas y el contador desde orders y lo archivado (mantiene los ids)."""
+    cur.execute("UPDATE customers SET visits = 0, spend = 0, first_seen = NULL, last_seen = NULL")
+    cur.execute(_TOTALS_SELECT)
+    cur.executemany("""UPDATE customers SET visits = ?, spend = ?, first_seen = ?, last_seen = ?
+                       WHERE id = ?""",
+                    [(visits, spend, first, last, customer_id)
+                     for customer_id, visits, spend, first, last in cur.fetchall()])
+    cur.execute("INSERT OR REPLACE INTO stat_counters (name, value) SELECT ?, COUNT(*) FROM customers WHERE visits > 0",
+                (CUSTOMERS,))
+
+
+def check_consistency(db):
+    """Diferencias (tabla, clave, esperado, guardado) entre customers y orders."""
+    differences = []
+    expected = {r[0]: (r[1], r[2]) for r in db.execute(_TOTALS_SELECT)}
+    stored = {r[0]: (r[1], r[2])
+              for r in db.execute("SELECT id, visits, spend FROM customers WHERE visits != 0 OR spend != 0")}
+    for key in sorted(set(expected) | set(stored)):
+        if expected.get(key) != stored.get(key):
+            differences.append(("customers", key, expected.get(key), stored.get(key)))
+    # Comandas cuyo customer_id no corresponde a la clave de su nombre
+    for order_id, name, customer_key in db.execute("""
+            SELECT o.id, o.customer_name, c.key FROM orders o
+            LEFT JOIN customers c ON c.id = o.customer_id"""):
+        if normalize(name) != (customer_key or ""):
+            differences.append(("orders.customer_id", order_id, normalize(name), customer_key))
+    if count(db) != len(expected):
+        differences.append(("stat_counters", CUSTOMERS, len(expected), count(db)))
+    return differences
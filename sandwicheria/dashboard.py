@@ -0,0 +1,145 @@
+"""Datos del dashboard de /reports en una sola llamada.
+
+Antes la página llamaba en paralelo a /api/metricas, /api/ventas-por-dia,
+/api/ventas-por-categoria, /api/top-productos y /api/ventas-por-dia-semana,
+y cada una volvía a parsear los filtros y leer el mismo rango de
+daily_sales con su propia conexión. compute() lee el rango una vez agrupado
+por día y categoría (pocas filas: días x categorías) y de ahí arma métricas,
+ventas por día, por categoría y por día de semana; sólo el top de productos
+vuelve a la tabla, agrupado por producto.
+
+Como en la página, la categoría filtra sólo las métricas; los gráficos
+muestran todas las categorías del período.
+"""
+import datetime
+
+import archive
+import customers
+import rollup
+
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+
+def unique_customers(db, filtros):
+    """Clientes distintos con comandas en el período (y la categoría, si hay).
+
+    Cuenta customers.id, así "Juan" y "juan " son el mismo cliente. Sin
+    filtros es el contador de customers. Si el rango incluye meses
+    archivados, se juntan los ids de cada partición.
+    """
+    if not (filtros.desde or filtros.hasta or filtros.categoria):
+        return customers.count(db)
+    where, params = filtros.where(category_column=None)
+    query = """
+        SELECT {select}
+        FROM {prefix}orders o
+        WHERE EXISTS (SELECT 1 FROM {prefix}order_items oi
+                      JOIN products p ON oi.product_id = p.id
+                      WHERE oi.order_id = o.id"""
+    if filtros.categoria:
+        query += " AND p.category_id = (SELECT id FROM categories WHERE name = ?)"
+        params.insert(0, filtros.categoria)
+    query += ")" + where
+    sources = archive.sources(db, filtros.desde, filtros.hasta)
+    cur = db.cursor()
+    if len(sources) == 1:
+        cur.execute(query.format(select="COUNT(DISTINCT o.customer_id) as clientes_unicos", prefix=""), params)
+        return cur.fetchone()[0] or 0
+    ids = set()
+    for source in sources:
+        with archive.opened(db, source) as prefix:
+            cur.execute(query.format(select="DISTINCT o.customer_id", prefix=prefix), params)
+            ids.update(row[0] for row in cur.fetchall())
+    ids.discard(None)
+    return len(ids)
+
+
+def metrics(ventas, costos, pedidos, clientes):
+    """Métricas derivadas con el formato de /api/metricas."""
+    return {
+        'ventas_totales': ventas,
+        'costos_totales': costos,
+        'total_pedidos': pedidos,
+        'clientes_unicos': clientes,
+        'ticket_promedio': ventas / pedidos if pedidos > 0 else 0,
+        'margen_beneficio': ((ventas - costos) / ventas * 100) if ventas > 0 else 0
+    }
+
+
+def compute(db, filtros, top_n=5):
+    """Arma el payload completo de /api/dashboard."""
+    cur = db.cursor()
+    where, params = filtros.where("fecha", None)
+    categoria = filtros.categoria
+
+    # Una lectura del agregado del período, agrupada por día y categoría
+    ventas = costos = 0
+    por_dia = {}
+    por_categoria = {}
+    cur.execute("""SELECT fecha, category, SUM(cantidad), SUM(ventas), SUM(costos)
+                   FROM daily_sales WHERE 1=1""" + where + """
+                   GROUP BY fecha, category""", params)
+    for fecha, category, cant, v, c in cur:
+        if categoria is None or category == categoria:
+            ventas += v
+            costos += c
+        dia = por_dia.setdefault(fecha, [0, 0])
+        dia[0] += v
+        dia[1] += cant
+        cat = por_categoria.setdefault(category, [0, 0, 0])
+        cat[0] += v
+        cat[1] += c
+        cat[2] += cant
+
+    # Comandas por día: todas ('*') para los gráficos y la categoría para las métricas
+    pedidos_dia = {}
+    pedidos = 0
+    cur.execute("SELECT fecha, category, pedidos FROM daily_orders WHERE category IN (?, ?)" + where,
+                [rollup.ALL_CATEGORIES, categoria or rollup.ALL_CATEGORIES] + params)
+    for fecha, category, n in cur:
+        if category == rollup.ALL_CATEGORIES:
+            pedidos_dia[fecha] = n
+        if category == (categoria or rollup.ALL_CATEGORIES):
+            pedidos += n
+
+    ventas_por_dia = [{
+        'fecha': fecha,
+        'total_pedidos': pedidos_dia.get(fecha, 0),
+        'ventas_totales': v,
+        'cantidad_vendida': cant
+    } for fecha, (v, cant) in sorted(por_dia.items())]
+
+    semana = {dia: [0, 0] for dia in DIAS_SEMANA}
+    for d in ventas_por_dia:
+        dia = semana[DIAS_SEMANA[datetime.date.fromisoformat(d['fecha']).weekday()]]
+        dia[0] += d['ventas_totales']
+        dia[1] += d['total_pedidos']
+
+    # El top necesita el grano de producto: misma tabla, mismo rango
+    cur.execute("""SELECT p.name, ds.category, SUM(ds.cantidad), SUM(ds.ventas) AS ventas_totales
+                   FROM daily_sales ds JOIN products p ON ds.product_id = p.id
+                   WHERE 1=1""" + filtros.where("ds.fecha", None)[0] + """
+                   GROUP BY ds.product_id ORDER BY ventas_totales DESC LIMIT ?""", params + [top_n])
+    top = [{
+        'producto': name,
+        'categoria': category,
+        'cantidad_vendida': cant,
+        'ventas_totales': v
+    } for name, category, cant, v in cur]
+
+    return {
+        'metricas': metrics(ventas, costos, pedidos, unique_customers(db, filtros)),
+        'ventas_por_dia': ventas_por_dia,
+        'ventas_por_categoria': [{
+            'categoria': category,
+            'ventas_totales': v,
+            'costos_totales': c,
+            'cantidad_vendida': cant
+        } for category, (v, c, cant) in sorted(por_categoria.items(), key=lambda item: item[1][0], reverse=True)],
+        'top_productos': top,
+        'ventas_por_dia_semana': [{
+            'dia_semana': dia,
+            'ventas_totales': v,
+            'total_pedidos': n
+        } for dia, (v, n) in semana.items()],
+    }
@@ -0,0 +1,27 @@
+"""Versión de los datos de reportes (tabla data_version).
+
+Cada escritura de comandas o productos suma uno a su contador dentro de la
+misma transacción, así que un mismo par de versiones siempre corresponde a
+los mismos datos. Con eso se arman los ETag de /api/* y las claves de la
+caché de respuestas, y el catálogo en memoria sabe cuándo recargarse aunque
+el producto se haya editado desde otro proceso.
+"""
+ORDERS = "orders"
+PRODUCTS = "products"
+
+
+def bump(cur, *scopes):
+    """Sube la versión de los scopes dados (llamar antes del commit)."""
+    cur.executemany("UPDATE data_version SET version = version + 1 WHERE scope = ?",
+                    [(scope,) for scope in scopes])
+
+
+def current(db):
+    """Versiones vigentes como tupla (orders, products); crecen siempre."""
+    versions = dict(db.execute("SELECT scope, version FROM data_version").fetchall())
+    return versions.get(ORDERS, 0), versions.get(PRODUCTS, 0)
+
+
+def products(db):
+    row = db.execute("SELECT version FROM data_version WHERE scope = ?", (PRODUCTS,)).fetchone()
+    return row[0] if row else 0
@@ -0,0 +1,211 @@
+"""Pool de conexiones SQLite para la sandwichería.
+
+Entrega conexiones de larga vida ya configuradas (WAL, synchronous=NORMAL,
+busy_timeout, mmap y caché) en lugar de abrir y cerrar una conexión por
+request. Hay dos caminos separados:
+
+  - escritor: una sola conexión protegida por un lock; SQLite sólo admite
+    un escritor a la vez, así que es mejor hacer la fila en Python que
+    dejar que las transacciones choquen con "database is locked".
+  - lectores: varias conexiones con query_only=ON; en modo WAL leen en
+    paralelo sin bloquear al escritor.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Valores por defecto de los PRAGMA; se pueden sobreescribir al crear el pool
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+DEFAULT_MMAP_SIZE = 64 * 1024 * 1024      # 64 MB
+DEFAULT_CACHE_SIZE_KIB = 16 * 1024        # 16 MB (cache_size negativo = KiB)
+DEFAULT_STATEMENT_CACHE = 256             # sentencias preparadas por conexión
+
+
+class PoolTimeout(Exception):
+    """No se pudo obtener una conexión del pool a tiempo."""
+
+
+class ConnectionPool:
+    def __init__(self, path, readers=4,
+                 busy_timeout_ms=DEFAULT_BUSY_TIMEOUT_MS,
+                 mmap_size=DEFAULT_MMAP_SIZE,
+                 cache_size_kib=DEFAULT_CACHE_SIZE_KIB,
+                 statement_cache=DEFAULT_STATEMENT_CACHE,
+                 acquire_timeout=10.0,
+                 connection_factory=sqlite3.Connection,
+                 uri=False):
+        self.path = path
+        self.uri = uri  # path es una URI file: (p. ej. con immutable=1)
+        self.max_readers = readers
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.statement_cache = statement_cache
+        self.acquire_timeout = acquire_timeout
+        self.connection_factory = connection_factory  # p. ej. metrics.InstrumentedConnection
+        self._reset()
+
+    def _reset(self):
+        # Se llama también después de un fork: las conexiones del proceso
+        # padre no se pueden usar en el hijo.
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._writer_lock = threading.Lock()
+        self._writer = None
+        self._readers = queue.LifoQueue()
+        self._readers_created = 0
+        self._stats = {
+            "connections_opened": 0,
+            "writer_acquired": 0,
+            "reader_acquired": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "rollbacks_on_release": 0,
+        }
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _connect(self, readonly):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            check_same_thread=False,
+            cached_statements=self.statement_cache,
+            factory=self.connection_factory,
+            uri=self.uri,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        if not readonly:
+            # journal_mode=WAL queda guardado en el archivo; basta con que lo
+            # pida el escritor.
+            conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
+        with self._lock:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _count_wait(self, started):
+        with self._lock:
+            self._stats["wait_seconds"] += time.perf_counter() - started
+
+    def _timeout(self, kind):
+        with self._lock:
+            self._stats["timeouts"] += 1
+        raise PoolTimeout(f"Tiempo agotado esperando conexión de {kind}")
+
+    # --- Escritor ---
+    def acquire_writer(self):
+        self._check_pid()
+        started = time.perf_counter()
+        if not self._writer_lock.acquire(timeout=self.acquire_timeout):
+            self._timeout("escritura")
+        self._count_wait(started)
+        if self._writer is None:
+            try:
+                self._writer = self._connect(readonly=False)
+            except Exception:
+                self._writer_lock.release()
+                raise
+        with self._lock:
+            self._stats["writer_acquired"] += 1
+        return self._writer
+
+    def release_writer(self, conn):
+        if conn.in_transaction:
+            # Un request que terminó sin commit no debe dejar la
+            # transacción abierta para el siguiente.
+            conn.rollback()
+            with self._lock:
+                self._stats["rollbacks_on_release"] += 1
+        self._writer_lock.release()
+
+    # --- Lectores ---
+    def acquire_reader(self):
+        self._check_pid()
+        started = time.perf_counter()
+        conn = None
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._readers_created < self.max_readers
+                if can_create:
+                    self._readers_created += 1
+            if can_create:
+                try:
+                    conn = self._connect(readonly=True)
+                except Exception:
+                    with self._lock:
+                        self._readers_created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._readers.get(timeout=self.acquire_timeout)
+                except queue.Empty:
+                    self._timeout("lectura")
+        self._count_wait(started)
+        with self._lock:
+            self._stats["reader_acquired"] += 1
+        return conn
+
+    def release_reader(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+            with self._lock:
+                self._stats["rollbacks_on_release"] += 1
+        self._readers.put(conn)
+
+    @contextmanager
+    def writer(self):
+        conn = self.acquire_writer()
+        try:
+            yield conn
+        finally:
+            self.release_writer(conn)
+
+    @contextmanager
+    def reader(self):
+        conn = self.acquire_reader()
+        try:
+            yield conn
+        finally:
+            self.release_reader(conn)
+
+    def stats(self):
+        """Estado actual del pool (para monitoreo)."""
+        with self._lock:
+            data = dict(self._stats)
+            data["readers_open"] = self._readers_created
+        data["readers_idle"] = self._readers.qsize()
+        data["readers_max"] = self.max_readers
+        data["writer_open"] = self._writer is not None
+        data["writer_busy"] = self._writer_lock.locked()
+        data["wait_seconds"] = round(data["wait_seconds"], 6)
+        return data
+
+    def close_all(self):
+        """Cierra las conexiones inactivas (al apagar la app)."""
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._readers_created = 0
+        if self._writer is not None and self._writer_lock.acquire(blocking=False):
+            try:
+                self._writer.close()
+                self._writer = None
+            finally:
+                self._writer_lock.release()
@@ -1,42 +1,50 @@
-import os
-import sys
-import win32serviceutil
-import win32service
-import win32event
-import servicemanager
-import subprocess
-
-class EpicuroService(win32serviceutil.ServiceFramework):
-    _svc_name_ = "EpicuroService"
-    _svc_display_name_ = "Epicuro Sandwich App Service"
-    _svc_description_ = "Servicio para la aplicación Epicuro Sandwich"
-
-    def __init__(self, args):
-        win32serviceutil.ServiceFramework.__init__(self, args)
-        self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
-
-    def SvcStop(self):
-        self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
-        win32event.SetEvent(self.hWaitStop)
-
-    def SvcDoRun(self):
-        servicemanager.LogMsg(servicemanager.EVENTLOG_INFORMATION_TYPE,
-                              servicemanager.PYSERVICE_SERVICE_STARTED,
-                              (self._svc_name_, ''))
-        self.main()
-
-    def main(self):
-        # Cambiar al directorio de la aplicación
-        os.chdir("C:\\sandwicheria")
-        
-        # Ejecutar la aplicación
-        process = subprocess.Popen([sys.executable, "app.py"], 
-                                  stdout=subprocess.PIPE, 
-                                  stderr=subprocess.PIPE)
-        
-        # Esperar hasta que se detenga el servicio
-        win32event.WaitForSingleObject(self.hWaitStop, win32event.INFINITE)
-        process.terminate()
-
-if __name__ == '__main__':
+import os
+import sys
+import win32serviceutil
+import win32service
+import win32event
+import servicemanager
+import subprocess
+
+class EpicuroService(win32serviceutil.ServiceFramework):
+    _svc_name_ = "EpicuroService"
+    _svc_display_name_ = "Epicuro Sandwich App Service"
+    _svc_description_ = "Servicio para la aplicación Epicuro Sandwich"
+
+    def __init__(self, args):
+        win32serviceutil.ServiceFramework.__init__(self, args)
+        self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
+
+    def SvcStop(self):
+        self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
+        win32event.SetEvent(self.hWaitStop)
+
+    def SvcDoRun(self):
+        servicemanager.LogMsg(servicemanager.EVENTLOG_INFORMATION_TYPE,
+                              servicemanager.PYSERVICE_SERVICE_STARTED,
+                              (self._svc_name_, ''))
+        self.main()
+
+    def main(self):
+        # Cambiar al directorio de la aplicación
+        os.chdir("C:\\sandwicheria")
+        
+        # Ejecutar la aplicación. La salida va a un archivo: con PIPE y sin
+        # nadie leyéndolo, el buffer se llenaba y la app quedaba bloqueada.
+        os.makedirs("logs", exist_ok=True)
+        with open(os.path.join("logs", "epicuro_service.log"), "ab") as log:
+            process = subprocess.Popen([sys.executable, "app.py"],
+                                       stdin=subprocess.DEVNULL,
+                                       stdout=log,
+                                       stderr=subprocess.STDOUT)
+
+            # Esperar hasta que se detenga el servicio
+            win32event.WaitForSingleObject(self.hWaitStop, win32event.INFINITE)
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+if __name__ == '__main__':
     win32serviceutil.HandleCommandLine(EpicuroService)
\ No newline at end of file
@@ -0,0 +1,419 @@
+"""Exportación de ventas a CSV, XLSX y PDF, generada en el servidor.
+
+Los archivos se escriben leyendo la base por tramos (sales_rows.iter_rows),
+sin cargar las ventas completas en memoria:
+
+  - CSV: mismo formato que /api/ventas?formato=csv, con BOM para que Excel
+    reconozca los acentos.
+  - XLSX: el zip del libro se arma con zipfile y la hoja se escribe fila por
+    fila con celdas de texto en línea (sin tabla de strings compartidos).
+  - PDF: resumen de ventas paginado (totales, por día, por categoría y top
+    de productos) desde el agregado diario. Requiere reportlab (opcional).
+
+Las exportaciones grandes corren en segundo plano (ExportManager): quedan
+registradas en la tabla export_jobs y el archivo se descarga después.
+"""
+import codecs
+import concurrent.futures
+import datetime
+import logging
+import os
+import re
+import unicodedata
+import zipfile
+from xml.sax.saxutils import escape
+
+import rollup
+import sales_rows
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas as pdf_canvas
+    REPORTLAB_AVAILABLE = True
+except Exception:
+    REPORTLAB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'pdf': ('application/pdf', 'pdf'),
+}
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+HEADERS = ["ID Pedido", "Fecha", "Cliente", "Producto", "Categoría",
+           "Cantidad", "Precio", "Total", "Costo"]
+
+
+class ExportError(Exception):
+    """La exportación no se puede generar (p. ej. falta reportlab)."""
+
+
+def _now():
+    return datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+
+
+def filename(formato, filtros):
+    """Nombre de archivo de descarga según el período filtrado."""
+    desde = filtros.desde or "inicio"
+    hasta = filtros.fecha_fin.isoformat() if filtros.fecha_fin else "hoy"
+    nombre = f"ventas_{desde}_{hasta}"
+    if filtros.categoria:
+        categoria = unicodedata.normalize("NFKD", filtros.categoria).encode("ascii", "ignore").decode()
+        nombre += "_" + re.sub(r"[^A-Za-z0-9-]+", "-", categoria)
+    return f"{nombre}.{FORMATS[formato][1]}"
+
+
+# --- CSV ---
+
+def csv_chunks(rows):
+    """CSV por bloques, precedido del BOM de UTF-8."""
+    yield codecs.BOM_UTF8.decode("utf-8")
+    yield from sales_rows.stream_csv(rows)
+
+
+def write_csv(rows, f):
+    """Escribe el CSV en un archivo binario. Devuelve la cantidad de filas."""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    for chunk in csv_chunks(counted()):
+        f.write(chunk.encode("utf-8"))
+    return count
+
+
+# --- XLSX ---
+
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Ventas" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'),
+    # Estilo 1 = encabezado en negrita
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'),
+}
+
+_XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetData>')
+_XLSX_SHEET_END = '</sheetData></worksheet>'
+
+# Caracteres de control que no se pueden escribir en XML
+_XML_INVALID = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_cell(value, style=0):
+    s = f' s="{style}"' if style else ''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c{s}><v>{value}</v></c>'
+    if value is None:
+        return '<c/>'
+    text = escape(_XML_INVALID.sub("", str(value)))
+    return f'<c t="inlineStr"{s}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values, style=0):
+    return '<row>' + ''.join(_xlsx_cell(v, style) for v in values) + '</row>'
+
+
+def write_xlsx(rows, f, chunk_size=sales_rows.CHUNK_SIZE):
+    """Escribe un libro XLSX con una hoja "Ventas" en el archivo f. Devuelve la cantidad de filas."""
+    count = 0
+    with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in _XLSX_STATIC.items():
+            zf.writestr(name, content)
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            block = [_XLSX_SHEET_START, _xlsx_row(HEADERS, style=1)]
+            for row in rows:
+                block.append(_xlsx_row([row[c] for c in sales_rows.COLUMNS]))
+                count += 1
+                if len(block) >= chunk_size:
+                    sheet.write("".join(block).encode("utf-8"))
+                    block = []
+            block.append(_XLSX_SHEET_END)
+            sheet.write("".join(block).encode("utf-8"))
+    return count
+
+
+# --- PDF ---
+
+def _money(value):
+    return "$" + "{:,.0f}".format(value or 0).replace(",", ".")
+
+
+def summary_data(db, filtros):
+    """Datos del resumen desde daily_sales/daily_orders. Los días se leen con un cursor."""
+    cur = db.cursor()
+    where, params = filtros.where("fecha", "category")
+    cur.execute("SELECT SUM(cantidad), SUM(ventas), SUM(costos) FROM daily_sales WHERE 1=1" + where, params)
+    cantidad, ventas, costos = cur.fetchone()
+    order_where, order_params = filtros.where("fecha", None)
+    categoria = filtros.categoria or rollup.ALL_CATEGORIES
+    cur.execute("SELECT SUM(pedidos) FROM daily_orders WHERE category = ?" + order_where,
+                [categoria] + order_params)
+    pedidos = cur.fetchone()[0] or 0
+    cur.execute("""SELECT category, SUM(cantidad), SUM(ventas), SUM(costos)
+                   FROM daily_sales WHERE 1=1""" + where + """
+                   GROUP BY category ORDER BY SUM(ventas) DESC""", params)
+    categorias = cur.fetchall()
+    cur.execute("""SELECT p.name, SUM(ds.cantidad), SUM(ds.ventas)
+                   FROM daily_sales ds JOIN products p ON p.id = ds.product_id
+                   WHERE 1=1""" + filtros.where("ds.fecha", "ds.category")[0] + """
+                   GROUP BY ds.product_id ORDER BY SUM(ds.cantidad) DESC LIMIT 10""", params)
+    productos = cur.fetchall()
+    dias_cur = db.cursor()
+    dias_cur.execute("""SELECT ds.fecha, SUM(ds.cantidad), SUM(ds.ventas), SUM(ds.costos),
+                               (SELECT pedidos FROM daily_orders d
+                                WHERE d.fecha = ds.fecha AND d.category = ?)
+                        FROM daily_sales ds WHERE 1=1""" + filtros.where("ds.fecha", "ds.category")[0] + """
+                        GROUP BY ds.fecha ORDER BY ds.fecha""", [categoria] + params)
+    return {
+        'totales': {'cantidad': cantidad or 0, 'ventas': ventas or 0,
+                    'costos': costos or 0, 'pedidos': pedidos},
+        'categorias': categorias,
+        'productos': productos,
+        'dias': dias_cur,
+    }
+
+
+class _PdfWriter:
+    """Escribe líneas de texto en columnas y pasa de página cuando se llena."""
+
+    def __init__(self, f, title):
+        self.canvas = pdf_canvas.Canvas(f, pagesize=A4)
+        self.canvas.setTitle(title)
+        self.width, self.height = A4
+        self.margin = 40
+        self.page = 0
+        self._new_page()
+
+    def _new_page(self):
+        if self.page:
+            self.canvas.showPage()
+        self.page += 1
+        self.y = self.height - self.margin
+        self.canvas.setFont("Helvetica", 8)
+        self.canvas.drawRightString(self.width - self.margin, self.margin / 2, f"Página {self.page}")
+
+    def space(self, lines=1):
+        if self.y - 14 * lines < self.margin:
+            self._new_page()
+
+    def text(self, text, size=10, bold=False):
+        self.space()
+        self.canvas.setFont("Helvetica-Bold" if bold else "Helvetica", size)
+        self.canvas.drawString(self.margin, self.y, text)
+        self.y -= size + 6
+
+    def row(self, values, widths, bold=False):
+        self.canvas.setFont("Helvetica-Bold" if bold else "Helvetica", 9)
+        x = self.margin
+        for i, (value, width) in enumerate(zip(values, widths)):
+            if i == 0:
+                self.canvas.drawString(x, self.y, str(value))
+            else:
+                self.canvas.drawRightString(x + width, self.y, str(value))
+            x += width
+        self.y -= 13
+
+    def table(self, headers, rows, widths):
+        self.space(2)
+        self.row(headers, widths, bold=True)
+        for values in rows:
+            if self.y - 13 < self.margin:
+                self._new_page()
+                self.row(headers, widths, bold=True)
+            self.row(values, widths)
+        self.y -= 8
+
+    def save(self):
+        self.canvas.save()
+
+
+def write_pdf(db, filtros, f):
+    """Escribe el resumen de ventas en PDF. Devuelve la cantidad de días incluidos."""
+    if not REPORTLAB_AVAILABLE:
+        raise ExportError("La exportación a PDF requiere reportlab (pip install reportlab)")
+    data = summary_data(db, filtros)
+    pdf = _PdfWriter(f, "Resumen de ventas")
+    pdf.text("Epicuro - Resumen de ventas", size=16, bold=True)
+    periodo = f"Período: {filtros.desde or 'inicio'} a {filtros.fecha_fin or 'hoy'}"
+    if filtros.categoria:
+        periodo += f" - Categoría: {filtros.categoria}"
+    pdf.text(periodo)
+    pdf.text(f"Generado: {_now()}", size=8)
+    pdf.y -= 6
+
+    totales = data['totales']
+    margen = (totales['ventas'] - totales['costos']) / totales['ventas'] * 100 if totales['ventas'] else 0
+    ticket = totales['ventas'] / totales['pedidos'] if totales['pedidos'] else 0
+    pdf.text("Totales", size=12, bold=True)
+    pdf.table(["", "Valor"], [
+        ["Ventas", _money(totales['ventas'])],
+        ["Costos", _money(totales['costos'])],
+        ["Margen", f"{margen:.1f}%"],
+        ["Pedidos", totales['pedidos']],
+        ["Ticket promedio", _money(ticket)],
+        ["Unidades vendidas", totales['cantidad']],
+    ], [200, 120])
+
+    pdf.text("Por categoría", size=12, bold=True)
+    pdf.table(["Categoría", "Cantidad", "Ventas", "Costos"],
+              ([c or "-", q, _money(v), _money(k)] for c, q, v, k in data['categorias']),
+              [200, 80, 100, 100])
+
+    pdf.text("Top 10 productos", size=12, bold=True)
+    pdf.table(["Producto", "Cantidad", "Ventas"],
+              ([n, q, _money(v)] for n, q, v in data['productos']),
+              [200, 80, 100])
+
+    dias = 0
+
+    def filas_dias():
+        nonlocal dias
+        for fecha, cantidad, ventas, costos, pedidos in data['dias']:
+            dias += 1
+            yield [fecha, pedidos or 0, cantidad, _money(ventas), _money(costos)]
+
+    pdf.text("Por día", size=12, bold=True)
+    pdf.table(["Fecha", "Pedidos", "Cantidad", "Ventas", "Costos"], filas_dias(),
+              [120, 70, 70, 100, 100])
+    pdf.save()
+    return dias
+
+
+def write_export(db, formato, filtros, f):
+    """Escribe la exportación en el archivo binario f. Devuelve la cantidad de filas."""
+    if formato == 'csv':
+        return write_csv(sales_rows.iter_rows(db, filtros), f)
+    if formato == 'xlsx':
+        return write_xlsx(sales_rows.iter_rows(db, filtros), f)
+    if formato == 'pdf':
+        return write_pdf(db, filtros, f)
+    raise ExportError(f"Formato desconocido: {formato}")
+
+
+# --- Exportaciones en segundo plano ---
+
+class ExportManager:
+    """Genera exportaciones grandes en un hilo aparte.
+
+    Los trabajos quedan en la tabla export_jobs (visible desde cualquier
+    proceso) y los archivos en `directory`. Los archivos con más de
+    `max_age_hours` se borran al encolar uno nuevo. Las ventas se leen con
+    `reader()` (un context manager que entrega una conexión; por defecto
+    pool.reader), así la app las lee de la réplica de reportes.
+    """
+
+    def __init__(self, pool, directory, max_workers=1, max_age_hours=24, reader=None):
+        self.pool = pool
+        self.reader = reader or pool.reader
+        self.directory = directory
+        self.max_age_hours = max_age_hours
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix="export")
+
+    def submit(self, db, formato, filtros, query_string):
+        """Registra el trabajo con la conexión de escritura db y lo encola. Devuelve el id."""
+        self.cleanup(db)
+        cur = db.cursor()
+        cur.execute("""INSERT INTO export_jobs (status, formato, params, filename, created_at)
+                       VALUES (?, ?, ?, ?, ?)""",
+                    (PENDING, formato, query_string, filename(formato, filtros), _now()))
+        job_id = cur.lastrowid
+        db.commit()
+        self._executor.submit(self._run, job_id, formato, filtros)
+        return job_id
+
+    def path(self, job_id):
+        return os.path.join(self.directory, f"export_{job_id}.bin")
+
+    def _set(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self.pool.writer() as db:
+            db.execute(f"UPDATE export_jobs SET {columns} WHERE id = ?", list(fields.values()) + [job_id])
+            db.commit()
+
+    def _run(self, job_id, formato, filtros):
+        self._set(job_id, status=RUNNING, started_at=_now())
+        path = self.path(job_id)
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with self.reader() as db, open(tmp_path, "wb") as f:
+                rows = write_export(db, formato, filtros, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error generando exportación #{job_id}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._set(job_id, status=FAILED, error=str(e), finished_at=_now())
+            return
+        self._set(job_id, status=DONE, rows=rows, size=os.path.getsize(path), finished_at=_now())
+
+    def cleanup(self, db):
+        """Borra los trabajos terminados más antiguos que max_age_hours y sus archivos."""
+        limit = (datetime.datetime.now() - datetime.timedelta(hours=self.max_age_hours))
+        limit = limit.isoformat(sep=' ', timespec='seconds')
+        cur = db.cursor()
+        cur.execute("SELECT id FROM export_jobs WHERE created_at < ? AND status IN (?, ?)",
+                    (limit, DONE, FAILED))
+        for (job_id,) in cur.fetchall():
+            if os.path.exists(self.path(job_id)):
+                os.remove(self.path(job_id))
+            cur.execute("DELETE FROM export_jobs WHERE id = ?", (job_id,))
+        db.commit()
@@ -0,0 +1,58 @@
+"""Caché de fragmentos HTML que sólo dependen del catálogo.
+
+El menú de /orders y las filas de la tabla de /products salen completos del
+catálogo: recorrerlos con Jinja en cada request es la mayor parte del tiempo
+de esas páginas, aunque el catálogo cambie unas pocas veces por semana. Cada
+fragmento (una plantilla parcial, templates/_*.html) se renderiza una vez por
+versión del catálogo (Catalog.version y db_version, catalog_cache.py) y se
+guarda como Markup; la página lo inserta sin volver a escaparlo.
+
+Cuando llega un catálogo con otra versión se descartan todos los fragmentos
+de una vez. Los fragmentos no pueden usar nada del request (flash, sesión,
+argumentos): lo que cambia por request queda en la plantilla de la página.
+"""
+import threading
+
+from flask import render_template
+from markupsafe import Markup
+
+
+class FragmentCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._fragments = {}
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, template, catalog, **context):
+        """HTML de template para catalog; sólo renderiza si cambió la versión."""
+        key = (catalog.version, catalog.db_version)
+        with self._lock:
+            html = self._fragments.get(template) if key == self._key else None
+        if html is not None:
+            self.hits += 1
+            return html
+        self.misses += 1
+        html = Markup(render_template(template, **context))
+        with self._lock:
+            if key != self._key:
+                self._key = key
+                self._fragments = {}
+            self._fragments[template] = html
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._key = None
+            self._fragments = {}
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "catalog_version": list(self._key) if self._key else None,
+            "fragments": sorted(self._fragments),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,102 @@
+"""Configuración de gunicorn para producción (Linux).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Se ajusta con variables de entorno (EPICURO_BIND, EPICURO_WORKERS,
+EPICURO_THREADS, EPICURO_TIMEOUT, EPICURO_LOG_LEVEL). El maestro carga la app
+una vez (preload_app, ver wsgi.py) y crea los workers con fork.
+
+Cada pantalla de cocina conectada (/api/kitchen/stream) ocupa un hilo de
+gthread mientras dura su stream. Con muchas pantallas, o pantallas que
+quedan abiertas todo el día, conviene EPICURO_WORKER_CLASS=gevent (pip
+install gevent): cada conexión en espera es una greenlet.
+
+Recarga sin cortar: `kill -HUP <pid del maestro>` (o `systemctl reload
+epicuro`) levanta workers nuevos y deja terminar los requests en curso de
+los viejos. Como el código se carga en el maestro, un cambio de código
+necesita reiniciar el servicio (o USR2 + WINCH para cambiar de maestro).
+
+Los logs salen en una línea clave=valor por evento. En cada worker los
+handlers se atienden desde una cola (QueueHandler/QueueListener): un request
+nunca queda esperando a que se escriba el log.
+"""
+import logging
+import logging.handlers
+import os
+import queue
+
+bind = os.environ.get("EPICURO_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("EPICURO_WORKERS", "2"))
+threads = int(os.environ.get("EPICURO_THREADS", "4"))
+worker_class = os.environ.get("EPICURO_WORKER_CLASS", "gthread")
+worker_connections = 1000  # sólo gevent: conexiones simultáneas por worker
+timeout = int(os.environ.get("EPICURO_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+preload_app = True
+# Recicla workers de vez en cuando (memoria de cachés por proceso)
+max_requests = 5000
+max_requests_jitter = 500
+pidfile = os.environ.get("EPICURO_PIDFILE")
+
+loglevel = os.environ.get("EPICURO_LOG_LEVEL", "info")
+accesslog = "-"
+errorlog = "-"
+access_log_format = 'remote=%(h)s method=%(m)s path="%(U)s" query="%(q)s" status=%(s)s bytes=%(B)s ms=%(M)s'
+
+_FORMAT = "ts=%(asctime)s level=%(levelname)s pid=%(process)d logger=%(name)s msg=%(message)r"
+
+logconfig_dict = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "kv": {"format": _FORMAT, "datefmt": "%Y-%m-%dT%H:%M:%S"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "kv", "stream": "ext://sys.stderr"},
+    },
+    "root": {"level": loglevel.upper(), "handlers": ["console"]},
+    "loggers": {
+        "gunicorn.error": {"level": loglevel.upper(), "handlers": ["console"], "propagate": False},
+        "gunicorn.access": {"level": "INFO", "handlers": ["console"], "propagate": False},
+    },
+}
+
+
+def _queue_logging():
+    """Pasa los handlers de los loggers a un hilo propio; devuelve el listener."""
+    log_queue = queue.SimpleQueue()
+    handlers = []
+    for name in (None, "gunicorn.error", "gunicorn.access"):
+        logger = logging.getLogger(name)
+        for handler in logger.handlers:
+            if handler not in handlers:
+                handlers.append(handler)
+        logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def post_fork(server, worker):
+    import app as app_module
+
+    worker.log_listener = _queue_logging()
+    # Con gthread cada stream de cocina toma un hilo: dejar la mitad libres
+    if worker_class == "gthread":
+        app_module.KITCHEN_MAX_STREAMS = max(1, threads // 2)
+    else:
+        app_module.KITCHEN_MAX_STREAMS = worker_connections // 2
+    if app_module.ENABLE_PRINTER:
+        # Sólo un worker se queda con la cola de impresión (lock en PRINT_LOCK_FILE)
+        app_module.print_spooler.start()
+
+
+def worker_exit(server, worker):
+    import app as app_module
+
+    app_module.print_spooler.stop()
+    app_module.db_pool.close_all()
+    listener = getattr(worker, "log_listener", None)
+    if listener is not None:
+        listener.stop()
@@ -0,0 +1,241 @@
+"""Pantalla de cocina en vivo: eventos de comandas empujados por SSE.
+
+Las escrituras de comandas (crear, editar, borrar) llaman a publish() dentro
+de su transacción: el evento, con la comanda ya armada (cliente, productos,
+notas), queda en la tabla kitchen_events. Con varios workers de gunicorn
+cada proceso tiene su propio KitchenBus, así que la tabla es el canal común:
+un hilo por proceso la lee (al instante cuando la escritura fue local,
+notify(); cada poll_seconds para las de otros workers) y guarda los últimos
+eventos en un buffer circular.
+
+stream() entrega esos eventos como server-sent events. El id de cada evento
+es el id de kitchen_events, igual en todos los workers: al reconectarse, el
+navegador manda Last-Event-ID y recibe lo que se perdió desde el buffer; si
+ya no está ahí, recibe un evento reset y recarga la lista completa.
+
+Las pantallas conectadas no consultan la base: sólo esperan en una
+condición compartida. Cada stream dura a lo más unos minutos y el
+navegador se reconecta solo, así ningún worker queda tomado para siempre;
+con el worker gevent de gunicorn (EPICURO_WORKER_CLASS=gevent) una pantalla
+inactiva es una greenlet en espera y no un hilo.
+"""
+import collections
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+
+KEEP_EVENTS = 2000   # filas que se conservan en kitchen_events
+RETRY_MS = 2000      # espera que pide el servidor antes de reconectar
+
+
+def order_payload(cur, order_id):
+    """La comanda como la muestra la cocina (None si no existe)."""
+    cur.execute("SELECT id, created_at, customer_name, total FROM orders WHERE id = ?", (order_id,))
+    order = cur.fetchone()
+    if order is None:
+        return None
+    cur.execute("""SELECT p.name, COALESCE(c.name, ''), oi.qty, oi.note
+                   FROM order_items oi
+                   JOIN products p ON oi.product_id = p.id
+                   LEFT JOIN categories c ON c.id = p.category_id
+                   WHERE oi.order_id = ?
+                   ORDER BY oi.id""", (order_id,))
+    return {
+        "id": order[0],
+        "created_at": order[1],
+        "customer_name": order[2],
+        "total": order[3],
+        "items": [{"name": r[0], "category": r[1], "qty": r[2], "note": r[3]} for r in cur.fetchall()],
+    }
+
+
+def publish(cur, kind, order_id):
+    """Registra el evento en la transacción en curso (llamar antes del commit).
+
+    Para DELETED se puede llamar antes o después de borrar: sólo viaja el id.
+    """
+    payload = {"id": order_id} if kind == DELETED else order_payload(cur, order_id)
+    if payload is None:
+        return
+    cur.execute("INSERT INTO kitchen_events (created_at, kind, order_id, payload) VALUES (?, ?, ?, ?)",
+                (datetime.datetime.now().isoformat(sep=' ', timespec='seconds'), kind, order_id,
+                 json.dumps(payload, ensure_ascii=False)))
+    event_id = cur.lastrowid
+    if event_id % 100 == 0:
+        cur.execute("DELETE FROM kitchen_events WHERE id <= ?", (event_id - KEEP_EVENTS,))
+
+
+def recent_orders(db, limit):
+    """(último id de evento, comandas más recientes) para la carga inicial de la pantalla.
+
+    El id se lee antes que las comandas: lo que entre entremedio llega además
+    como evento, y la pantalla lo aplica sobre la misma comanda.
+    """
+    row = db.execute("SELECT MAX(id) FROM kitchen_events").fetchone()
+    last_id = row[0] or 0
+    cur = db.cursor()
+    ids = [r[0] for r in cur.execute("SELECT id FROM orders ORDER BY id DESC LIMIT ?", (limit,)).fetchall()]
+    return last_id, [order_payload(cur, order_id) for order_id in ids]
+
+
+Event = collections.namedtuple("Event", "id kind data")
+
+
+def format_event(event):
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {event.data}\n\n"
+
+
+class KitchenBus:
+    def __init__(self, pool, buffer_size=500, poll_seconds=1.0):
+        self.pool = pool
+        self.buffer_size = buffer_size
+        self.poll_seconds = poll_seconds
+        self._reset()
+
+    def _reset(self):
+        # También después de un fork: el hilo del padre no existe en el hijo
+        self._pid = os.getpid()
+        self._changed = threading.Condition()
+        self._wakeup = threading.Event()
+        self._events = collections.deque(maxlen=self.buffer_size)
+        self._last_id = None  # None: todavía no se leyó la tabla
+        self._thread = None
+        self._subscribers = 0
+        self._counters = {"streams": 0, "events_sent": 0, "resets": 0, "polls": 0}
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    # --- Lectura de kitchen_events ---
+
+    def notify(self):
+        """Hay un evento nuevo escrito por este proceso: leerlo ya."""
+        self._check_pid()
+        self._wakeup.set()
+
+    def start(self):
+        self._check_pid()
+        with self._changed:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="kitchen-bus", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._poll()
+            except Exception as e:
+                logger.error(f"Error leyendo eventos de cocina: {e}")
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+
+    def _poll(self):
+        with self.pool.reader() as db:
+            if self._last_id is None:
+                rows = db.execute("SELECT id, kind, payload FROM kitchen_events ORDER BY id DESC LIMIT ?",
+                                  (self.buffer_size,)).fetchall()[::-1]
+                first_poll = True
+            else:
+                rows = db.execute("SELECT id, kind, payload FROM kitchen_events WHERE id > ? ORDER BY id",
+                                  (self._last_id,)).fetchall()
+                first_poll = False
+        with self._changed:
+            self._counters["polls"] += 1
+            for row in rows:
+                self._events.append(Event(row[0], row[1], row[2]))
+            if rows:
+                self._last_id = rows[-1][0]
+            elif first_poll:
+                self._last_id = 0
+            if rows or first_poll:
+                self._changed.notify_all()
+
+    # --- Suscriptores ---
+
+    def _ready(self, timeout):
+        """Espera la primera lectura de la tabla; False si no llegó a tiempo."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self._last_id is not None, timeout)
+
+    def events_after(self, last_id):
+        """Eventos con id > last_id; None si parte de ellos ya salió del buffer."""
+        with self._changed:
+            if last_id >= self._last_id:
+                return [] if last_id == self._last_id else None
+            oldest = self._events[0].id if self._events else self._last_id + 1
+            # Los ids son correlativos (AUTOINCREMENT): si el siguiente que
+            # espera la pantalla es anterior al más viejo del buffer, se perdió
+            if last_id < oldest - 1:
+                return None
+            return [event for event in self._events if event.id > last_id]
+
+    def wait(self, last_id, timeout):
+        """Como events_after, pero espera hasta timeout si aún no hay nada nuevo."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._last_id != last_id, timeout)
+        return self.events_after(last_id)
+
+    def stream(self, last_id=None, max_seconds=300, heartbeat=15):
+        """Generador del cuerpo text/event-stream para una pantalla.
+
+        last_id es el Last-Event-ID del navegador (o el de la carga inicial).
+        Sin él se parte desde el último evento. Cada heartbeat segundos sin
+        eventos se manda un comentario para que proxies y navegador no
+        corten la conexión; después de max_seconds el stream termina y el
+        navegador se reconecta con su Last-Event-ID.
+        """
+        self.start()
+        with self._changed:
+            self._subscribers += 1
+            self._counters["streams"] += 1
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if not self._ready(10):
+                return
+            if last_id is None:
+                last_id = self._last_id
+            deadline = time.monotonic() + max_seconds
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                events = self.wait(last_id, min(heartbeat, remaining))
+                if events is None:
+                    # Lo perdido ya no está en el buffer: la pantalla recarga todo
+                    with self._changed:
+                        last_id = self._last_id
+                        self._counters["resets"] += 1
+                    yield format_event(Event(last_id, "reset", "{}"))
+                elif events:
+                    last_id = events[-1].id
+                    with self._changed:
+                        self._counters["events_sent"] += len(events)
+                    for event in events:
+                        yield format_event(event)
+                else:
+                    yield ": ping\n\n"
+        finally:
+            with self._changed:
+                self._subscribers -= 1
+
+    def stats(self):
+        with self._changed:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "subscribers": self._subscribers,
+                "last_event_id": self._last_id,
+                "buffered": len(self._events),
+                "oldest_buffered_id": self._events[0].id if self._events else None,
+                **self._counters,
+            }
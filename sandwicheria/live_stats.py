@@ -0,0 +1,117 @@
+"""Contadores en vivo para el inicio (/api/stats, /api/products, /api/customers).
+
+El dashboard de index.html muestra comandas e ingresos del día, cantidad de
+productos y clientes, los productos más vendidos y los clientes frecuentes.
+Nada de eso se calcula recorriendo la historia:
+
+  - comandas e ingresos del día salen del agregado diario (rollup.py): una
+    fila de daily_orders y las filas de hoy de daily_sales;
+  - product_stats lleva, por producto, unidades vendidas y comandas;
+  - la tabla customers (customers.py) lleva comandas, total gastado y
+    última visita de cada cliente, y stat_counters guarda cuántos hay.
+
+Las escrituras de comandas llaman a apply_order() en la misma transacción.
+rebuild() recalcula todo y check_consistency() lo compara contra las tablas
+originales (`flask stats-check`).
+"""
+import customers
+import rollup
+
+_PRODUCTS_SELECT = """
+    SELECT oi.product_id, SUM(oi.qty) AS cantidad, COUNT(DISTINCT oi.order_id) AS pedidos
+    FROM order_items oi
+"""
+
+# Totales por producto: la base en uso más lo archivado (archive.py)
+_PRODUCTS_TOTALS = f"""
+    SELECT product_id, SUM(cantidad), SUM(pedidos) FROM (
+        {_PRODUCTS_SELECT} GROUP BY 1
+        UNION ALL
+        SELECT product_id, cantidad, pedidos FROM archived_product_stats)
+    GROUP BY 1
+"""
+
+
+def apply_order(cur, order_id, sign=1):
+    """Suma (sign=1) o resta (sign=-1) una comanda a los contadores.
+
+    Para restar se debe llamar antes de borrar la comanda y sus order_items.
+    """
+    cur.execute(f"""
+        INSERT INTO product_stats (product_id, cantidad, pedidos)
+        SELECT product_id, ? * cantidad, ? * pedidos
+        FROM ({_PRODUCTS_SELECT} WHERE oi.order_id = ? GROUP BY oi.product_id)
+        WHERE true
+        ON CONFLICT (product_id) DO UPDATE SET
+            cantidad = cantidad + excluded.cantidad,
+            pedidos = pedidos + excluded.pedidos
+    """, (sign, sign, order_id))
+    cur.execute("SELECT customer_id, total, created_at FROM orders WHERE id = ?", (order_id,))
+    order = cur.fetchone()
+    if order is not None and order[0] is not None:
+        customers.apply_order(cur, order[0], sign, order[1] or 0, order[2])
+    if sign < 0:
+        # Sólo los productos de la comanda, por clave primaria
+        cur.execute("SELECT DISTINCT product_id FROM order_items WHERE order_id = ?", (order_id,))
+        cur.executemany("DELETE FROM product_stats WHERE product_id = ? AND pedidos = 0",
+                        [(row[0],) for row in cur.fetchall()])
+
+
+def move_order(cur, order_id, customer_id):
+    """Pasa los contadores de una comanda a otro cliente (antes del UPDATE de orders)."""
+    cur.execute("SELECT customer_id, total, created_at FROM orders WHERE id = ?", (order_id,))
+    order = cur.fetchone()
+    if order is None or order[0] == customer_id:
+        return
+    if order[0] is not None:
+        customers.apply_order(cur, order[0], -1, order[1] or 0, order[2])
+    if customer_id is not None:
+        customers.apply_order(cur, customer_id, 1, order[1] or 0, order[2])
+
+
+# --- Lecturas ---
+
+def today(db, fecha):
+    """Comandas e ingresos del día fecha (YYYY-MM-DD) desde el agregado diario."""
+    row = db.execute("SELECT pedidos FROM daily_orders WHERE fecha = ? AND category = ?",
+                     (fecha, rollup.ALL_CATEGORIES)).fetchone()
+    pedidos = row[0] if row else 0
+    ventas = db.execute("SELECT COALESCE(SUM(ventas), 0) FROM daily_sales WHERE fecha = ?",
+                        (fecha,)).fetchone()[0]
+    return pedidos, ventas
+
+
+def product_sales(db):
+    """{product_id: (unidades vendidas, comandas)}"""
+    return {row[0]: (row[1], row[2])
+            for row in db.execute("SELECT product_id, cantidad, pedidos FROM product_stats")}
+
+
+# --- Reconciliación ---
+
+def rebuild(db):
+    """Recalcula los contadores desde orders/order_items y los resúmenes de lo archivado."""
+    cur = db.cursor()
+    cur.execute("DELETE FROM product_stats")
+    cur.execute(f"INSERT INTO product_stats (product_id, cantidad, pedidos) {_PRODUCTS_TOTALS}")
+    customers.rebuild(cur)
+    db.commit()
+
+
+def check_consistency(db):
+    """Compara los contadores con un recálculo completo.
+
+    Devuelve una lista de diferencias (tabla, clave, esperado, guardado);
+    lista vacía si todo cuadra. Las fechas de visita no se comparan (ver
+    customers.apply_order).
+    """
+    cur = db.cursor()
+    differences = []
+    cur.execute(_PRODUCTS_TOTALS)
+    expected = {r[0]: tuple(r[1:]) for r in cur.fetchall()}
+    cur.execute("SELECT product_id, cantidad, pedidos FROM product_stats")
+    stored = {r[0]: tuple(r[1:]) for r in cur.fetchall()}
+    for key in sorted(set(expected) | set(stored)):
+        if expected.get(key) != stored.get(key):
+            differences.append(("product_stats", key, expected.get(key), stored.get(key)))
+    return differences + customers.check_consistency(db)
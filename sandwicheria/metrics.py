@@ -0,0 +1,336 @@
+"""Métricas de latencia por ruta y por consulta SQL, en formato Prometheus.
+
+  - Rutas: install(app) agrega hooks de Flask que miden cada request (hasta
+    que se termina de enviar la respuesta, también en streaming) por
+    endpoint, método y código de estado.
+  - SQL: el pool crea las conexiones con InstrumentedConnection, cuyos
+    cursores miden cada sentencia (execute más el tiempo de los fetch) y
+    cuentan filas y errores, por operación y tabla.
+
+Los requests y las consultas que pasan de un umbral se registran en el log
+con sus parámetros. Todo vive en memoria del proceso (con gunicorn, cada
+worker tiene sus propios números) y /metrics lo entrega con render().
+"""
+import bisect
+import logging
+import re
+import sqlite3
+import threading
+import time
+from time import perf_counter
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Umbrales del log de lentos (segundos); None desactiva
+slow_request_seconds = 0.5
+slow_query_seconds = 0.1
+
+# Función (sql, params, segundos, filas) llamada por cada sentencia terminada;
+# la usa el modo de análisis de planes (query_plans.QueryAnalyzer)
+query_observer = None
+
+
+class Histogram:
+    """Histograma acumulativo al estilo Prometheus, por combinación de etiquetas."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # etiquetas -> [conteos por bucket..., +Inf], suma
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+def _labels(names, values):
+    return ",".join('{}="{}"'.format(n, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                    for n, v in zip(names, values))
+
+
+REQUEST_SECONDS = Histogram("epicuro_http_request_duration_seconds",
+                            "Duración de los requests por endpoint.", ("endpoint", "method"), REQUEST_BUCKETS)
+REQUESTS = Counter("epicuro_http_requests_total",
+                   "Requests por endpoint, método y código de estado.", ("endpoint", "method", "status"))
+REQUEST_ERRORS = Counter("epicuro_http_request_errors_total",
+                         "Requests que terminaron con 5xx o con excepción.", ("endpoint",))
+SQL_SECONDS = Histogram("epicuro_sql_query_duration_seconds",
+                        "Duración de las sentencias SQL (execute + fetch).", ("op", "table"), SQL_BUCKETS)
+SQL_ROWS = Counter("epicuro_sql_rows_total",
+                   "Filas leídas (SELECT) o modificadas por las sentencias SQL.", ("op", "table"))
+SQL_ERRORS = Counter("epicuro_sql_errors_total", "Sentencias SQL que fallaron.", ("op", "table"))
+
+_METRICS = (REQUEST_SECONDS, REQUESTS, REQUEST_ERRORS, SQL_SECONDS, SQL_ROWS, SQL_ERRORS)
+
+
+# --- SQL ---
+
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?\(?\s*"
+                    r"(?:[A-Za-z_][A-Za-z0-9_]*\.)?([A-Za-z_][A-Za-z0-9_]*)",
+                    re.IGNORECASE)
+_shapes = {}  # sql -> (op, table); las sentencias son pocas y se repiten
+
+
+def statement_labels(sql):
+    """(operación, tabla principal) de una sentencia, para las etiquetas."""
+    labels = _shapes.get(sql)
+    if labels is None:
+        words = sql.split(None, 1)
+        op = words[0].upper() if words else ""
+        if op not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+            op = "OTHER"
+        match = _TABLE.search(sql)
+        labels = (op, match.group(1).lower() if match else "")
+        if len(_shapes) < 2000:
+            _shapes[sql] = labels
+    return labels
+
+
+def _one_line(sql):
+    return " ".join(sql.split())
+
+
+_local = threading.local()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mide cada sentencia hasta que se agotan sus filas.
+
+    Cuenta el tiempo de execute y de fetchone/fetchmany/fetchall. Al iterar
+    (for row in cur) sólo se cuentan las filas: medir cada paso costaría más
+    que leer la fila, y en los reportes el trabajo pesado (GROUP BY, ORDER
+    BY) ocurre en el primer paso, dentro de execute.
+    """
+
+    _sql = None
+
+    def execute(self, sql, parameters=()):
+        if self._sql is not None:
+            self._finish()
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self._sql is not None:
+            self._finish()
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def _run(self, method, sql, parameters):
+        started = perf_counter()
+        try:
+            method(sql, parameters)
+        except Exception:
+            SQL_ERRORS.inc(statement_labels(sql))
+            raise
+        self._elapsed = perf_counter() - started
+        self._sql = sql
+        self._params = parameters
+        if self.description is None:  # no devuelve filas: ya terminó
+            self._rows = max(self.rowcount, 0)
+            self._finish()
+        else:
+            self._rows = 0
+        return self
+
+    def fetchone(self):
+        started = perf_counter()
+        row = super().fetchone()
+        if self._sql is not None:
+            self._elapsed += perf_counter() - started
+            if row is None:
+                self._finish()
+            else:
+                self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        started = perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if self._sql is not None:
+            self._elapsed += perf_counter() - started
+            self._rows += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        started = perf_counter()
+        rows = super().fetchall()
+        if self._sql is not None:
+            self._elapsed += perf_counter() - started
+            self._rows += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish()
+            raise
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass  # al cerrar el intérprete los módulos ya pueden no estar
+
+    def _finish(self):
+        sql = self._sql
+        if sql is None:
+            return
+        self._sql = None
+        labels = statement_labels(sql)
+        SQL_SECONDS.observe(labels, self._elapsed)
+        if self._rows:
+            SQL_ROWS.inc(labels, self._rows)
+        current = getattr(_local, "request", None)
+        if current is not None:
+            current[0] += 1
+            current[1] += self._elapsed
+        if query_observer is not None:
+            query_observer(sql, self._params, self._elapsed, self._rows)
+        if slow_query_seconds is not None and self._elapsed >= slow_query_seconds:
+            logger.warning("Consulta lenta (%.1f ms, %d filas): %s params=%.200r",
+                           self._elapsed * 1000, self._rows, _one_line(sql), self._params)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexión cuyos cursores (también los de db.execute) son InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute no pasa por cursor(): se redirige a mano
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# --- Rutas ---
+
+def install(app):
+    """Mide todos los requests de app."""
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        _local.request = [0, 0.0]  # consultas, segundos en SQL
+
+    @app.after_request
+    def _record(response):
+        started = g.pop("_metrics_started", None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or "sin_ruta"
+        method = request.method
+        path = request.full_path.rstrip("?")
+        status = response.status_code
+        sql = _local.request
+        # Los streams SSE duran minutos a propósito: no son requests lentos
+        long_lived = response.mimetype == "text/event-stream"
+
+        def finish():
+            # Se llama al cerrar la respuesta: incluye el envío en streaming
+            elapsed = time.perf_counter() - started
+            REQUEST_SECONDS.observe((endpoint, method), elapsed)
+            REQUESTS.inc((endpoint, method, str(status)))
+            if status >= 500:
+                REQUEST_ERRORS.inc((endpoint,))
+            if slow_request_seconds is not None and elapsed >= slow_request_seconds and not long_lived:
+                logger.warning("Request lento (%.1f ms): %s %s -> %s; %d consultas, %.1f ms en SQL",
+                               elapsed * 1000, method, path, status, sql[0], sql[1] * 1000)
+
+        response.call_on_close(finish)
+        return response
+
+
+def render(extra=()):
+    """Texto para /metrics; extra son líneas ya formateadas (gauges de la app)."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
+
+
+def gauges(name, help_text, values):
+    """Líneas de un gauge sin etiquetas para cada (sufijo, valor) de values."""
+    lines = []
+    for suffix, value in values:
+        full = f"{name}_{suffix}"
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} gauge")
+        lines.append(f"{full} {value if value is not None else 'NaN'}")
+    return lines
+
+
+def counters(name, help_text, values):
+    """Como gauges() pero para totales que sólo crecen: {name}_{sufijo}_total.
+
+    Se declaran counter para que rate()/increase() toleren que vuelvan a cero
+    cuando gunicorn recicla el worker.
+    """
+    lines = []
+    for suffix, value in values:
+        full = f"{name}_{suffix}_total"
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} counter")
+        lines.append(f"{full} {value}")
+    return lines
@@ -0,0 +1,367 @@
+"""Migraciones de esquema versionadas.
+
+Cada migración tiene un número de versión, una descripción y una función
+que recibe el cursor. Se aplican en orden, una sola vez, y cada una queda
+registrada en la tabla schema_version. Los pasos son idempotentes (IF NOT
+EXISTS, revisión de columnas) para poder correr sobre bases creadas con el
+antiguo init_db().
+"""
+import datetime
+import sqlite3
+
+from customers import normalize, display_name
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Registra una función como migración con el número de versión dado."""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def has_column(cur, table, column):
+    cur.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cur.fetchall())
+
+
+def current_version(db):
+    cur = db.cursor()
+    cur.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TEXT
+    )""")
+    cur.execute("SELECT MAX(version) FROM schema_version")
+    row = cur.fetchone()
+    return row[0] or 0
+
+
+def run_migrations(db):
+    """Aplica las migraciones pendientes. Devuelve la lista de versiones aplicadas."""
+    applied = []
+    version = current_version(db)
+    db.commit()
+    for number, description, func in MIGRATIONS:
+        if number <= version:
+            continue
+        cur = db.cursor()
+        # Cada migración corre en su propia transacción (incluye el DDL)
+        cur.execute("BEGIN")
+        try:
+            func(cur)
+            cur.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                        (number, description,
+                         datetime.datetime.now().isoformat(sep=' ', timespec='seconds')))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        applied.append(number)
+    return applied
+
+
+# --- Migraciones ---
+
+@migration(1, "Tablas base: products, orders, order_items")
+def _base_tables(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE,
+        category TEXT,
+        base_protein TEXT,
+        price INTEGER,
+        cost INTEGER
+    )""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT,
+        customer_name TEXT
+    )""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS order_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER,
+        product_id INTEGER,
+        qty INTEGER,
+        note TEXT,
+        FOREIGN KEY(order_id) REFERENCES orders(id),
+        FOREIGN KEY(product_id) REFERENCES products(id)
+    )""")
+
+
+@migration(2, "Índices para los joins de comandas y reportes")
+def _report_indexes(cur):
+    # orders -> order_items por order_id (comanda, orders_list, /api/*);
+    # incluye product_id y qty para resolver el join sin tocar la tabla.
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_order_items_order
+                   ON order_items (order_id, product_id, qty)""")
+    # Uso de un producto (delete_product) y top de productos
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_order_items_product
+                   ON order_items (product_id)""")
+    # Filtro y orden por fecha; cubre id y cliente para métricas y ventas
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_orders_created_at
+                   ON orders (created_at, id, customer_name)""")
+    cur.execute("ANALYZE")
+
+
+@migration(3, "Agregado diario de ventas (daily_sales, daily_orders)")
+def _daily_sales(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS daily_sales (
+        fecha TEXT NOT NULL,
+        category TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        cantidad INTEGER NOT NULL DEFAULT 0,
+        ventas INTEGER NOT NULL DEFAULT 0,
+        costos INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (fecha, category, product_id)
+    ) WITHOUT ROWID""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_daily_sales_product
+                   ON daily_sales (product_id)""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS daily_orders (
+        fecha TEXT NOT NULL,
+        category TEXT NOT NULL,
+        pedidos INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (fecha, category)
+    ) WITHOUT ROWID""")
+    # Carga inicial con el esquema de esta versión ('*' = todas las categorías)
+    cur.execute("DELETE FROM daily_sales")
+    cur.execute("DELETE FROM daily_orders")
+    cur.execute("""INSERT INTO daily_sales (fecha, category, product_id, cantidad, ventas, costos)
+        SELECT substr(o.created_at, 1, 10), COALESCE(p.category, ''), oi.product_id,
+               SUM(oi.qty), SUM(p.price * oi.qty), SUM(p.cost * oi.qty)
+        FROM orders o
+        JOIN order_items oi ON o.id = oi.order_id
+        JOIN products p ON oi.product_id = p.id
+        GROUP BY 1, 2, 3""")
+    cur.execute("""INSERT INTO daily_orders (fecha, category, pedidos)
+        SELECT substr(o.created_at, 1, 10), '*', COUNT(DISTINCT o.id)
+        FROM orders o JOIN order_items oi ON o.id = oi.order_id JOIN products p ON oi.product_id = p.id
+        GROUP BY 1
+        UNION ALL
+        SELECT substr(o.created_at, 1, 10), COALESCE(p.category, ''), COUNT(DISTINCT o.id)
+        FROM orders o JOIN order_items oi ON o.id = oi.order_id JOIN products p ON oi.product_id = p.id
+        GROUP BY 1, 2""")
+
+
+@migration(4, "Precio y costo unitario congelados en order_items")
+def _order_item_prices(cur):
+    if not has_column(cur, "order_items", "unit_price"):
+        cur.execute("ALTER TABLE order_items ADD COLUMN unit_price INTEGER")
+    if not has_column(cur, "order_items", "unit_cost"):
+        cur.execute("ALTER TABLE order_items ADD COLUMN unit_cost INTEGER")
+    # Las comandas antiguas se valorizan con el precio vigente del producto,
+    # que es lo que mostraban los reportes hasta ahora.
+    cur.execute("""UPDATE order_items
+                   SET unit_price = (SELECT price FROM products WHERE products.id = order_items.product_id),
+                       unit_cost = (SELECT cost FROM products WHERE products.id = order_items.product_id)
+                   WHERE unit_price IS NULL""")
+    # El índice del join incluye ahora los montos para cubrir los totales
+    cur.execute("DROP INDEX IF EXISTS idx_order_items_order")
+    cur.execute("""CREATE INDEX idx_order_items_order
+                   ON order_items (order_id, product_id, qty, unit_price, unit_cost)""")
+
+
+@migration(5, "Cola de impresión persistente (print_jobs)")
+def _print_jobs(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS print_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        next_attempt_at TEXT NOT NULL,
+        printed_at TEXT,
+        FOREIGN KEY(order_id) REFERENCES orders(id)
+    )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_print_jobs_status ON print_jobs (status, id)")
+
+
+@migration(6, "Total y cantidad de líneas precalculados en orders")
+def _order_totals(cur):
+    if not has_column(cur, "orders", "total"):
+        cur.execute("ALTER TABLE orders ADD COLUMN total INTEGER NOT NULL DEFAULT 0")
+    if not has_column(cur, "orders", "item_count"):
+        cur.execute("ALTER TABLE orders ADD COLUMN item_count INTEGER NOT NULL DEFAULT 0")
+    cur.execute("""UPDATE orders
+                   SET total = COALESCE((SELECT SUM(oi.unit_price * oi.qty) FROM order_items oi
+                                         WHERE oi.order_id = orders.id), 0),
+                       item_count = (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = orders.id)""")
+
+
+@migration(7, "Exportaciones en segundo plano (export_jobs)")
+def _export_jobs(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS export_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT NOT NULL,
+        formato TEXT NOT NULL,
+        params TEXT,
+        filename TEXT NOT NULL,
+        rows INTEGER,
+        size INTEGER,
+        error TEXT,
+        created_at TEXT NOT NULL,
+        started_at TEXT,
+        finished_at TEXT
+    )""")
+
+
+@migration(8, "Versión de datos para ETags y cachés (data_version)")
+def _data_version(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS data_version (
+        scope TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    )""")
+    cur.executemany("INSERT OR IGNORE INTO data_version (scope, version) VALUES (?, 0)",
+                    [("orders",), ("products",)])
+
+
+@migration(9, "Contadores en vivo del inicio (product_stats, customer_stats, stat_counters)")
+def _live_stats(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS product_stats (
+        product_id INTEGER PRIMARY KEY,
+        cantidad INTEGER NOT NULL DEFAULT 0,
+        pedidos INTEGER NOT NULL DEFAULT 0
+    )""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS customer_stats (
+        customer_name TEXT PRIMARY KEY,
+        pedidos INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL DEFAULT 0,
+        last_seen TEXT
+    ) WITHOUT ROWID""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_customer_stats_pedidos
+                   ON customer_stats (pedidos, total)""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS stat_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID""")
+    # Carga inicial desde la historia
+    cur.execute("DELETE FROM product_stats")
+    cur.execute("DELETE FROM customer_stats")
+    cur.execute("""INSERT INTO product_stats (product_id, cantidad, pedidos)
+        SELECT product_id, SUM(qty), COUNT(DISTINCT order_id) FROM order_items GROUP BY 1""")
+    cur.execute("""INSERT INTO customer_stats (customer_name, pedidos, total, last_seen)
+        SELECT customer_name, COUNT(*), COALESCE(SUM(total), 0), MAX(created_at)
+        FROM orders WHERE customer_name IS NOT NULL AND customer_name != ''
+        GROUP BY 1""")
+    cur.execute("""INSERT OR REPLACE INTO stat_counters (name, value)
+        SELECT 'customers', COUNT(*) FROM customer_stats""")
+
+
+@migration(10, "Clientes con clave normalizada (customers, orders.customer_id)")
+def _customers(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS customers (
+        id INTEGER PRIMARY KEY,
+        key TEXT NOT NULL UNIQUE,
+        name TEXT NOT NULL,
+        visits INTEGER NOT NULL DEFAULT 0,
+        spend INTEGER NOT NULL DEFAULT 0,
+        first_seen TEXT,
+        last_seen TEXT
+    )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customers_visits ON customers (visits, spend)")
+    if not has_column(cur, "orders", "customer_id"):
+        cur.execute("ALTER TABLE orders ADD COLUMN customer_id INTEGER REFERENCES customers(id)")
+    # Carga inicial: un cliente por clave normalizada, con el primer nombre usado
+    cur.execute("DELETE FROM customers")
+    found = {}
+    cur.execute("SELECT id, customer_name, total, created_at FROM orders ORDER BY id")
+    for order_id, name, total, created_at in cur.fetchall():
+        key = normalize(name)
+        if not key:
+            continue
+        customer = found.setdefault(key, {"name": display_name(name), "orders": [], "spend": 0,
+                                          "first": created_at, "last": created_at})
+        customer["orders"].append(order_id)
+        customer["spend"] += total or 0
+        customer["first"] = min(customer["first"], created_at)
+        customer["last"] = max(customer["last"], created_at)
+    updates = []
+    for key, customer in found.items():
+        cur.execute("""INSERT INTO customers (key, name, visits, spend, first_seen, last_seen)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (key, customer["name"], len(customer["orders"]), customer["spend"],
+                     customer["first"], customer["last"]))
+        updates.extend((cur.lastrowid, order_id) for order_id in customer["orders"])
+    cur.execute("UPDATE orders SET customer_id = NULL")
+    cur.executemany("UPDATE orders SET customer_id = ? WHERE id = ?", updates)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders (customer_id, created_at)")
+    # El índice por fecha cubre también customer_id para contar clientes distintos
+    cur.execute("DROP INDEX IF EXISTS idx_orders_created_at")
+    cur.execute("""CREATE INDEX idx_orders_created_at
+                   ON orders (created_at, id, customer_name, customer_id)""")
+    # customers reemplaza al conjunto de nombres de la versión 9
+    cur.execute("DROP TABLE IF EXISTS customer_stats")
+    cur.execute("""INSERT OR REPLACE INTO stat_counters (name, value)
+        SELECT 'customers', COUNT(*) FROM customers WHERE visits > 0""")
+    cur.execute("ANALYZE")
+
+
+@migration(11, "Eventos de comandas para la pantalla de cocina (kitchen_events)")
+def _kitchen_events(cur):
+    # Bitácora corta (kitchen.KEEP_EVENTS); el id es el id del evento SSE
+    cur.execute("""CREATE TABLE IF NOT EXISTS kitchen_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        order_id INTEGER NOT NULL,
+        payload TEXT NOT NULL
+    )""")
+
+
+@migration(12, "Categorías normalizadas (categories, products.category_id)")
+def _categories(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        created_at TEXT
+    )""")
+    if not has_column(cur, "products", "category_id"):
+        cur.execute("ALTER TABLE products ADD COLUMN category_id INTEGER REFERENCES categories(id)")
+    if has_column(cur, "products", "category"):
+        # Una categoría por cada texto distinto (ya en mayúsculas al guardarse)
+        now = datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+        cur.execute("""INSERT OR IGNORE INTO categories (name, created_at)
+                       SELECT DISTINCT TRIM(category), ? FROM products
+                       WHERE TRIM(COALESCE(category, '')) != ''""", (now,))
+        cur.execute("""UPDATE products SET category_id =
+                       (SELECT id FROM categories WHERE name = TRIM(products.category))""")
+        # DROP COLUMN existe desde SQLite 3.35; antes la columna queda sin uso
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            cur.execute("ALTER TABLE products DROP COLUMN category")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id, name)")
+    cur.execute("ANALYZE")
+
+
+@migration(13, "Archivo mensual de comandas (archive_partitions y resúmenes de lo archivado)")
+def _archive(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS archive_partitions (
+        month TEXT PRIMARY KEY,
+        file TEXT NOT NULL,
+        first_id INTEGER NOT NULL,
+        last_id INTEGER NOT NULL,
+        orders INTEGER NOT NULL,
+        items INTEGER NOT NULL,
+        archived_at TEXT
+    )""")
+    # Lo que aportan las comandas archivadas a product_stats y customers
+    cur.execute("""CREATE TABLE IF NOT EXISTS archived_product_stats (
+        month TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        cantidad INTEGER NOT NULL DEFAULT 0,
+        pedidos INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (month, product_id)
+    ) WITHOUT ROWID""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS archived_customer_stats (
+        month TEXT NOT NULL,
+        customer_id INTEGER NOT NULL,
+        visits INTEGER NOT NULL DEFAULT 0,
+        spend INTEGER NOT NULL DEFAULT 0,
+        first_seen TEXT,
+        last_seen TEXT,
+        PRIMARY KEY (month, customer_id)
+    ) WITHOUT ROWID""")
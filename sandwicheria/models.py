@@ -1,26 +0,0 @@
-class Category(db.Model):
-    __tablename__ = 'categories'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), unique=True, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    
-    # Relación con productos
-    products = db.relationship('Product', backref='category', lazy=True)
-    
-    def __repr__(self):
-        return f'<Category {self.name}>'
-
-class Product(db.Model):
-    __tablename__ = 'products'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
-    base_protein = db.Column(db.String(50))
-    price = db.Column(db.Integer, nullable=False)
-    cost = db.Column(db.Integer, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    
-    def __repr__(self):
-        return f'<Product {self.name}>'
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""Creación de comandas en lote.
+
+El formulario de /orders y el JSON de POST /api/orders se convierten una sola
+vez en un objeto Order; los productos se resuelven contra el catálogo en
+memoria (catalog_cache.Catalog.by_id) y todas las líneas se insertan con un único executemany
+dentro de una transacción explícita.
+"""
+import datetime
+from dataclasses import dataclass, field
+
+import customers
+import data_version
+import kitchen
+import live_stats
+import print_queue
+import rollup
+
+# Sandwiches en los que el cliente elige la proteína
+PROTEIN_SANDWICHES = ["A LO POBRE", "BARROS LUCO", "CHACARERO", "ITALIANO"]
+PROTEIN_OPTIONS = ["Churrasco", "Lomito", "Pollo"]
+
+
+class OrderError(ValueError):
+    """Comanda inválida; el mensaje se muestra tal cual al usuario."""
+
+
+@dataclass
+class OrderLine:
+    product_id: int
+    qty: int
+    note: str = ""
+    unit_price: int = None
+    unit_cost: int = None
+
+
+@dataclass
+class Order:
+    customer_name: str
+    lines: list = field(default_factory=list)
+    created_at: str = None
+
+    @property
+    def total(self):
+        return sum((line.unit_price or 0) * line.qty for line in self.lines)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def build_order(customer_name, raw_lines, catalog):
+    """Valida y arma la comanda.
+
+    raw_lines son tuplas (product_id, qty, note, protein); las de cantidad 0
+    se descartan. catalog es un mapa id -> fila de producto.
+    """
+    customer_name = (customer_name or "").strip()
+    if not customer_name:
+        raise OrderError("El nombre del cliente es obligatorio")
+    order = Order(customer_name)
+    for pid, qty, note, protein in raw_lines:
+        if qty <= 0:
+            continue
+        product = catalog.get(pid)
+        if product is None:
+            raise OrderError(f"Producto no encontrado: {pid}")
+        note = (note or "").strip()
+        protein = (protein or "").strip()
+        # Para los sandwiches con proteína a elección, la proteína va al inicio de la nota
+        if protein and product["name"] in PROTEIN_SANDWICHES:
+            note = f"{protein} - {note}" if note else protein
+        order.lines.append(OrderLine(pid, qty, note, product["price"], product["cost"]))
+    if not order.lines:
+        raise OrderError("Debes agregar al menos un producto a la comanda")
+    return order
+
+
+def parse_form(form, catalog):
+    """Convierte request.form (qty_<pid>, note_<pid>, protein_<pid>) en una Order."""
+    qtys, notes, proteins = {}, {}, {}
+    for key, val in form.items():
+        prefix, _, pid = key.partition("_")
+        if not pid.isdigit():
+            continue
+        if prefix == "qty":
+            qtys[int(pid)] = _to_int(val)
+        elif prefix == "note":
+            notes[int(pid)] = val
+        elif prefix == "protein":
+            proteins[int(pid)] = val
+    raw_lines = [(pid, qty, notes.get(pid, ""), proteins.get(pid, "")) for pid, qty in qtys.items()]
+    return build_order(form.get("customer_name", ""), raw_lines, catalog)
+
+
+def parse_json(data, catalog):
+    """Convierte el JSON de POST /api/orders en una Order.
+
+    Formato: {"customer_name": "...", "items": [{"product_id": 1, "qty": 2,
+    "note": "...", "protein": "Pollo"}, ...]}
+    """
+    if not isinstance(data, dict):
+        raise OrderError("Se esperaba un objeto JSON")
+    items = data.get("items") or []
+    if not isinstance(items, list):
+        raise OrderError("'items' debe ser una lista")
+    raw_lines = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise OrderError("Cada item debe ser un objeto")
+        raw_lines.append((_to_int(item.get("product_id")), _to_int(item.get("qty")),
+                          item.get("note", ""), item.get("protein", "")))
+    return build_order(data.get("customer_name", ""), raw_lines, catalog)
+
+
+def insert_order(db, order, print_job=False, customer_index=None):
+    """Guarda la comanda y sus líneas en una sola transacción. Devuelve el id.
+
+    Con print_job=True deja además el trabajo de impresión en la cola.
+    customer_index (customers.CustomerIndex) resuelve el cliente sin ir a la
+    base; sin él se crea uno temporal.
+    """
+    if order.created_at is None:
+        order.created_at = datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+    cur = db.cursor()
+    # IMMEDIATE toma el lock de escritura al inicio: sin upgrade a mitad de camino
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        customer_id = (customer_index or customers.CustomerIndex()).resolve(cur, order.customer_name)
+        # total e item_count quedan precalculados para el listado de comandas
+        cur.execute("""INSERT INTO orders (created_at, customer_name, customer_id, total, item_count)
+                       VALUES (?, ?, ?, ?, ?)""",
+                    (order.created_at, order.customer_name, customer_id, order.total, len(order.lines)))
+        order_id = cur.lastrowid
+        cur.executemany("""INSERT INTO order_items (order_id, product_id, qty, note, unit_price, unit_cost)
+                           VALUES (?, ?, ?, ?, ?, ?)""",
+                        [(order_id, line.product_id, line.qty, line.note, line.unit_price, line.unit_cost)
+                         for line in order.lines])
+        # Sumar la comanda al agregado diario en la misma transacción
+        rollup.apply_order(cur, order_id)
+        live_stats.apply_order(cur, order_id)
+        data_version.bump(cur, data_version.ORDERS)
+        kitchen.publish(cur, kitchen.CREATED, order_id)
+        if print_job:
+            print_queue.add_job(cur, order_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return order_id
@@ -0,0 +1,89 @@
+"""Listado paginado de comandas (/orders/list y GET /api/orders).
+
+La paginación es por cursor (keyset) sobre orders.id: cada página pide las
+comandas con id menor al último de la página anterior, así que la página
+1000 cuesta lo mismo que la primera (con OFFSET habría que saltarse todas
+las filas previas). El total y la cantidad de líneas de cada comanda son
+columnas precalculadas de orders (migración 6), sin join ni GROUP BY.
+
+Los meses archivados se leen después de la base en uso (archive.py): los ids
+crecen con la fecha, así que cada partición sigue el orden por id; sólo se
+abren las del rango de fechas con ids menores al cursor.
+"""
+import archive
+from report_filters import ReportFilters, FilterError
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class OrderPageQuery:
+    def __init__(self, filtros=None, cliente=None, cursor=None, limit=PAGE_SIZE):
+        self.filtros = filtros or ReportFilters()
+        self.cliente = cliente or None
+        self.cursor = cursor
+        self.limit = limit
+
+    @classmethod
+    def from_args(cls, args):
+        """Construye la consulta desde request.args (fecha_inicio, fecha_fin, cliente, cursor, limit)."""
+        cursor = args.get('cursor') or None
+        if cursor is not None:
+            if not cursor.isdigit():
+                raise FilterError(f"Cursor inválido: {cursor!r}")
+            cursor = int(cursor)
+        limit = args.get('limit') or PAGE_SIZE
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise FilterError(f"Límite inválido: {limit!r}")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise FilterError(f"El límite debe estar entre 1 y {MAX_PAGE_SIZE}")
+        return cls(ReportFilters.from_args(args), (args.get('cliente') or '').strip(), cursor, limit)
+
+    def args(self):
+        """Parámetros de filtro para armar la URL de la página siguiente."""
+        args = {}
+        if self.filtros.fecha_inicio:
+            args['fecha_inicio'] = self.filtros.fecha_inicio.isoformat()
+        if self.filtros.fecha_fin:
+            args['fecha_fin'] = self.filtros.fecha_fin.isoformat()
+        if self.cliente:
+            args['cliente'] = self.cliente
+        return args
+
+
+def _like_pattern(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def fetch_page(db, query):
+    """Devuelve (comandas, next_cursor); next_cursor es None en la última página."""
+    where, where_params = query.filtros.where(date_column="created_at", category_column=None)
+    rows = []
+    for source in archive.sources(db, query.filtros.desde, query.filtros.hasta):
+        if source != archive.MAIN and query.cursor is not None and source.first_id >= query.cursor:
+            continue
+        with archive.opened(db, source) as prefix:
+            sql = f"SELECT id, created_at, customer_name, total, item_count FROM {prefix}orders WHERE 1=1"
+            params = []
+            if query.cursor is not None:
+                sql += " AND id < ?"
+                params.append(query.cursor)
+            sql += where
+            params += where_params
+            if query.cliente:
+                # LIKE no distingue mayúsculas (ASCII) y busca en cualquier parte del nombre
+                sql += " AND customer_name LIKE ? ESCAPE '\\'"
+                params.append(_like_pattern(query.cliente))
+            # Una fila extra indica si hay página siguiente
+            sql += " ORDER BY id DESC LIMIT ?"
+            params.append(query.limit + 1 - len(rows))
+            rows += db.execute(sql, params).fetchall()
+        if len(rows) > query.limit:
+            break
+    if len(rows) > query.limit:
+        rows = rows[:query.limit]
+        return rows, rows[-1]["id"]
+    return rows, None
@@ -0,0 +1,327 @@
+"""Cola de impresión de comandas (spooler) para la impresora térmica.
+
+Cada comanda deja un trabajo en la tabla print_jobs dentro de la misma
+transacción que la crea. Un único hilo (PrintSpooler) toma los trabajos en
+orden de id, mantiene abierta la conexión con la impresora y reintenta con
+espera exponencial si algo falla. Un trabajo que agota sus intentos queda
+'failed' y la cola sigue con el siguiente.
+
+El ticket se arma con tickets.render_ticket como un solo buffer de bytes. La
+impresora es intercambiable (backend): USB con python-escpos, un archivo o un
+backend en memoria para pruebas. Cada backend indica con `escpos` si recibe
+los comandos ESC/POS o el texto plano del ticket.
+
+Si la comanda de un trabajo ya no existe (se borró o se archivó después de
+encolarla), el trabajo se descarta sin imprimir ni reintentar.
+
+Con varios procesos (gunicorn) sólo uno atiende la cola: el que toma el lock
+de lock_path. Los demás dejan los trabajos en la tabla y el dueño los
+encuentra en su siguiente sondeo.
+"""
+import collections
+import datetime
+import logging
+import os
+import threading
+
+import tickets
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso, no hace falta el lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+PRINTING = "printing"
+DONE = "done"
+FAILED = "failed"
+
+def _now():
+    return datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+
+
+def add_job(cur, order_id):
+    """Encola la impresión de una comanda (usar dentro de la transacción de la comanda)."""
+    now = _now()
+    cur.execute("""INSERT INTO print_jobs (order_id, status, attempts, created_at, updated_at, next_attempt_at)
+                   VALUES (?, ?, 0, ?, ?, ?)""", (order_id, PENDING, now, now, now))
+    return cur.lastrowid
+
+
+def remove_jobs(cur, order_id):
+    """Borra los trabajos de una comanda (usar en la transacción que la borra)."""
+    cur.execute("DELETE FROM print_jobs WHERE order_id = ?", (order_id,))
+
+
+# --- Backends ---
+
+class UsbPrinterBackend:
+    """Impresora térmica USB vía python-escpos; mantiene el handle abierto."""
+
+    escpos = True
+
+    def __init__(self, vendor_id, product_id, interface=0):
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.interface = interface
+        self._printer = None
+
+    def _open(self):
+        if self._printer is None:
+            from escpos.printer import Usb
+            self._printer = Usb(self.vendor_id, self.product_id, self.interface, timeout=0, profile=None)
+        return self._printer
+
+    def write(self, data):
+        # El buffer ya trae inicialización, estilos y corte: una sola escritura
+        self._open()._raw(data)
+
+    def close(self):
+        if self._printer is not None:
+            try:
+                self._printer.close()
+            except Exception:
+                pass
+            self._printer = None
+
+
+class FilePrinterBackend:
+    """Agrega los tickets a un archivo.
+
+    Por defecto en texto plano; con escpos=True escribe los bytes ESC/POS,
+    lo que sirve también para un dispositivo como /dev/usb/lp0.
+    """
+
+    def __init__(self, path, escpos=False):
+        self.path = path
+        self.escpos = escpos
+
+    def write(self, data):
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+class DummyPrinterBackend:
+    """Guarda los tickets (texto plano) en memoria; útil para pruebas."""
+
+    escpos = False
+
+    def __init__(self):
+        self.tickets = []
+
+    def write(self, data):
+        self.tickets.append(data.decode("utf-8"))
+
+    def close(self):
+        pass
+
+
+# --- Spooler ---
+
+class PrintSpooler:
+    def __init__(self, pool, backend_factory, max_attempts=5,
+                 base_delay=2.0, max_delay=60.0, poll_interval=5.0, lock_path=None):
+        self.pool = pool
+        self.backend_factory = backend_factory
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._lock_pid = None
+        self._backend = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=500)
+        self._counters = {"printed": 0, "failed": 0, "retries": 0, "discarded": 0}
+
+    # Control del hilo
+    def start(self):
+        """Arranca el hilo si no está corriendo (también después de un fork)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if not self._take_ownership():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="print-spooler", daemon=True)
+            self._thread.start()
+
+    def _take_ownership(self):
+        """True si este proceso atiende la cola (lock de lock_path tomado)."""
+        if self.lock_path is None or fcntl is None:
+            return True
+        if self._lock_file is not None and self._lock_pid == os.getpid():
+            return True
+        # lockf no pasa al hijo en un fork: cada worker lo pide para sí
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self._lock_pid = os.getpid()
+        return True
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._close_backend()
+
+    def notify(self):
+        """Despierta al hilo (hay un trabajo nuevo)."""
+        self.start()
+        self._wakeup.set()
+
+    def _recover(self):
+        # Trabajos que quedaron 'printing' por un corte se vuelven a intentar
+        with self.pool.writer() as db:
+            db.execute("UPDATE print_jobs SET status = ? WHERE status = ?", (PENDING, PRINTING))
+            db.commit()
+
+    def _run(self):
+        try:
+            self._recover()
+        except Exception as e:
+            logger.error(f"Error recuperando la cola de impresión: {e}")
+        while not self._stop.is_set():
+            try:
+                wait = self.process_next()
+            except Exception as e:
+                logger.error(f"Error en la cola de impresión: {e}")
+                wait = self.poll_interval
+            if wait:
+                self._wakeup.wait(wait)
+                self._wakeup.clear()
+
+    # Procesamiento
+    def _next_job(self):
+        with self.pool.reader() as db:
+            return db.execute("""SELECT * FROM print_jobs WHERE status IN (?, ?)
+                                 ORDER BY id LIMIT 1""", (PENDING, PRINTING)).fetchone()
+
+    def process_next(self):
+        """Procesa el trabajo más antiguo. Devuelve segundos a esperar (0 = seguir)."""
+        job = self._next_job()
+        if job is None:
+            return self.poll_interval
+        now = datetime.datetime.now()
+        next_attempt = datetime.datetime.fromisoformat(job["next_attempt_at"])
+        if next_attempt > now:
+            # Se respeta el orden: no se salta al siguiente mientras éste espera
+            return min((next_attempt - now).total_seconds(), self.poll_interval)
+        self._set_status(job["id"], PRINTING)
+        try:
+            if self._backend is None:
+                self._backend = self.backend_factory()
+            with self.pool.reader() as db:
+                data = tickets.render_ticket(db, job["order_id"], escpos=self._backend.escpos)
+            if data is not None:
+                self._backend.write(data)
+        except Exception as e:
+            self._close_backend()
+            self._fail(job, e)
+            return 0
+        if data is None:
+            self._discard(job)
+        else:
+            self._done(job)
+        return 0
+
+    def _set_status(self, job_id, status):
+        with self.pool.writer() as db:
+            db.execute("UPDATE print_jobs SET status = ?, updated_at = ? WHERE id = ?",
+                       (status, _now(), job_id))
+            db.commit()
+
+    def _done(self, job):
+        printed_at = datetime.datetime.now()
+        created = datetime.datetime.fromisoformat(job["created_at"])
+        with self.pool.writer() as db:
+            db.execute("""UPDATE print_jobs SET status = ?, attempts = attempts + 1, last_error = NULL,
+                              updated_at = ?, printed_at = ? WHERE id = ?""",
+                       (DONE, _now(), printed_at.isoformat(sep=' ', timespec='seconds'), job["id"]))
+            db.commit()
+        self._latencies.append((printed_at - created).total_seconds())
+        self._counters["printed"] += 1
+
+    def _discard(self, job):
+        # La comanda ya no está: no hay nada que imprimir ni reintentar
+        logger.warning(f"Comanda #{job['order_id']} ya no existe; se descarta su trabajo de impresión")
+        with self.pool.writer() as db:
+            db.execute("DELETE FROM print_jobs WHERE id = ?", (job["id"],))
+            db.commit()
+        self._counters["discarded"] += 1
+
+    def _fail(self, job, error):
+        attempts = job["attempts"] + 1
+        if attempts >= self.max_attempts:
+            status, delay = FAILED, 0
+            self._counters["failed"] += 1
+            logger.error(f"Comanda #{job['order_id']} no se pudo imprimir tras {attempts} intentos: {error}")
+        else:
+            status, delay = PENDING, min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+            self._counters["retries"] += 1
+            logger.warning(f"Error imprimiendo comanda #{job['order_id']} (intento {attempts}): {error}")
+        next_attempt = datetime.datetime.now() + datetime.timedelta(seconds=delay)
+        with self.pool.writer() as db:
+            db.execute("""UPDATE print_jobs SET status = ?, attempts = ?, last_error = ?,
+                              updated_at = ?, next_attempt_at = ? WHERE id = ?""",
+                       (status, attempts, str(error), _now(),
+                        next_attempt.isoformat(sep=' ', timespec='seconds'), job["id"]))
+            db.commit()
+
+    def _close_backend(self):
+        if self._backend is not None:
+            self._backend.close()
+            self._backend = None
+
+    def retry(self, job_id):
+        """Vuelve a poner en cola un trabajo fallido. Devuelve True si existía."""
+        with self.pool.writer() as db:
+            cur = db.execute("""UPDATE print_jobs SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ?
+                                WHERE id = ? AND status = ?""", (PENDING, _now(), _now(), job_id, FAILED))
+            db.commit()
+            found = cur.rowcount > 0
+        if found:
+            self.notify()
+        return found
+
+    # Métricas
+    def stats(self):
+        with self.pool.reader() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM print_jobs GROUP BY status").fetchall())
+            oldest = db.execute("SELECT MIN(created_at) FROM print_jobs WHERE status IN (?, ?)",
+                                (PENDING, PRINTING)).fetchone()[0]
+        latencies = sorted(self._latencies)
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 3)
+
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "owner_pid": self._lock_pid if self._lock_file is not None else None,
+            "queue_depth": counts.get(PENDING, 0) + counts.get(PRINTING, 0),
+            "failed_jobs": counts.get(FAILED, 0),
+            "oldest_pending": oldest,
+            "printed": self._counters["printed"],
+            "failed": self._counters["failed"],
+            "retries": self._counters["retries"],
+            "discarded": self._counters["discarded"],
+            "latency_p50_s": percentile(0.5),
+            "latency_p95_s": percentile(0.95),
+            "latency_max_s": round(latencies[-1], 3) if latencies else None,
+        }
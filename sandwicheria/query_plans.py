@@ -0,0 +1,192 @@
+"""Revisión de planes de ejecución (EXPLAIN QUERY PLAN) de las consultas SQL.
+
+Sirve para detectar consultas de reportes que recorren completas las tablas
+de hechos (orders, order_items) en vez de usar un índice.
+
+QueryAnalyzer es el modo de análisis: registra cada forma distinta de
+sentencia que se ejecuta (los reportes arman el SQL con fragmentos
+opcionales, así que cada combinación de filtros es una forma distinta), con
+cuántas veces corrió y cuánto tardó, y al pedir el informe captura su plan y
+marca recorridos completos y B-trees temporales de GROUP BY/ORDER BY.
+"""
+import re
+import threading
+
+# Tablas que crecen con cada comanda; un SCAN sobre ellas es un problema.
+# products es chica y se puede recorrer sin drama.
+FACT_TABLES = ("orders", "order_items")
+
+
+def explain(db, sql, params=()):
+    """Devuelve las líneas del plan (campo detail) de una consulta."""
+    cur = db.cursor()
+    cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+    return [row[3] for row in cur.fetchall()]
+
+
+def table_aliases(sql):
+    """Mapa alias -> tabla para las tablas de hechos nombradas en la consulta."""
+    aliases = {}
+    tokens = sql.replace(",", " ").replace("(", " ").replace(")", " ").split()
+    for i, token in enumerate(tokens):
+        if token.lower() in FACT_TABLES:
+            aliases[token.lower()] = token.lower()
+            if i + 1 < len(tokens):
+                nxt = tokens[i + 1]
+                if nxt.lower() == "as" and i + 2 < len(tokens):
+                    nxt = tokens[i + 2]
+                if nxt.isidentifier():
+                    aliases[nxt] = token.lower()
+    return aliases
+
+
+def full_scans(plan, sql):
+    """Líneas del plan que recorren completa una tabla de hechos.
+
+    Cuenta también el recorrido completo de un índice (SCAN ... USING
+    COVERING INDEX): con un filtro de fechas se espera un SEARCH por rango.
+    """
+    aliases = table_aliases(sql)
+    problems = []
+    for detail in plan:
+        parts = detail.split()
+        if len(parts) < 2 or parts[0] != "SCAN":
+            continue
+        if parts[1] in aliases:
+            problems.append(detail)
+    return problems
+
+
+def temp_btrees(plan):
+    """Líneas del plan que ordenan en un B-tree temporal (GROUP BY, ORDER BY, DISTINCT)."""
+    return [detail for detail in plan if "USE TEMP B-TREE" in detail]
+
+
+def plan_flags(plan, sql):
+    """Problemas del plan: recorridos de tablas de hechos y B-trees temporales."""
+    return [" ".join(detail.split()[:2]) for detail in full_scans(plan, sql)] + temp_btrees(plan)
+
+
+# Sentencias cuyo plan interesa (las demás no leen filas: PRAGMA, BEGIN, INSERT ... VALUES)
+_ANALYZED = re.compile(r"\s*(?:SELECT|WITH|UPDATE|DELETE)\b", re.IGNORECASE)
+# IN (?, ?, ?) con cualquier cantidad de parámetros es la misma forma
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def statement_shape(sql):
+    """Forma de la sentencia: espacios colapsados y listas IN (?, ...) unificadas."""
+    return _IN_LIST.sub("(?, ...)", " ".join(sql.split()))
+
+
+class QueryShape:
+    """Una forma de sentencia: tiempos acumulados, un ejemplo y su plan."""
+
+    def __init__(self, shape, sql, params):
+        self.shape = shape
+        self.sql = sql  # ejemplo, con los parámetros con que se explica
+        self.params = params
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.plan = None  # se captura en analyze()
+        self.flags = []
+        self.error = None
+
+    def as_dict(self):
+        return {
+            "sql": self.shape,
+            "count": self.count,
+            "total_ms": round(self.seconds * 1000, 3),
+            "avg_ms": round(self.seconds * 1000 / self.count, 3) if self.count else 0,
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "rows": self.rows,
+            "plan": self.plan or [],
+            "flags": self.flags,
+            "error": self.error,
+        }
+
+
+class QueryAnalyzer:
+    """Formas de sentencia vistas en este proceso, con sus planes.
+
+    record() se llama por cada sentencia terminada (metrics.query_observer)
+    y sólo acumula; EXPLAIN QUERY PLAN se ejecuta una vez por forma, en
+    analyze(), fuera de los requests.
+    """
+
+    def __init__(self, max_shapes=500):
+        self.max_shapes = max_shapes
+        self._shapes = {}  # forma -> QueryShape
+        self._keys = {}    # texto exacto -> forma (se calcula una sola vez)
+        self._lock = threading.Lock()
+        self.dropped = 0   # sentencias de formas nuevas con el máximo alcanzado
+
+    def record(self, sql, params, seconds, rows):
+        key = self._keys.get(sql)
+        if key is None:
+            if not _ANALYZED.match(sql):
+                return
+            key = statement_shape(sql)
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is None:
+                if len(self._shapes) >= self.max_shapes:
+                    self.dropped += 1
+                    return
+                # executemany entrega un iterador ya consumido: se explica con NULLs
+                sample = params if isinstance(params, (tuple, list, dict)) else None
+                entry = self._shapes[key] = QueryShape(key, sql, sample)
+            if len(self._keys) < self.max_shapes * 4:
+                self._keys[sql] = key
+            entry.count += 1
+            entry.seconds += seconds
+            entry.rows += rows
+            if seconds > entry.max_seconds:
+                entry.max_seconds = seconds
+
+    def analyze(self, db):
+        """Captura el plan de las formas que aún no lo tienen."""
+        with self._lock:
+            pending = [entry for entry in self._shapes.values() if entry.plan is None]
+        for entry in pending:
+            params = entry.params
+            if params is None:
+                params = [None] * entry.sql.count("?")
+            try:
+                entry.plan = explain(db, entry.sql, params)
+            except Exception as e:  # p. ej. una tabla temporal de otra conexión
+                entry.plan, entry.error = [], str(e)
+            entry.flags = plan_flags(entry.plan, entry.sql)
+
+    def report(self, limit=None):
+        """Formas de peor a mejor: primero las marcadas, luego por tiempo total."""
+        with self._lock:
+            entries = list(self._shapes.values())
+        entries.sort(key=lambda e: (bool(e.flags), e.seconds), reverse=True)
+        return [entry.as_dict() for entry in entries[:limit]]
+
+    def clear(self):
+        with self._lock:
+            self._shapes.clear()
+            self._keys.clear()
+            self.dropped = 0
+
+    def stats(self):
+        with self._lock:
+            flagged = sum(1 for e in self._shapes.values() if e.flags)
+            return {"shapes": len(self._shapes), "flagged": flagged, "dropped": self.dropped}
+
+
+def regressions(report, baseline):
+    """Marcas de report que no están en baseline ({forma: [marcas]}).
+
+    Devuelve [(forma, marcas nuevas)]; las formas que no estaban en la base
+    de comparación cuentan con todas sus marcas.
+    """
+    found = []
+    for entry in report:
+        new = [flag for flag in entry["flags"] if flag not in baseline.get(entry["sql"], [])]
+        if new:
+            found.append((entry["sql"], new))
+    return found
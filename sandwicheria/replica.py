@@ -0,0 +1,365 @@
+"""Copia de solo lectura de la base para los reportes (réplica).
+
+Los reportes de /api/* hacen joins y agregados largos. En modo WAL un lector
+no bloquea al escritor, pero compite con las comandas por disco y caché y,
+mientras dura, no deja que el checkpoint vacíe el WAL. Con ReportReplica los
+reportes leen de un snapshot de la base y la base principal queda para las
+comandas.
+
+Un hilo renueva el snapshot con la API de backup de SQLite: abre una
+transacción de lectura en la base principal y copia de a step_pages páginas,
+con una pausa corta entre pasos. Las comandas se siguen confirmando durante
+la copia (WAL); como la transacción de lectura fija la foto, la copia no
+vuelve a empezar con cada escritura. Sólo se copia si cambió data_version, y
+a lo más una vez cada refresh_seconds; un cambio de esquema (migraciones) se
+copia enseguida, y un snapshot con otro esquema que la base no se lee.
+
+Cada snapshot es un archivo nuevo (snapshot-<ms>.db en folder) que no se
+vuelve a modificar: se abre con immutable=1, sin locks, y quien lo tenga
+abierto sigue leyéndolo aunque ya exista uno más nuevo. La antigüedad de un
+snapshot es el tiempo desde la última vez que se comprobó igual a la base
+principal (misma data_version) y se guarda como fecha de modificación del
+archivo. Si pasa de max_staleness, acquire() devuelve None y los reportes
+leen la base principal hasta que haya un snapshot nuevo. Al volver de la
+base principal al snapshot, los datos pueden retroceder a los del snapshot
+(siempre dentro de max_staleness) y la caché de reportes no guarda nada
+hasta que un snapshot pase la versión que ya se había leído.
+
+Con varios procesos (gunicorn) sólo uno renueva la copia: el que toma el lock
+de lock_path. Todos leen el snapshot más nuevo de la carpeta.
+"""
+import collections
+import logging
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+import data_version
+from db_pool import ConnectionPool
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso, no hace falta el lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = "snapshot-"
+SNAPSHOT_SUFFIX = ".db"
+SCAN_SECONDS = 1.0  # cada cuánto se busca un snapshot más nuevo en la carpeta
+
+# Lectura en curso de un snapshot: se devuelve con release()
+Lease = collections.namedtuple("Lease", "snapshot conn age")
+
+
+def _uri(path):
+    return "file:" + urllib.request.pathname2url(os.path.abspath(path)) + "?mode=ro&immutable=1"
+
+
+def source_version(db):
+    """(orders, products, esquema): si no cambia, un snapshot sigue igual a la base."""
+    return data_version.current(db) + (db.execute("PRAGMA schema_version").fetchone()[0],)
+
+
+def snapshot_version(path):
+    """source_version de la base cuando se copió el snapshot de path."""
+    conn = sqlite3.connect(_uri(path), uri=True)
+    try:
+        return tuple(conn.execute("""SELECT orders_version, products_version, schema_version
+                                     FROM replica_info""").fetchone())
+    finally:
+        conn.close()
+
+
+class Snapshot:
+    """Un archivo de snapshot y el pool de conexiones de este proceso."""
+
+    def __init__(self, path, readers, connection_factory):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.version = snapshot_version(path)
+        self.pool = ConnectionPool(_uri(path), readers=readers, connection_factory=connection_factory, uri=True)
+
+    def age(self):
+        """Segundos desde que se comprobó igual a la base principal (None si ya no existe)."""
+        try:
+            return max(0.0, time.time() - os.stat(self.path).st_mtime)
+        except OSError:
+            return None
+
+
+def source_path(db):
+    """Archivo de la base principal de db; si db es un snapshot, el de origen."""
+    row = db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'replica_info'").fetchone()
+    if row is not None:
+        return db.execute("SELECT source FROM replica_info").fetchone()[0]
+    for row in db.execute("PRAGMA database_list"):
+        if row[1] == "main":
+            return row[2] or None
+    return None
+
+
+class ReportReplica:
+    def __init__(self, pool, folder, max_staleness=120.0, refresh_seconds=30.0,
+                 check_seconds=5.0, step_pages=256, step_pause=0.005, readers=4,
+                 lock_path=None, connection_factory=sqlite3.Connection):
+        self.pool = pool
+        self.folder = folder
+        self.max_staleness = max_staleness
+        self.refresh_seconds = refresh_seconds
+        self.check_seconds = check_seconds
+        self.step_pages = step_pages
+        self.step_pause = step_pause
+        self.readers = readers
+        self.lock_path = lock_path
+        self.connection_factory = connection_factory
+        self._reset()
+
+    def _reset(self):
+        # También después de un fork: el hilo y el lock del padre no pasan al hijo
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+        self._owner_checked_at = None
+        self._snapshot = None
+        self._scanned_at = None
+        self._versions = {}  # nombre de snapshot -> source_version que copió
+        self._counters = {"refreshes": 0, "replica_reads": 0, "primary_reads": 0,
+                          "stale_reads": 0, "last_copy_seconds": None, "last_copy_pages": None}
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    # --- Hilo que renueva la copia ---
+
+    def start(self):
+        """Arranca el hilo si este proceso toma el lock (reintenta cada check_seconds)."""
+        self._check_pid()
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            now = time.monotonic()
+            if self._owner_checked_at is not None and now - self._owner_checked_at < self.check_seconds:
+                return
+            self._owner_checked_at = now
+            if not self._take_ownership():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="report-replica", daemon=True)
+            self._thread.start()
+
+    def _take_ownership(self):
+        """True si este proceso renueva la copia (lock de lock_path tomado)."""
+        if self.lock_path is None or fcntl is None:
+            return True
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        for name in self._files(SNAPSHOT_SUFFIX + ".tmp"):
+            self._remove(name)  # copias a medias de un corte
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error renovando la réplica de reportes: {e}")
+            self._stop.wait(self.check_seconds)
+
+    def refresh(self, force=False):
+        """Copia un snapshot nuevo si la base cambió. Devuelve True si copió.
+
+        Si no cambió, el snapshot vigente queda comprobado a esta hora. Con
+        cambios se espera a que el vigente tenga refresh_seconds (force=True
+        copia igual).
+        """
+        checked = time.time()
+        with self.pool.reader() as db:
+            version = source_version(db)
+        names = self._files(SNAPSHOT_SUFFIX)
+        if names:
+            latest = names[-1]
+            path = os.path.join(self.folder, latest)
+            copied = self._version(latest)
+            if copied == version:
+                os.utime(path, (checked, checked))
+                return False
+            same_schema = copied[2] == version[2]
+            if same_schema and not force and checked - _taken_at(latest) < self.refresh_seconds:
+                return False
+        self.copy()
+        return True
+
+    def copy(self):
+        """Copia la base principal a un snapshot nuevo y borra los anteriores."""
+        os.makedirs(self.folder, exist_ok=True)
+        started = time.perf_counter()
+        pages = []
+        source = sqlite3.connect(self.pool.path, timeout=self.pool.busy_timeout_ms / 1000.0)
+        try:
+            source.execute("PRAGMA query_only = ON")
+            source.execute("BEGIN")
+            taken_at = time.time()
+            # La primera lectura abre la transacción: desde aquí la foto queda fija
+            version = source_version(source)
+            name = f"{SNAPSHOT_PREFIX}{int(taken_at * 1000)}{SNAPSHOT_SUFFIX}"
+            path = os.path.join(self.folder, name)
+            target = sqlite3.connect(path + ".tmp")
+            try:
+                source.backup(target, pages=self.step_pages,
+                              progress=lambda status, remaining, total: self._pause(pages, total))
+                target.execute("PRAGMA journal_mode = DELETE")
+                target.execute("""CREATE TABLE replica_info (source TEXT NOT NULL, taken_at REAL NOT NULL,
+                                  orders_version INTEGER NOT NULL, products_version INTEGER NOT NULL,
+                                  schema_version INTEGER NOT NULL)""")
+                target.execute("INSERT INTO replica_info VALUES (?, ?, ?, ?, ?)",
+                               (os.path.abspath(self.pool.path), taken_at) + version)
+                target.commit()
+            finally:
+                target.close()
+        finally:
+            source.close()
+        os.replace(path + ".tmp", path)
+        os.utime(path, (taken_at, taken_at))
+        self._versions = {name: version}
+        for old in self._files(SNAPSHOT_SUFFIX):
+            if old != name:
+                # En Windows un archivo abierto no se puede borrar: queda para la próxima
+                self._remove(old)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._counters["refreshes"] += 1
+            self._counters["last_copy_seconds"] = round(elapsed, 3)
+            self._counters["last_copy_pages"] = pages[0] if pages else None
+        logger.info(f"Réplica de reportes renovada: {name} ({elapsed:.2f} s)")
+        return path
+
+    def _pause(self, pages, total):
+        # Entre pasos del backup se cede el disco y el GIL a los requests
+        pages[:] = [total]
+        time.sleep(self.step_pause)
+
+    def _version(self, name):
+        version = self._versions.get(name)
+        if version is None:
+            version = self._versions[name] = snapshot_version(os.path.join(self.folder, name))
+        return version
+
+    def _files(self, suffix):
+        """Nombres de snapshot en la carpeta con ese sufijo, del más viejo al más nuevo."""
+        try:
+            names = os.listdir(self.folder)
+        except FileNotFoundError:
+            return []
+        names = [n for n in names if n.startswith(SNAPSHOT_PREFIX) and n.endswith(suffix)
+                 and n[len(SNAPSHOT_PREFIX):-len(suffix)].isdigit()]
+        return sorted(names, key=lambda n: int(n[len(SNAPSHOT_PREFIX):-len(suffix)]))
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.folder, name))
+        except OSError:
+            pass
+
+    # --- Lectura ---
+
+    def _current(self):
+        """Snapshot más nuevo de la carpeta (se busca a lo más cada SCAN_SECONDS)."""
+        with self._lock:
+            now = time.monotonic()
+            if self._scanned_at is None or now - self._scanned_at >= SCAN_SECONDS:
+                self._scanned_at = now
+                names = self._files(SNAPSHOT_SUFFIX)
+                if names and (self._snapshot is None or self._snapshot.name != names[-1]):
+                    if self._snapshot is not None:
+                        self._snapshot.pool.close_all()
+                    try:
+                        self._snapshot = Snapshot(os.path.join(self.folder, names[-1]),
+                                                  self.readers, self.connection_factory)
+                    except sqlite3.Error:
+                        self._snapshot = None  # borrado justo ahora: ya hay uno más nuevo
+                        self._scanned_at = None
+                        return None
+                    with self.pool.reader() as db:
+                        schema = db.execute("PRAGMA schema_version").fetchone()[0]
+                    if self._snapshot.version[2] != schema:
+                        # Copiado antes de una migración: se espera el siguiente
+                        self._snapshot = None
+            return self._snapshot
+
+    def acquire(self):
+        """Lectura del snapshot vigente como Lease, o None si no hay uno dentro de max_staleness."""
+        self.start()
+        snapshot = self._current()
+        age = snapshot.age() if snapshot is not None else None
+        if snapshot is not None and age is None:
+            # El dueño lo borró porque ya copió otro: buscarlo ahora
+            with self._lock:
+                self._scanned_at = None
+            snapshot = self._current()
+            age = snapshot.age() if snapshot is not None else None
+        if age is None or age > self.max_staleness:
+            with self._lock:
+                self._counters["primary_reads"] += 1
+                if age is not None:
+                    self._counters["stale_reads"] += 1
+            return None
+        conn = snapshot.pool.acquire_reader()
+        with self._lock:
+            self._counters["replica_reads"] += 1
+        return Lease(snapshot, conn, age)
+
+    def release(self, lease):
+        # Siempre a su pool, aunque ya haya un snapshot más nuevo: puede haber
+        # un request esperando conexión de ese pool. El pool de un snapshot
+        # viejo (y sus conexiones) se libera cuando nadie lo referencia.
+        lease.snapshot.pool.release_reader(lease.conn)
+
+    @contextmanager
+    def reader(self):
+        """Conexión del snapshot vigente o, si no hay uno dentro de max_staleness, de la base principal."""
+        lease = self.acquire()
+        if lease is None:
+            with self.pool.reader() as conn:
+                yield conn
+            return
+        try:
+            yield lease.conn
+        finally:
+            self.release(lease)
+
+    def stats(self):
+        snapshot = self._current()
+        age = snapshot.age() if snapshot is not None else None
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "snapshot": snapshot.name if snapshot is not None else None,
+                "age_seconds": round(age, 1) if age is not None else None,
+                "max_staleness_seconds": self.max_staleness,
+                "refresh_seconds": self.refresh_seconds,
+                **self._counters,
+            }
+
+
+def _taken_at(name):
+    """Hora (epoch) en que se tomó el snapshot name."""
+    return int(name[len(SNAPSHOT_PREFIX):-len(SNAPSHOT_SUFFIX)]) / 1000.0
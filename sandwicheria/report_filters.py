@@ -0,0 +1,76 @@
+"""Filtros compartidos de los endpoints de reportes (/api/*).
+
+Convierte fecha_inicio / fecha_fin / categoria en predicados SQL sobre la
+columna sin envolver (created_at >= inicio AND created_at < fin + 1 día), de
+modo que SQLite pueda usar el índice de orders.created_at en vez de evaluar
+DATE(created_at) fila por fila.
+"""
+import datetime
+
+
+class FilterError(ValueError):
+    """Parámetro de filtro inválido (se responde con 400)."""
+
+
+def parse_date(value, name):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise FilterError(f"Fecha inválida en '{name}': {value!r} (formato AAAA-MM-DD)")
+
+
+class ReportFilters:
+    def __init__(self, fecha_inicio=None, fecha_fin=None, categoria=None):
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self.categoria = categoria or None
+        if fecha_inicio and fecha_fin and fecha_fin < fecha_inicio:
+            raise FilterError("fecha_fin no puede ser anterior a fecha_inicio")
+
+    @classmethod
+    def from_args(cls, args):
+        """Construye los filtros a partir de request.args."""
+        fecha_inicio = args.get('fecha_inicio')
+        fecha_fin = args.get('fecha_fin')
+        return cls(
+            parse_date(fecha_inicio, 'fecha_inicio') if fecha_inicio else None,
+            parse_date(fecha_fin, 'fecha_fin') if fecha_fin else None,
+            (args.get('categoria') or '').strip() or None,
+        )
+
+    @property
+    def desde(self):
+        """Límite inferior inclusivo ('AAAA-MM-DD') o None."""
+        return self.fecha_inicio.isoformat() if self.fecha_inicio else None
+
+    @property
+    def hasta(self):
+        """Límite superior exclusivo: el día siguiente a fecha_fin."""
+        if not self.fecha_fin:
+            return None
+        return (self.fecha_fin + datetime.timedelta(days=1)).isoformat()
+
+    def where(self, date_column="o.created_at", category_column="p.category_id"):
+        """Devuelve (sql, params) con los predicados, cada uno precedido de AND.
+
+        date_column puede ser un texto 'AAAA-MM-DD HH:MM:SS' o una clave de
+        día 'AAAA-MM-DD'; el rango semiabierto sirve para ambos.
+        category_column puede ser un id de categoría (termina en category_id:
+        se compara con el id del nombre pedido, resuelto una sola vez) o el
+        nombre guardado en los agregados.
+        """
+        sql = ""
+        params = []
+        if self.desde:
+            sql += f" AND {date_column} >= ?"
+            params.append(self.desde)
+        if self.hasta:
+            sql += f" AND {date_column} < ?"
+            params.append(self.hasta)
+        if self.categoria and category_column:
+            if category_column.endswith("category_id"):
+                sql += f" AND {category_column} = (SELECT id FROM categories WHERE name = ?)"
+            else:
+                sql += f" AND {category_column} = ?"
+            params.append(self.categoria)
+        return sql, params
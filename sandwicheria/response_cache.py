@@ -0,0 +1,103 @@
+"""Caché en memoria de las respuestas de reportes.
+
+Los datos de /api/metricas, /api/ventas-por-* y /api/dashboard sólo cambian
+cuando se escribe una comanda o un producto, pero /reports queda abierto y
+se refresca todo el rato. Cada respuesta se guarda ya serializada, con clave
+(ruta, filtros) y la versión de datos (data_version.current) con la que se
+calculó.
+
+Las versiones sólo crecen: cuando llega una más nueva, todo lo guardado con
+la anterior ya no puede volver a pedirse y se descarta de una vez. Además la
+caché tiene un tope de entradas y de bytes y saca primero lo menos usado.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024  # 16 MB
+
+
+def request_key(path, args):
+    """Clave de un request: la ruta y los parámetros ordenados."""
+    return path, tuple(sorted(args.items(multi=True)))
+
+
+def make_etag(key, version):
+    """ETag de la respuesta para key con los datos en version."""
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+    return "v{}-{}".format(".".join(str(v) for v in version), digest)
+
+
+class CachedResponse:
+    __slots__ = ("body", "mimetype", "etag")
+
+    def __init__(self, body, mimetype, etag):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+
+
+class ResponseCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        """Respuesta guardada para key en version, o None."""
+        with self._lock:
+            entry = self._entries.get(key) if version == self._version else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, body, mimetype, etag):
+        with self._lock:
+            if self._version is not None and version < self._version:
+                return  # calculada con datos que ya cambiaron
+            if version != self._version:
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+            if len(body) > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._entries[key] = CachedResponse(body, mimetype, etag)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": list(self._version) if self._version else None,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,180 @@
+"""Agregado diario de ventas (daily_sales) para el dashboard de reportes.
+
+daily_sales guarda, por día, categoría y producto, la cantidad vendida, las
+ventas y los costos. daily_orders guarda cuántas comandas hubo por día y
+categoría (ALL_CATEGORIES = todas), porque el número de comandas distintas
+no se puede sumar desde las filas por producto. La categoría va por nombre
+(no por categories.id), así los reportes filtran sin JOIN; renombrar una
+categoría actualiza esas filas (category_renamed).
+
+Los días de meses archivados (archive.py) quedan congelados: sus comandas ya
+no están en orders, así que rebuild(), check_consistency() y los cambios de
+categoría de un producto sólo tocan los días de meses no archivados.
+
+Las escrituras de comandas y productos actualizan el agregado dentro de la
+misma transacción; rebuild() lo recalcula completo y check_consistency() lo
+compara contra un recálculo desde las tablas originales.
+"""
+
+ALL_CATEGORIES = "*"
+
+# Días cuyas comandas siguen en la base en uso
+_HOT_DAY = "substr({column}, 1, 7) NOT IN (SELECT month FROM archive_partitions)"
+
+# Agregado "desde cero" a partir de las tablas de hechos
+_SALES_SELECT = """
+    SELECT substr(o.created_at, 1, 10) AS fecha,
+           COALESCE(c.name, '') AS category,
+           oi.product_id AS product_id,
+           SUM(oi.qty) AS cantidad,
+           COALESCE(SUM(oi.unit_price * oi.qty), 0) AS ventas,
+           COALESCE(SUM(oi.unit_cost * oi.qty), 0) AS costos
+    FROM orders o
+    JOIN order_items oi ON o.id = oi.order_id
+    JOIN products p ON oi.product_id = p.id
+    LEFT JOIN categories c ON c.id = p.category_id
+"""
+
+_ORDERS_SELECT = """
+    SELECT substr(o.created_at, 1, 10) AS fecha, ? AS category, COUNT(DISTINCT o.id) AS pedidos
+    FROM orders o
+    JOIN order_items oi ON o.id = oi.order_id
+    JOIN products p ON oi.product_id = p.id
+    {where}
+    GROUP BY 1
+    UNION ALL
+    SELECT substr(o.created_at, 1, 10), COALESCE(c.name, ''), COUNT(DISTINCT o.id)
+    FROM orders o
+    JOIN order_items oi ON o.id = oi.order_id
+    JOIN products p ON oi.product_id = p.id
+    LEFT JOIN categories c ON c.id = p.category_id
+    {where}
+    GROUP BY 1, 2
+"""
+
+
+def apply_order(cur, order_id, sign=1):
+    """Suma (sign=1) o resta (sign=-1) una comanda al agregado.
+
+    Para restar se debe llamar antes de borrar sus order_items.
+    """
+    cur.execute(f"""
+        INSERT INTO daily_sales (fecha, category, product_id, cantidad, ventas, costos)
+        SELECT fecha, category, product_id, ? * cantidad, ? * ventas, ? * costos
+        FROM ({_SALES_SELECT} WHERE o.id = ? GROUP BY 1, 2, 3)
+        WHERE true
+        ON CONFLICT (fecha, category, product_id) DO UPDATE SET
+            cantidad = cantidad + excluded.cantidad,
+            ventas = ventas + excluded.ventas,
+            costos = costos + excluded.costos
+    """, (sign, sign, sign, order_id))
+    where = "WHERE o.id = ?"
+    cur.execute(f"""
+        INSERT INTO daily_orders (fecha, category, pedidos)
+        SELECT fecha, category, ? * pedidos
+        FROM ({_ORDERS_SELECT.format(where=where)})
+        WHERE true
+        ON CONFLICT (fecha, category) DO UPDATE SET
+            pedidos = pedidos + excluded.pedidos
+    """, (sign, ALL_CATEGORIES, order_id, order_id))
+    if sign < 0:
+        _drop_empty(cur, order_id)
+
+
+def _drop_empty(cur, order_id):
+    """Borra las filas que quedaron en cero, sólo entre las que tocó la comanda.
+
+    Se buscan por clave primaria con las mismas consultas del upsert, así el
+    costo no crece con la historia.
+    """
+    cur.execute(f"""
+        DELETE FROM daily_sales
+        WHERE (fecha, category, product_id) IN (
+            SELECT fecha, category, product_id
+            FROM ({_SALES_SELECT} WHERE o.id = ? GROUP BY 1, 2, 3))
+          AND cantidad = 0
+    """, (order_id,))
+    cur.execute(f"""
+        DELETE FROM daily_orders
+        WHERE (fecha, category) IN (
+            SELECT fecha, category FROM ({_ORDERS_SELECT.format(where="WHERE o.id = ?")}))
+          AND pedidos = 0
+    """, (ALL_CATEGORIES, order_id, order_id))
+
+
+def product_changed(cur, product_id):
+    """Actualiza las filas de un producto tras editarlo.
+
+    Ventas y costos usan el precio congelado en cada order_item, así que un
+    cambio de precio no toca la historia; sólo importa el cambio de categoría.
+    """
+    cur.execute("""SELECT COALESCE(c.name, '') AS category
+                   FROM products p LEFT JOIN categories c ON c.id = p.category_id
+                   WHERE p.id = ?""", (product_id,))
+    product = cur.fetchone()
+    if product is None:
+        return
+    hot = _HOT_DAY.format(column="fecha")
+    cur.execute(f"SELECT DISTINCT category FROM daily_sales WHERE product_id = ? AND {hot}", (product_id,))
+    category_changed = any(row[0] != product[0] for row in cur.fetchall())
+    if category_changed:
+        cur.execute(f"UPDATE daily_sales SET category = ? WHERE product_id = ? AND {hot}",
+                    (product[0], product_id))
+        # El conteo de comandas por categoría de esos días ya no cuadra
+        cur.execute(f"SELECT DISTINCT fecha FROM daily_sales WHERE product_id = ? AND {hot}", (product_id,))
+        refresh_order_counts(cur, [row[0] for row in cur.fetchall()])
+
+
+def category_renamed(cur, old_name, new_name):
+    """Renombra una categoría en el agregado (las filas van por nombre)."""
+    cur.execute("UPDATE daily_sales SET category = ? WHERE category = ?", (new_name, old_name))
+    cur.execute("UPDATE daily_orders SET category = ? WHERE category = ?", (new_name, old_name))
+
+
+def refresh_order_counts(cur, fechas):
+    """Recalcula daily_orders para los días indicados."""
+    for fecha in fechas:
+        cur.execute("DELETE FROM daily_orders WHERE fecha = ?", (fecha,))
+        where = "WHERE o.created_at >= ? AND o.created_at < date(?, '+1 day')"
+        cur.execute(f"INSERT INTO daily_orders (fecha, category, pedidos) {_ORDERS_SELECT.format(where=where)}",
+                    (ALL_CATEGORIES, fecha, fecha, fecha, fecha))
+
+
+def rebuild(db):
+    """Recalcula el agregado desde orders/order_items/products (días no archivados)."""
+    cur = db.cursor()
+    cur.execute(f"DELETE FROM daily_sales WHERE {_HOT_DAY.format(column='fecha')}")
+    cur.execute(f"DELETE FROM daily_orders WHERE {_HOT_DAY.format(column='fecha')}")
+    where = "WHERE " + _HOT_DAY.format(column="o.created_at")
+    cur.execute(f"""INSERT INTO daily_sales (fecha, category, product_id, cantidad, ventas, costos)
+                    {_SALES_SELECT} {where} GROUP BY 1, 2, 3""")
+    cur.execute(f"INSERT INTO daily_orders (fecha, category, pedidos) {_ORDERS_SELECT.format(where=where)}",
+                (ALL_CATEGORIES,))
+    db.commit()
+
+
+def check_consistency(db):
+    """Compara el agregado con un recálculo completo (días no archivados).
+
+    Devuelve una lista de diferencias (tabla, fila esperada, fila guardada);
+    lista vacía si todo cuadra.
+    """
+    cur = db.cursor()
+    differences = []
+    where = "WHERE " + _HOT_DAY.format(column="o.created_at")
+    hot = _HOT_DAY.format(column="fecha")
+    cur.execute(f"SELECT * FROM ({_SALES_SELECT} {where} GROUP BY 1, 2, 3)")
+    expected = {tuple(r[:3]): tuple(r[3:]) for r in cur.fetchall()}
+    cur.execute(f"SELECT fecha, category, product_id, cantidad, ventas, costos FROM daily_sales WHERE {hot}")
+    stored = {tuple(r[:3]): tuple(r[3:]) for r in cur.fetchall()}
+    for key in sorted(set(expected) | set(stored), key=str):
+        if expected.get(key) != stored.get(key):
+            differences.append(("daily_sales", key, expected.get(key), stored.get(key)))
+    cur.execute(_ORDERS_SELECT.format(where=where), (ALL_CATEGORIES,))
+    expected = {tuple(r[:2]): r[2] for r in cur.fetchall()}
+    cur.execute(f"SELECT fecha, category, pedidos FROM daily_orders WHERE {hot}")
+    stored = {tuple(r[:2]): r[2] for r in cur.fetchall()}
+    for key in sorted(set(expected) | set(stored), key=str):
+        if expected.get(key) != stored.get(key):
+            differences.append(("daily_orders", key, expected.get(key), stored.get(key)))
+    return differences
@@ -0,0 +1,219 @@
+"""Filas de ventas de /api/ventas: una por línea de comanda.
+
+Las filas se leen del cursor por tramos (fetchmany) y se entregan con un
+generador, así que la memoria no crece con el rango de fechas. Hay dos
+formas de consumirlas:
+
+  - stream_json / stream_ndjson / stream_csv: la respuesta completa, escrita
+    a medida que se lee.
+  - fetch_page: una página con cursor (keyset) para ir pidiendo de a poco.
+
+El orden es fecha descendente y, dentro de la misma fecha, order_item
+descendente; el cursor es la posición (fecha, id de order_item) de la última
+fila entregada.
+
+Los meses archivados (archive.py) se leen después de la base en uso, una
+partición por vez y sólo las que cruzan el rango de fechas pedido; como cada
+partición es un mes y la base en uso tiene los meses más nuevos, el orden se
+mantiene sin mezclar.
+"""
+import base64
+import csv
+import datetime
+import io
+import json
+
+import archive
+from report_filters import FilterError
+
+COLUMNS = ["idPedido", "fecha", "cliente", "producto", "categoria",
+           "cantidad", "precio", "total", "costo"]
+CHUNK_SIZE = 500
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+_SELECT = """
+    SELECT
+        o.id as idPedido,
+        o.created_at as fecha,
+        o.customer_name as cliente,
+        p.name as producto,
+        COALESCE(c.name, '') as categoria,
+        oi.qty as cantidad,
+        oi.unit_price as precio,
+        (oi.unit_price * oi.qty) as total,
+        (oi.unit_cost * oi.qty) as costo,
+        oi.id as item_id
+    FROM {prefix}orders o
+    JOIN {prefix}order_items oi ON o.id = oi.order_id
+    JOIN products p ON oi.product_id = p.id
+    LEFT JOIN categories c ON c.id = p.category_id
+    WHERE 1=1
+"""
+
+
+def build_query(filtros, after=None, limit=None, prefix=""):
+    """(sql, params) de las ventas filtradas, a partir de la posición after.
+
+    prefix es el de archive.opened ("" para la base en uso).
+    """
+    where, params = filtros.where()
+    sql = _SELECT.format(prefix=prefix) + where
+    if after is not None:
+        fecha, item_id = after
+        sql += " AND (o.created_at < ? OR (o.created_at = ? AND oi.id < ?))"
+        params += [fecha, fecha, item_id]
+    sql += " ORDER BY o.created_at DESC, oi.id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+
+def to_dict(row):
+    return {
+        'idPedido': row['idPedido'],
+        'fecha': row['fecha'],
+        'cliente': row['cliente'] or 'Cliente no especificado',
+        'producto': row['producto'],
+        'categoria': row['categoria'],
+        'cantidad': row['cantidad'],
+        'precio': row['precio'],
+        'total': row['total'],
+        'costo': row['costo'],
+    }
+
+
+def sources(db, filtros, after=None):
+    """Base en uso y particiones a leer; con after, sólo las que llegan hasta esa fecha."""
+    hasta = filtros.hasta
+    if after is not None:
+        cursor_hasta = (datetime.date.fromisoformat(after[0][:10]) + datetime.timedelta(days=1)).isoformat()
+        hasta = min(hasta, cursor_hasta) if hasta else cursor_hasta
+    return archive.sources(db, filtros.desde, hasta)
+
+
+def iter_rows(db, filtros, chunk_size=CHUNK_SIZE):
+    """Recorre las ventas filtradas como dicts, leyendo chunk_size filas por vez."""
+    for source in sources(db, filtros):
+        with archive.opened(db, source) as prefix:
+            sql, params = build_query(filtros, prefix=prefix)
+            cur = db.cursor()
+            try:
+                cur.execute(sql, params)
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield to_dict(row)
+            finally:
+                cur.close()
+
+
+def count_rows(db, filtros):
+    """Cantidad de filas que devolvería iter_rows (para decidir cómo exportar)."""
+    where, params = filtros.where()
+    total = 0
+    for source in sources(db, filtros):
+        with archive.opened(db, source) as prefix:
+            cur = db.cursor()
+            cur.execute(f"""SELECT COUNT(*) FROM {prefix}orders o
+                            JOIN {prefix}order_items oi ON o.id = oi.order_id
+                            JOIN products p ON oi.product_id = p.id
+                            WHERE 1=1""" + where, params)
+            total += cur.fetchone()[0]
+    return total
+
+
+# --- Paginación ---
+
+def encode_cursor(row):
+    raw = json.dumps([row['fecha'], row['item_id']]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(text):
+    try:
+        raw = base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+        fecha, item_id = json.loads(raw)
+        if not isinstance(fecha, str) or not isinstance(item_id, int):
+            raise ValueError
+        datetime.date.fromisoformat(fecha[:10])
+    except (TypeError, ValueError):
+        raise FilterError(f"Cursor inválido: {text!r}")
+    return fecha, item_id
+
+
+def parse_limit(value):
+    try:
+        limit = int(value) if value else PAGE_SIZE
+    except ValueError:
+        raise FilterError(f"Límite inválido: {value!r}")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise FilterError(f"El límite debe estar entre 1 y {MAX_PAGE_SIZE}")
+    return limit
+
+
+def fetch_page(db, filtros, after=None, limit=PAGE_SIZE):
+    """Devuelve (ventas, next_cursor); next_cursor es None en la última página.
+
+    after es la posición decodificada con decode_cursor (None = desde el inicio).
+    """
+    rows = []
+    for source in sources(db, filtros, after):
+        with archive.opened(db, source) as prefix:
+            sql, params = build_query(filtros, after=after, limit=limit + 1 - len(rows), prefix=prefix)
+            rows += db.execute(sql, params).fetchall()
+        if len(rows) > limit:
+            break
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return [to_dict(row) for row in rows], next_cursor
+
+
+# --- Salida por streaming ---
+
+def _in_blocks(parts, chunk_size):
+    """Junta las partes de a chunk_size para no escribir fila por fila."""
+    block = []
+    for part in parts:
+        block.append(part)
+        if len(block) >= chunk_size:
+            yield "".join(block)
+            block = []
+    if block:
+        yield "".join(block)
+
+
+def stream_json(rows, chunk_size=CHUNK_SIZE):
+    """Arreglo JSON escrito por partes (mismo formato que antes)."""
+    def parts():
+        yield "["
+        for i, row in enumerate(rows):
+            yield ("," if i else "") + json.dumps(row)
+        yield "]"
+    return _in_blocks(parts(), chunk_size)
+
+
+def stream_ndjson(rows, chunk_size=CHUNK_SIZE):
+    """Un objeto JSON por línea."""
+    return _in_blocks((json.dumps(row) + "\n" for row in rows), chunk_size)
+
+
+def stream_csv(rows, chunk_size=CHUNK_SIZE):
+    """CSV con encabezado, en bloques de chunk_size filas."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow([row[c] for c in COLUMNS])
+        count += 1
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,152 @@
+"""URLs de static/ con hash de contenido y librerías de terceros locales.
+
+  - static_url("style.css") -> /static/style.css?v=<hash>: el hash sale del
+    contenido del archivo (se recalcula sólo si cambia su mtime o tamaño), así
+    que un cambio en style.css cambia la URL. Los requests que traen el v=
+    vigente, y todo lo que está bajo static/vendor/ (carpetas con la versión
+    en el nombre), se sirven con Cache-Control immutable por un año: el
+    navegador no vuelve a preguntar.
+  - vendor_url("chartjs") -> la copia local en static/vendor/ si ya se
+    descargó con `flask --app app vendor-assets`, o si no la URL del CDN (la
+    misma versión fijada en VENDOR), para que la app funcione igual sin ella.
+
+install(app) agrega static_url y vendor_url a las plantillas, el hook de los
+headers y el comando vendor-assets.
+"""
+import hashlib
+import os
+import threading
+import urllib.request
+
+import click
+from flask import request, url_for
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Librerías que cargan las plantillas, con versión fija. Cada una es un
+# archivo principal (el que enlaza la plantilla) y sus archivos auxiliares,
+# como ruta bajo static/vendor/ -> URL de origen.
+VENDOR = {
+    "chartjs": {
+        "main": "chart.js-4.4.1/chart.umd.min.js",
+        "files": {
+            "chart.js-4.4.1/chart.umd.min.js":
+                "https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js",
+        },
+    },
+    "bootstrap": {
+        "main": "bootstrap-5.3.0/css/bootstrap.min.css",
+        "files": {
+            "bootstrap-5.3.0/css/bootstrap.min.css":
+                "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css",
+        },
+    },
+    # all.min.css busca las fuentes en ../webfonts/
+    "fontawesome": {
+        "main": "fontawesome-6.4.0/css/all.min.css",
+        "files": dict(
+            [("fontawesome-6.4.0/css/all.min.css",
+              "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css")]
+            + [("fontawesome-6.4.0/webfonts/" + name,
+                "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/webfonts/" + name)
+               for font in ("fa-brands-400", "fa-regular-400", "fa-solid-900", "fa-v4compatibility")
+               for name in (font + ".woff2", font + ".ttf")]
+        ),
+    },
+}
+
+_lock = threading.Lock()
+_hashes = {}  # ruta absoluta -> (mtime_ns, tamaño, hash)
+
+
+def file_hash(path):
+    """Primeros 10 hex del sha1 del archivo, o None si no existe."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    with _lock:
+        cached = _hashes.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()[:10]
+    with _lock:
+        _hashes[path] = (st.st_mtime_ns, st.st_size, value)
+    return value
+
+
+def vendor_dir(app):
+    return os.path.join(app.static_folder, "vendor")
+
+
+def install(app):
+    def static_path(filename):
+        return os.path.join(app.static_folder, *filename.split("/"))
+
+    def static_url(filename):
+        """URL de static/filename con ?v=<hash del contenido>."""
+        version = file_hash(static_path(filename))
+        if version is None:
+            return url_for("static", filename=filename)
+        return url_for("static", filename=filename, v=version)
+
+    def vendor_url(name):
+        """Copia local de la librería name (ver VENDOR) o, si no está, su CDN."""
+        entry = VENDOR[name]
+        local = "vendor/" + entry["main"]
+        if os.path.exists(static_path(local)):
+            return static_url(local)
+        return entry["files"][entry["main"]]
+
+    app.jinja_env.globals.update(static_url=static_url, vendor_url=vendor_url)
+
+    @app.after_request
+    def _static_cache_headers(response):
+        if request.endpoint != "static" or response.status_code not in (200, 304):
+            return response
+        filename = request.view_args.get("filename", "")
+        version = request.args.get("v")
+        if filename.startswith("vendor/") or (
+                version and version == file_hash(static_path(filename))):
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+    @app.cli.command("vendor-assets")
+    @click.option("--force", is_flag=True, help="Vuelve a descargar aunque ya estén.")
+    def vendor_assets_command(force):
+        """Descarga a static/vendor/ las librerías de VENDOR (versiones fijas)."""
+        failed = []
+        for name, entry in VENDOR.items():
+            main = os.path.join(vendor_dir(app), *entry["main"].split("/"))
+            if os.path.exists(main) and not force:
+                click.echo(f"{name}: ya está")
+                continue
+            # Se baja todo antes de escribir y el archivo principal va al
+            # final: vendor_url() no usa la copia local hasta que está completa
+            downloaded = {}
+            for rel, url in entry["files"].items():
+                try:
+                    with urllib.request.urlopen(url, timeout=30) as remote:
+                        downloaded[rel] = remote.read()
+                except OSError as e:
+                    click.echo(f"{name}: error descargando {url}: {e}", err=True)
+                    break
+            else:
+                for rel in sorted(downloaded, key=lambda rel: rel == entry["main"]):
+                    path = os.path.join(vendor_dir(app), *rel.split("/"))
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp = path + ".tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(downloaded[rel])
+                    os.replace(tmp, path)
+                size = sum(len(data) for data in downloaded.values())
+                click.echo(f"{name}: {len(downloaded)} archivo(s), {size // 1024} KB")
+                continue
+            failed.append(name)
+        if failed:
+            raise SystemExit("Sin descargar: " + ", ".join(failed))
+        click.echo("Librerías en " + vendor_dir(app))
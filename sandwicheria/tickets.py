@@ -0,0 +1,200 @@
+"""Render de comandas para la impresora térmica (ESC/POS).
+
+La comanda se arma con una sola consulta (orden + líneas + productos) y una
+plantilla compilada una vez al importar el módulo. El resultado es un único
+buffer de bytes que se manda a la impresora de una sola escritura.
+
+La misma plantilla se puede renderizar como texto plano (escpos=False), sin
+códigos de control, para guardarla en un archivo y comparar el diseño de la
+comanda contra una copia conocida.
+
+Sintaxis de la plantilla, por línea:
+  - {campo} o {campo:formato}: campos con la sintaxis de str.format.
+  - <center>, <left>, <b>, </b>, <big>, </big>: alineación y estilo.
+  - <cut>: corta el papel (en texto plano, una línea de separación).
+  - ?campo: al inicio: la línea sólo se imprime si el campo no está vacío.
+"""
+import re
+
+# Proteínas que se pueden elegir y que se imprimen destacadas en la comanda
+SELECTABLE_PROTEINS = ["Churrasco", "Lomito", "Pollo"]
+
+# Página de códigos PC850 (tiene Í, Ñ, ¡) para el texto en modo ESC/POS
+ENCODING = "cp850"
+
+ESC = b"\x1b"
+GS = b"\x1d"
+
+# Comandos ESC/POS de cada marca; en texto plano no imprimen nada
+_TAGS = {
+    "<center>": ESC + b"a\x01",
+    "<left>": ESC + b"a\x00",
+    "<b>": ESC + b"E\x01",
+    "</b>": ESC + b"E\x00",
+    "<big>": GS + b"!\x11",
+    "</big>": GS + b"!\x00",
+}
+_INIT = ESC + b"@" + ESC + b"t\x02"  # reinicia la impresora y selecciona PC850
+_CUT = b"\n\n\n" + GS + b"V\x00"
+_TEXT_CUT = ("=" * 32 + "\n").encode("utf-8")
+
+_TAG_RE = re.compile(r"(<cut>|" + "|".join(re.escape(tag) for tag in _TAGS) + ")")
+_CONDITION_RE = re.compile(r"^\?(\w+):")
+
+
+class TicketTemplate:
+    """Plantilla de comanda: encabezado, una sección por línea y pie.
+
+    Cada sección se compila una vez a una lista de líneas; cada línea es una
+    lista de trozos que son bytes ya codificados (texto fijo y comandos) o
+    cadenas de formato con campos.
+    """
+
+    def __init__(self, header, item, footer):
+        self.source = (header, item, footer)
+        self._compiled = {}
+
+    def _compile(self, escpos):
+        compiled = self._compiled.get(escpos)
+        if compiled is None:
+            compiled = tuple(_compile_section(section, escpos) for section in self.source)
+            self._compiled[escpos] = compiled
+        return compiled
+
+    def render(self, order, items, escpos=True):
+        """Arma el ticket completo como bytes.
+
+        order es un dict con los campos del encabezado y pie; items una lista
+        de dicts, uno por línea de la comanda.
+        """
+        header, item, footer = self._compile(escpos)
+        encoding = ENCODING if escpos else "utf-8"
+        out = bytearray(_INIT if escpos else b"")
+        _render_section(out, header, order, encoding)
+        for it in items:
+            _render_section(out, item, it, encoding)
+        _render_section(out, footer, order, encoding)
+        return bytes(out)
+
+
+def _compile_section(source, escpos):
+    encoding = ENCODING if escpos else "utf-8"
+    lines = []
+    for raw in source.splitlines():
+        condition = None
+        match = _CONDITION_RE.match(raw)
+        if match:
+            condition = match.group(1)
+            raw = raw[match.end():]
+        pieces = []
+        for token in _TAG_RE.split(raw):
+            if not token:
+                continue
+            if token == "<cut>":
+                pieces.append(_CUT if escpos else _TEXT_CUT)
+            elif token in _TAGS:
+                if escpos:
+                    pieces.append(_TAGS[token])
+            elif "{" in token:
+                pieces.append(token)
+            else:
+                pieces.append(token.encode(encoding, "replace"))
+        # Una línea que es sólo <cut> no lleva salto de línea propio
+        newline = not (raw.strip() == "<cut>")
+        lines.append((condition, pieces, newline))
+    return lines
+
+
+def _render_section(out, lines, context, encoding):
+    for condition, pieces, newline in lines:
+        if condition and not context.get(condition):
+            continue
+        for piece in pieces:
+            if isinstance(piece, bytes):
+                out += piece
+            else:
+                out += piece.format_map(context).encode(encoding, "replace")
+        if newline:
+            out += b"\n"
+
+
+# Diseño de la comanda de cocina
+KITCHEN_TEMPLATE = TicketTemplate(
+    header="""\
+<center><b>SANDWICHERÍA - COMANDA</b>
+<big>#{order_id}</big> - {created_at:.16}
+?customer_name:Cliente: {customer_name}
+<left>---------------""",
+    item="""\
+<b>{qty} x {product_name}</b>
+?protein:  {protein}
+?note:  Nota: {note}""",
+    footer="""\
+<center>¡Gracias!
+<cut>""",
+)
+
+
+def split_note(note, base_protein):
+    """Separa la proteína elegida del resto de la nota.
+
+    Devuelve (proteína, nota). Si la nota no empieza con una proteína
+    elegible se usa la proteína base del producto (salvo "—").
+    """
+    protein = ""
+    if note:
+        parts = note.split(" - ")
+        if parts[0] in SELECTABLE_PROTEINS:
+            protein = parts[0]
+            note = " - ".join(parts[1:])
+    if not protein and base_protein and base_protein != "—":
+        protein = base_protein
+    return protein, note or ""
+
+
+def fetch_ticket(db, order_id):
+    """Lee la comanda con una sola consulta. Devuelve (order, items) o None."""
+    cur = db.cursor()
+    cur.execute("""SELECT o.id AS order_id, o.created_at, o.customer_name,
+                          oi.qty, oi.note, p.name AS product_name, p.base_protein
+                   FROM orders o
+                   LEFT JOIN order_items oi ON oi.order_id = o.id
+                   LEFT JOIN products p ON p.id = oi.product_id
+                   WHERE o.id = ?
+                   ORDER BY oi.id""", (order_id,))
+    rows = cur.fetchall()
+    if not rows:
+        return None
+    first = rows[0]
+    order = {
+        "order_id": first["order_id"],
+        "created_at": first["created_at"] or "",
+        "customer_name": first["customer_name"] or "",
+    }
+    items = []
+    for row in rows:
+        if row["product_name"] is None:
+            continue
+        protein, note = split_note(row["note"], row["base_protein"])
+        items.append({"qty": row["qty"], "product_name": row["product_name"],
+                      "protein": protein, "note": note})
+    return order, items
+
+
+def render_ticket(db, order_id, escpos=True, template=KITCHEN_TEMPLATE):
+    """Bytes de la comanda lista para imprimir (None si no existe)."""
+    ticket = fetch_ticket(db, order_id)
+    if ticket is None:
+        return None
+    order, items = ticket
+    return template.render(order, items, escpos=escpos)
+
+
+def render_to_file(db, order_id, path, escpos=False, template=KITCHEN_TEMPLATE):
+    """Escribe la comanda en un archivo (texto plano por defecto). Devuelve True si existía."""
+    data = render_ticket(db, order_id, escpos=escpos, template=template)
+    if data is None:
+        return False
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
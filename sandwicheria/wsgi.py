@@ -0,0 +1,19 @@
+"""Punto de entrada WSGI para producción (gunicorn, ver gunicorn.conf.py).
+
+Con preload_app el maestro importa este módulo una sola vez antes de crear
+los workers: aplica las migraciones, carga los productos por defecto y deja
+el catálogo en memoria, que los workers heredan al hacer fork. Las
+conexiones SQLite no se pasan al hijo: se cierran aquí y cada worker abre
+las suyas (db_pool detecta el cambio de pid).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import app as app_module
+
+app = app_module.app
+
+# Una sola vez, en el maestro y antes del fork
+app_module.setup_database()
+with app.app_context():
+    app_module.get_catalog()
+app_module.db_pool.close_all()